@@ -0,0 +1,85 @@
+"""
+Write throughput and output size of each output profile.
+
+Snapshots the same events and branch list of a fixed local NanoAOD file
+once per profile in config.OUTPUT_PROFILES (no skim cuts, so every profile
+writes identical content) and reports wall time, uncompressed MB/s written
+and output size.
+
+Usage:
+    python benchmarks/bench_profiles.py /path/to/nano.root
+    python benchmarks/bench_profiles.py /path/to/nano.root --profiles intermediate archival
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import ROOT
+import config
+from skimmer import AnalysisSkimmer
+from cpus import configure_threads
+
+
+def output_bytes(filename, tree_name):
+    """(uncompressed, compressed) bytes of the tree written in filename."""
+    f = ROOT.TFile.Open(filename)
+    tree = f.Get(tree_name)
+    sizes = (tree.GetTotBytes(), tree.GetZipBytes())
+    f.Close()
+    return sizes
+
+
+def run_profile(input_file, name, profile, outdir, branches=None):
+    skimmer = AnalysisSkimmer(input_file, config.TREE_NAME)
+    if branches is None:
+        branches = skimmer.build_branch_list(
+            config.BRANCHES_TO_SAVE + config.BRANCHES_MC, config.BRANCHES_WILDCARD)
+
+    output = os.path.join(outdir, f"profile_{name}.root")
+
+    start = time.time()
+    skimmer.save_snapshot(output, branches, profile=profile)
+    elapsed = time.time() - start
+
+    uncompressed, _ = output_bytes(output, "Events")
+    return {
+        "profile": name,
+        "seconds": elapsed,
+        "write_MBps": uncompressed / 1e6 / elapsed if elapsed else 0.0,
+        "size_MB": os.path.getsize(output) / 1e6,
+        "ratio": uncompressed / os.path.getsize(output),
+    }, branches
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="local NanoAOD file")
+    parser.add_argument("--profiles", nargs="*", default=None,
+                        help="profiles to run (default: all in config.OUTPUT_PROFILES)")
+    args = parser.parse_args()
+
+    configure_threads()
+
+    names = args.profiles or list(config.OUTPUT_PROFILES)
+
+    results = []
+    branches = None
+    with tempfile.TemporaryDirectory() as outdir:
+        for name in names:
+            result, branches = run_profile(args.input, name, config.OUTPUT_PROFILES[name],
+                                           outdir, branches)
+            results.append(result)
+
+    print("-" * 64)
+    print(f"{'Profile':<16} {'time [s]':>9} {'write MB/s':>11} {'size MB':>9} {'ratio':>7}")
+    for r in results:
+        print(f"{r['profile']:<16} {r['seconds']:9.2f} {r['write_MBps']:11.1f} "
+              f"{r['size_MB']:9.2f} {r['ratio']:7.2f}")
+    print("-" * 64)
@@ -0,0 +1,134 @@
+"""
+Read-back throughput of TTree vs RNTuple skims made from the same input.
+
+Writes the skim branch list of a local NanoAOD file once as TTree and once
+as RNTuple (same compression profile, no cuts), then reads a set of
+columns back from each with RDataFrame and reports events/s and MB/s of
+the compressed Events data (TTree baskets or RNTuple pages, not the whole
+file; rows marked * fall back to the file size). Reading is repeated
+--repeat times and the best time is kept, so the numbers reflect decoding
+speed with a warm page cache.
+
+Usage:
+    python benchmarks/bench_rntuple.py /path/to/nano.root --columns "Jet_*" "Muon_*"
+"""
+
+import argparse
+import fnmatch
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import ROOT
+import config
+from skimmer import AnalysisSkimmer, rntuple_supported
+from cpus import configure_threads
+
+
+def open_events(filename):
+    """RDataFrame over the Events TTree or RNTuple of filename."""
+    try:
+        return ROOT.RDataFrame("Events", filename)
+    except Exception:
+        # ROOT versions before RNTuple auto-detection in the RDataFrame ctor
+        return ROOT.RDF.Experimental.FromRNTuple("Events", filename)
+
+
+def events_bytes(filename):
+    """Compressed bytes of the Events TTree or RNTuple of filename, None if unknown."""
+    tfile = ROOT.TFile.Open(filename)
+    try:
+        obj = tfile.Get("Events")
+        if isinstance(obj, ROOT.TTree):
+            return int(obj.GetZipBytes())
+    finally:
+        tfile.Close()
+    for ns in (ROOT, ROOT.Experimental):
+        reader = getattr(ns, "RNTupleReader", None)
+        if reader is None:
+            continue
+        try:
+            descriptor = reader.Open("Events", filename).GetDescriptor()
+            return sum(int(c.GetBytesOnStorage()) for c in descriptor.GetClusterIterable())
+        except Exception:
+            continue
+    return None
+
+
+def read_back(filename, patterns, repeat):
+    """Best wall time to read the columns matching patterns, and the event count."""
+    best = None
+    n_events = 0
+    for _ in range(repeat):
+        df = open_events(filename)
+        columns = [str(c) for c in df.GetColumnNames()
+                   if any(fnmatch.fnmatchcase(str(c), p) for p in patterns)]
+
+        results = []
+        for i, column in enumerate(columns):
+            if "RVec" in str(df.GetColumnType(column)):
+                df = df.Define(f"bench_sum_{i}", f"ROOT::VecOps::Sum({column})")
+                results.append(df.Sum(f"bench_sum_{i}"))
+            else:
+                results.append(df.Sum(column))
+        count = df.Count()
+
+        start = time.time()
+        n_events = count.GetValue()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best, n_events, len(columns)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="local NanoAOD file")
+    parser.add_argument("--columns", nargs="*", default=["Jet_*", "Muon_*", "Electron_*", "PV_*"],
+                        help="column patterns to read back")
+    parser.add_argument("--profile", default="default", help="profile from config.OUTPUT_PROFILES")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    configure_threads()
+
+    if not rntuple_supported():
+        print("This ROOT build cannot write RNTuple, nothing to compare.")
+        sys.exit(1)
+
+    profile = config.OUTPUT_PROFILES[args.profile]
+    rows = []
+
+    with tempfile.TemporaryDirectory() as outdir:
+        branches = None
+        for output_format in ("ttree", "rntuple"):
+            skimmer = AnalysisSkimmer(args.input, config.TREE_NAME)
+            if branches is None:
+                branches = skimmer.build_branch_list(
+                    config.BRANCHES_TO_SAVE + config.BRANCHES_MC, config.BRANCHES_WILDCARD)
+
+            output = os.path.join(outdir, f"skim_{output_format}.root")
+            skimmer.save_snapshot(output, branches, profile=profile, output_format=output_format)
+
+            elapsed, n_events, n_columns = read_back(output, args.columns, args.repeat)
+            size = events_bytes(output)
+            label = output_format
+            if size is None:
+                size = os.path.getsize(output)
+                label += "*"
+            rows.append((label, size, n_columns, n_events, elapsed))
+
+    print("-" * 72)
+    print(f"{'Format':<9} {'Events MB':>9} {'columns':>8} {'events':>10} {'read [s]':>9} "
+          f"{'kEvents/s':>10} {'MB/s':>8}")
+    for label, size, n_columns, n_events, elapsed in rows:
+        print(f"{label:<9} {size / 1e6:9.2f} {n_columns:8d} {n_events:10d} {elapsed:9.3f} "
+              f"{n_events / elapsed / 1e3:10.1f} {size / 1e6 / elapsed:8.1f}")
+    print("-" * 72)
+    if any(label.endswith("*") for label, *_ in rows):
+        print("* Events size unavailable, MB/s of the whole file")
@@ -0,0 +1,66 @@
+"""
+Thread scaling of the skim: events/s vs implicit MT threads.
+
+Runs the runner.py skim on synthetic NanoAOD (see synthetic_nano.py) with
+1, 2, 4, ... threads up to the CPUs allocated to this job (cpus.py), each
+in a fresh process, and reports speedup and parallel efficiency relative
+to one thread. Use it to pick N_THREADS / THREADS_PER_WORKER and the
+request_cpus of the Condor jobs.
+
+Usage:
+    python benchmarks/bench_scaling.py /tmp/synth --files 4 --events 200000
+    python benchmarks/bench_scaling.py /tmp/synth --threads 1 2 3 4 6 8
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_skim import BRANCH_SETS, measure
+from cpus import allocated_cpus
+from synthetic_nano import generate
+
+
+def default_thread_counts():
+    n_max = allocated_cpus()
+    counts = []
+    n = 1
+    while n < n_max:
+        counts.append(n)
+        n *= 2
+    return counts + [n_max]
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("workdir", help="directory for the synthetic inputs")
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--events", type=int, default=200000, help="events per file")
+    parser.add_argument("--threads", nargs="+", type=int, default=None,
+                        help="thread counts (default: powers of two up to the allocated CPUs)")
+    parser.add_argument("--branch-set", choices=list(BRANCH_SETS), default="config")
+    parser.add_argument("--mode", choices=["runner", "main"], default="runner")
+    args = parser.parse_args()
+
+    bundle = generate(args.workdir, args.files, args.events)
+    counts = args.threads or default_thread_counts()
+    print(f"Allocated CPUs: {allocated_cpus()}, measuring {counts} threads")
+
+    results = []
+    for threads in counts:
+        print(f"Running with {threads} threads")
+        results.append((threads, measure(bundle, args.mode, threads, args.branch_set)))
+
+    # per-thread rate of the smallest count (one thread unless --threads says otherwise)
+    base = results[0][1]["events_per_s"] / results[0][0]
+    print("-" * 60)
+    print(f"{'threads':>7} {'events/s':>12} {'speedup':>8} {'efficiency':>10} {'RSS MB':>8}")
+    for threads, r in results:
+        speedup = r["events_per_s"] / base if base else 0.0
+        print(f"{threads:7d} {r['events_per_s']:12.0f} {speedup:8.2f} "
+              f"{speedup / threads:10.2f} {r['peak_rss_mb']:8.0f}")
+    print("-" * 60)
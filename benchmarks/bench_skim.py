@@ -0,0 +1,219 @@
+"""
+Skim throughput on synthetic NanoAOD, comparable across commits.
+
+Generates (or reuses) synthetic input files with synthetic_nano.py, then
+runs the skim once per combination of mode, thread count and branch set,
+each in a fresh Python process so memory and the implicit MT pool are not
+shared between measurements:
+
+    runner   runner.py path: AnalysisRunner over the bundle, all parts
+    main     main.py path: one AnalysisSkimmer over all files
+
+and reports events/s and MB/s read in the event loop, JIT time, output
+size and peak RSS. Every result row is appended to a CSV together with the
+git commit, so runs of different commits can be compared.
+
+Usage:
+    python benchmarks/bench_skim.py /tmp/synth --files 4 --events 200000
+    python benchmarks/bench_skim.py /tmp/synth --threads 1 4 8 --branch-sets config minimal --repeat 3
+"""
+
+import argparse
+import csv
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.join(HERE, "..")
+sys.path.insert(0, REPO)
+
+# config.py overrides per branch set ("config" keeps config.py as is)
+BRANCH_SETS = {
+    "config": {},
+    "minimal": {
+        "BRANCHES_TO_SAVE": ["run", "luminosityBlock", "event", "nMuon", "nElectron", "nJet",
+                             "PV_npvsGood", "PuppiMET_pt", "PuppiMET_phi"],
+        "BRANCHES_MC": ["genWeight"],
+        "BRANCHES_WILDCARD": ["Muon_pt", "Muon_eta", "Muon_phi", "Electron_pt", "Electron_eta",
+                              "Electron_phi", "Jet_pt", "Jet_eta", "Jet_phi"],
+    },
+    # config branches with per-object selections (object_selection.py)
+    "slimmed": {
+        "OBJECT_SELECTIONS": {
+            "Jet": "Jet_pt > 30 && abs(Jet_eta) < 2.5",
+            "GenJet": "GenJet_pt > 30",
+            "GenPart": "(GenPart_statusFlags & (1 << 13)) != 0 && GenPart_pt > 5",
+        },
+    },
+}
+
+CSV_FIELDS = [
+    "commit", "date", "host", "mode", "threads", "branch_set", "files", "events_read",
+    "events_passed", "wall_seconds", "jit_seconds", "loop_seconds", "events_per_s",
+    "read_MBps", "bytes_read", "output_MB", "peak_rss_mb",
+]
+
+PROCESS = "synthetic"
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "-C", REPO, "rev-parse", "--short", "HEAD"],
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              check=True).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# ---- child process: one measurement ----
+
+def run_child(options):
+    import config
+    from cpus import configure_threads
+
+    for key, value in BRANCH_SETS[options["branch_set"]].items():
+        setattr(config, key, value)
+    config.JSON_FILE = options["bundle"]
+    config.MANIFEST = False
+    config.TRIGGER_STATS_FILE = None
+    config.GENWEIGHT_CACHE = None
+
+    from metrics import PartMetrics
+
+    start = time.time()
+    records = []
+
+    if options["mode"] == "runner":
+        from runner import AnalysisRunner
+
+        runner = AnalysisRunner(config, PROCESS, "ALL", n_workers=1, shared_graph=False,
+                                n_threads=options["threads"])
+        runner.run()
+        records = [r["metrics"] for r in runner.results if r.get("metrics")]
+
+    else:
+        from skimmer import AnalysisSkimmer
+
+        configure_threads(options["threads"])
+        with open(options["bundle"]) as f:
+            parts = json.load(f)[PROCESS]["files"]
+        files = [name for part in parts.values() for name in part]
+
+        # same steps as main.py
+        skimmer = AnalysisSkimmer(files, config.TREE_NAME)
+        skimmer.define_total_weight(1, 1)
+        skimmer.apply_global_filters(triggers=config.TRIGGERS, met_filters=config.MET_FILTERS)
+        branches = skimmer.build_branch_list(config.BRANCHES_TO_SAVE + config.BRANCHES_MC,
+                                             config.BRANCHES_WILDCARD)
+        skimmer.select_objects(getattr(config, "OBJECT_SELECTIONS", None), branches)
+        metrics = PartMetrics(PROCESS, "main")
+        skimmer.df = metrics.attach(skimmer.df)
+        summary = {"output": "main_output.root", "status": "ok", "n_files": len(files)}
+
+        metrics.start()
+        skimmer.save_snapshot(summary["output"], branches)
+        metrics.stop()
+        summary["io"] = skimmer.io_stats.totals if skimmer.io_stats else None
+        summary["n_events"] = int(skimmer.n_selected.GetValue())
+        summary["elapsed"] = time.time() - start
+        records = [metrics.finish(summary, skimmer)]
+
+    wall = time.time() - start
+    loop = sum(r["loop_seconds"] or 0.0 for r in records)
+    bytes_read = sum(r["bytes_read"] or 0 for r in records)
+    events = sum(r["events_read"] or 0 for r in records)
+    result = {
+        "events_read": events,
+        "events_passed": sum(r["events_passed"] or 0 for r in records),
+        "wall_seconds": wall,
+        "jit_seconds": sum(r["jit_seconds"] or 0.0 for r in records),
+        "loop_seconds": loop,
+        "events_per_s": events / loop if loop else 0.0,
+        "read_MBps": bytes_read / 1e6 / loop if loop else 0.0,
+        "bytes_read": bytes_read,
+        "output_MB": sum(r["output_bytes"] or 0 for r in records) / 1e6,
+        "peak_rss_mb": max((r["peak_rss_mb"] for r in records), default=0.0),
+    }
+    print("BENCH_RESULT " + json.dumps(result))
+
+
+# ---- parent process ----
+
+def measure(bundle, mode, threads, branch_set):
+    """Run one measurement in a fresh interpreter; returns its result dict."""
+    options = {"bundle": os.path.abspath(bundle), "mode": mode, "threads": threads,
+               "branch_set": branch_set}
+    with tempfile.TemporaryDirectory() as workdir:
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", json.dumps(options)],
+                              cwd=workdir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output = proc.stdout.decode()
+    for line in output.splitlines():
+        if line.startswith("BENCH_RESULT "):
+            return json.loads(line[len("BENCH_RESULT "):])
+    print(output[-3000:])
+    raise RuntimeError(f"benchmark run failed ({mode}, {threads} threads, {branch_set})")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("workdir", nargs="?", help="directory for the synthetic inputs")
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--events", type=int, default=100000, help="events per file")
+    parser.add_argument("--extra-columns", type=int, default=0,
+                        help="extra float columns per collection in the synthetic files")
+    parser.add_argument("--modes", nargs="+", choices=["runner", "main"], default=["runner"])
+    parser.add_argument("--threads", nargs="+", type=int, default=[1, 4])
+    parser.add_argument("--branch-sets", nargs="+", choices=list(BRANCH_SETS), default=["config"])
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--results", default=os.path.join(HERE, "bench_skim_results.csv"),
+                        help="CSV the results are appended to")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(json.loads(args.child))
+        sys.exit(0)
+
+    if not args.workdir:
+        parser.error("workdir is required")
+
+    from synthetic_nano import generate
+
+    bundle = generate(args.workdir, args.files, args.events, args.extra_columns)
+
+    commit = git_commit()
+    rows = []
+    for mode in args.modes:
+        for branch_set in args.branch_sets:
+            for threads in args.threads:
+                for _ in range(args.repeat):
+                    print(f"Running {mode}, {threads} threads, branch set '{branch_set}'")
+                    result = measure(bundle, mode, threads, branch_set)
+                    result.update(commit=commit, date=time.strftime("%Y-%m-%d %H:%M:%S"),
+                                  host=socket.gethostname(), mode=mode, threads=threads,
+                                  branch_set=branch_set, files=args.files)
+                    rows.append(result)
+
+    new_file = not os.path.exists(args.results)
+    with open(args.results, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        if new_file:
+            writer.writeheader()
+        writer.writerows(rows)
+
+    print("-" * 92)
+    print(f"{'mode':<7} {'set':<8} {'thr':>3} {'events/s':>11} {'MB/s':>8} {'jit s':>7} "
+          f"{'loop s':>8} {'out MB':>8} {'RSS MB':>8}")
+    for r in rows:
+        print(f"{r['mode']:<7} {r['branch_set']:<8} {r['threads']:3d} {r['events_per_s']:11.0f} "
+              f"{r['read_MBps']:8.1f} {r['jit_seconds']:7.2f} {r['loop_seconds']:8.2f} "
+              f"{r['output_MB']:8.1f} {r['peak_rss_mb']:8.0f}")
+    print("-" * 92)
+    print(f"Results appended to {args.results} (commit {commit})")
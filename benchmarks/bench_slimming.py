@@ -0,0 +1,57 @@
+"""
+Output size and throughput of the skim with and without object selections.
+
+Runs the runner.py skim on synthetic NanoAOD (see synthetic_nano.py) with
+the "config" branch set (collections written whole) and the "slimmed" set
+(the OBJECT_SELECTIONS of bench_skim.BRANCH_SETS), each in a fresh process,
+and reports the output size, events/s of the event loop and their ratios.
+--extra-columns widens the collections towards real NanoAOD, where the
+slimmed columns weigh more.
+
+Usage:
+    python benchmarks/bench_slimming.py /tmp/synth --files 2 --events 200000
+    python benchmarks/bench_slimming.py /tmp/synth_wide --extra-columns 30 --threads 4
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_skim import BRANCH_SETS, measure
+from synthetic_nano import generate
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("workdir", help="directory for the synthetic inputs")
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--events", type=int, default=200000, help="events per file")
+    parser.add_argument("--extra-columns", type=int, default=0,
+                        help="extra float columns per collection in the synthetic files")
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--mode", choices=["runner", "main"], default="runner")
+    args = parser.parse_args()
+
+    bundle = generate(args.workdir, args.files, args.events, args.extra_columns)
+
+    results = {}
+    for branch_set in ("config", "slimmed"):
+        print(f"Running branch set '{branch_set}'")
+        results[branch_set] = measure(bundle, args.mode, args.threads, branch_set)
+
+    for collection, selection in BRANCH_SETS["slimmed"]["OBJECT_SELECTIONS"].items():
+        print(f"  {collection:<8} {selection}")
+    full, slim = results["config"], results["slimmed"]
+    print("-" * 60)
+    print(f"{'branch set':<12} {'out MB':>9} {'events/s':>12} {'loop s':>8} {'RSS MB':>8}")
+    for name, r in results.items():
+        print(f"{name:<12} {r['output_MB']:9.1f} {r['events_per_s']:12.0f} "
+              f"{r['loop_seconds']:8.2f} {r['peak_rss_mb']:8.0f}")
+    print("-" * 60)
+    if full["output_MB"] and full["events_per_s"]:
+        print(f"Output size: {slim['output_MB'] / full['output_MB']:.2f} x, "
+              f"throughput: {slim['events_per_s'] / full['events_per_s']:.2f} x")
@@ -0,0 +1,76 @@
+"""
+Startup time and memory of the command-line entry points.
+
+Runs each bookkeeping command (usage, part listing, bundle/DAS cache
+inspection) several times in a fresh interpreter and reports the median
+wall time and the peak RSS, next to a bare `import ROOT` for reference.
+None of these commands should pay for PyROOT.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --bundle JSON_files/Big_2024_MC_file.sqlite --process WZ_3L --repeat 10
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def commands(bundle=None, process=None):
+    """(label, argv) of the entry points to time."""
+    py = sys.executable
+    cmds = [
+        ("python (baseline)", [py, "-c", "pass"]),
+        ("import ROOT (reference)", [py, "-c", "import ROOT"]),
+        ("runner.py --help", [py, "runner.py", "--help"]),
+        ("import runner", [py, "-c", "import runner"]),
+        ("Get_SOGWeight.py --help", [py, os.path.join("get_SumOfGenWeight", "Get_SOGWeight.py"), "--help"]),
+        ("das_cache.py list", [py, "das_cache.py", "list"]),
+    ]
+    if bundle:
+        cmds.append(("bundle_index.py show", [py, "bundle_index.py", "show", bundle]))
+    if process:
+        cmds.append(("runner.py --list", [py, "runner.py", process, "ALL", "--list"]))
+    return cmds
+
+
+def time_command(argv, repeat):
+    """(median seconds, median peak RSS MB, ok) over repeat runs of argv."""
+    times = []
+    rss = []
+    ok = True
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.Popen(argv, cwd=REPO, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        # wait4 gives the resource usage of this child alone
+        _, status, usage = os.wait4(proc.pid, 0)
+        times.append(time.perf_counter() - start)
+        rss.append(usage.ru_maxrss / 1024.0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        ok = ok and proc.returncode == 0
+    return statistics.median(times), statistics.median(rss), ok
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bundle", default=None, help="bundle JSON or index for the listing commands")
+    parser.add_argument("--process", default=None, help="process of config.JSON_FILE for runner.py --list")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = []
+    for label, argv in commands(args.bundle, args.process):
+        results.append((label,) + time_command(argv, args.repeat))
+
+    print("-" * 64)
+    print(f"{'command':<28} {'median s':>9} {'peak RSS MB':>12}  ")
+    for label, seconds, rss, ok in results:
+        print(f"{label:<28} {seconds:9.3f} {rss:12.0f}  {'' if ok else '(failed)'}")
+    print("-" * 64)
@@ -0,0 +1,278 @@
+"""
+Synthetic NanoAOD-like input files for benchmarks.
+
+Writes files with an Events tree carrying the branches the skim uses
+(run/luminosityBlock/event, the HLT_* and Flag_* bits of config.py, PV_*,
+MET, generator weights and jagged Muon_*/Electron_*/Jet_*/GenPart_*/
+LHEPart_*/GenJet_* collections with their *Idx cross references) and a Runs tree with genEventCount /
+genEventSumw / genEventSumw2, plus a bundle JSON pointing at them, so
+runner.py can be run unchanged on local files.
+
+Files are laid out as <outdir>/store/mc/Synthetic/NANOAODSIM/synth_<i>.root
+(the LFN layout the stager and caches key on). The content is random with
+a fixed seed per file; with one thread the same arguments give the same
+files.
+
+Usage:
+    python benchmarks/synthetic_nano.py /tmp/synth --files 4 --events 200000
+    python benchmarks/synthetic_nano.py /tmp/synth --extra-columns 20   # wider collections
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import ROOT
+import config
+
+ROOT.gInterpreter.Declare("""
+#include <TRandom3.h>
+#include <algorithm>
+#include <functional>
+#include <vector>
+
+namespace skim_synth {
+
+std::vector<TRandom3> gRng;
+
+void seed(unsigned n_slots, unsigned seed) {
+    gRng.clear();
+    for (unsigned i = 0; i < n_slots; ++i) gRng.emplace_back(seed * 1000 + i + 1);
+}
+
+TRandom3 &rng(unsigned slot) { return gRng[slot]; }
+
+int poisson(unsigned slot, double mean) { return rng(slot).Poisson(mean); }
+bool flag(unsigned slot, double p) { return rng(slot).Uniform() < p; }
+float gaus(unsigned slot, double mean, double sigma) { return rng(slot).Gaus(mean, sigma); }
+float uniform(unsigned slot, double lo, double hi) { return rng(slot).Uniform(lo, hi); }
+float expo(unsigned slot, double scale) { return rng(slot).Exp(scale); }
+
+ROOT::RVec<float> falling(unsigned slot, int n, double scale, double min) {
+    ROOT::RVec<float> v(n);
+    for (auto &x : v) x = min + rng(slot).Exp(scale);
+    std::sort(v.begin(), v.end(), std::greater<float>());
+    return v;
+}
+ROOT::RVec<float> uniforms(unsigned slot, int n, double lo, double hi) {
+    ROOT::RVec<float> v(n);
+    for (auto &x : v) x = rng(slot).Uniform(lo, hi);
+    return v;
+}
+ROOT::RVec<float> gauss(unsigned slot, int n, double mean, double sigma) {
+    ROOT::RVec<float> v(n);
+    for (auto &x : v) x = rng(slot).Gaus(mean, sigma);
+    return v;
+}
+ROOT::RVec<int> ints(unsigned slot, int n, int lo, int hi) {
+    ROOT::RVec<int> v(n);
+    for (auto &x : v) x = lo + int(rng(slot).Integer(hi - lo + 1));
+    return v;
+}
+ROOT::RVec<bool> flags(unsigned slot, int n, double p) {
+    ROOT::RVec<bool> v(n);
+    for (unsigned i = 0; i < v.size(); ++i) v[i] = rng(slot).Uniform() < p;
+    return v;
+}
+
+} // namespace skim_synth
+""")
+
+# per collection: (mean multiplicity, {column: C++ expression of slot and n})
+COLLECTIONS = {
+    "Muon": (1.3, {
+        "pt": "skim_synth::falling(rdfslot_, n, 20., 3.)",
+        "eta": "skim_synth::uniforms(rdfslot_, n, -2.4, 2.4)",
+        "phi": "skim_synth::uniforms(rdfslot_, n, -3.14159, 3.14159)",
+        "mass": "ROOT::RVec<float>(n, 0.1057f)",
+        "charge": "skim_synth::ints(rdfslot_, n, -1, 1)",
+        "pfRelIso04_all": "skim_synth::falling(rdfslot_, n, 0.1, 0.)",
+        "dxy": "skim_synth::gauss(rdfslot_, n, 0., 0.01)",
+        "dz": "skim_synth::gauss(rdfslot_, n, 0., 0.05)",
+        "tightId": "skim_synth::flags(rdfslot_, n, 0.8)",
+        "jetIdx": "skim_synth::ints(rdfslot_, n, -1, 3)",
+        "genPartIdx": "skim_synth::ints(rdfslot_, n, -1, 29)",
+    }),
+    "Electron": (1.1, {
+        "pt": "skim_synth::falling(rdfslot_, n, 20., 5.)",
+        "eta": "skim_synth::uniforms(rdfslot_, n, -2.5, 2.5)",
+        "phi": "skim_synth::uniforms(rdfslot_, n, -3.14159, 3.14159)",
+        "mass": "ROOT::RVec<float>(n, 0.000511f)",
+        "charge": "skim_synth::ints(rdfslot_, n, -1, 1)",
+        "pfRelIso03_all": "skim_synth::falling(rdfslot_, n, 0.1, 0.)",
+        "dxy": "skim_synth::gauss(rdfslot_, n, 0., 0.01)",
+        "dz": "skim_synth::gauss(rdfslot_, n, 0., 0.05)",
+        "cutBased": "skim_synth::ints(rdfslot_, n, 0, 4)",
+        "jetIdx": "skim_synth::ints(rdfslot_, n, -1, 3)",
+        "genPartIdx": "skim_synth::ints(rdfslot_, n, -1, 29)",
+    }),
+    "Jet": (4.0, {
+        "pt": "skim_synth::falling(rdfslot_, n, 40., 15.)",
+        "eta": "skim_synth::uniforms(rdfslot_, n, -4.7, 4.7)",
+        "phi": "skim_synth::uniforms(rdfslot_, n, -3.14159, 3.14159)",
+        "mass": "skim_synth::falling(rdfslot_, n, 8., 1.)",
+        "btagDeepFlavB": "skim_synth::uniforms(rdfslot_, n, 0., 1.)",
+        "jetId": "skim_synth::ints(rdfslot_, n, 0, 6)",
+        "genJetIdx": "skim_synth::ints(rdfslot_, n, -1, 4)",
+    }),
+    "GenPart": (30.0, {
+        "pt": "skim_synth::falling(rdfslot_, n, 15., 0.)",
+        "eta": "skim_synth::gauss(rdfslot_, n, 0., 3.)",
+        "phi": "skim_synth::uniforms(rdfslot_, n, -3.14159, 3.14159)",
+        "mass": "skim_synth::falling(rdfslot_, n, 1., 0.)",
+        "pdgId": "skim_synth::ints(rdfslot_, n, -25, 25)",
+        "status": "skim_synth::ints(rdfslot_, n, 1, 70)",
+        "statusFlags": "skim_synth::ints(rdfslot_, n, 0, 32767)",
+        "genPartIdxMother": "skim_synth::ints(rdfslot_, n, -1, 10)",
+    }),
+    "LHEPart": (5.0, {
+        "pt": "skim_synth::falling(rdfslot_, n, 30., 0.)",
+        "eta": "skim_synth::gauss(rdfslot_, n, 0., 2.)",
+        "phi": "skim_synth::uniforms(rdfslot_, n, -3.14159, 3.14159)",
+        "mass": "skim_synth::falling(rdfslot_, n, 1., 0.)",
+        "pdgId": "skim_synth::ints(rdfslot_, n, -16, 16)",
+    }),
+    "GenJet": (5.0, {
+        "pt": "skim_synth::falling(rdfslot_, n, 30., 10.)",
+        "eta": "skim_synth::uniforms(rdfslot_, n, -5., 5.)",
+        "phi": "skim_synth::uniforms(rdfslot_, n, -3.14159, 3.14159)",
+        "mass": "skim_synth::falling(rdfslot_, n, 5., 0.)",
+    }),
+}
+
+# fixed-size weight arrays: {column: size}
+WEIGHT_ARRAYS = {"PSWeight": 4, "LHEPdfWeight": 101, "LHEScaleWeight": 9}
+
+SCALARS = {
+    "PV_ndof": "skim_synth::uniform(rdfslot_, 50., 200.)",
+    "PV_x": "skim_synth::gaus(rdfslot_, 0., 0.01)",
+    "PV_y": "skim_synth::gaus(rdfslot_, 0., 0.01)",
+    "PV_z": "skim_synth::gaus(rdfslot_, 0., 4.)",
+    "PV_chi2": "skim_synth::uniform(rdfslot_, 0.5, 2.)",
+    "PV_npvs": "skim_synth::poisson(rdfslot_, 50.)",
+    "PV_npvsGood": "std::max(0, PV_npvs - skim_synth::poisson(rdfslot_, 5.))",
+    "MET_pt": "skim_synth::expo(rdfslot_, 30.)",
+    "PuppiMET_pt": "skim_synth::expo(rdfslot_, 30.)",
+    "PuppiMET_phi": "skim_synth::uniform(rdfslot_, -3.14159, 3.14159)",
+    "GenMET_pt": "skim_synth::expo(rdfslot_, 30.)",
+    "GenMET_phi": "skim_synth::uniform(rdfslot_, -3.14159, 3.14159)",
+    "Pileup_nPU": "skim_synth::poisson(rdfslot_, 50.)",
+    "Pileup_nTrueInt": "skim_synth::gaus(rdfslot_, 50., 5.)",
+    "genWeight": "skim_synth::flag(rdfslot_, 0.95) ? 1.f : -1.f",
+    "LHEWeight_originalXWGTUP": "genWeight",
+    "Rho_fixedGridRhoFastjetAll": "skim_synth::gaus(rdfslot_, 20., 5.)",
+}
+
+
+def book_events(n_events, file_index, extra_columns=0, lepton_scale=1.0):
+    """RDataFrame with the synthetic Events columns (lazy)."""
+    df = ROOT.RDataFrame(n_events)
+    df = df.Define("run", "(UInt_t)1") \
+           .Define("luminosityBlock", f"(UInt_t)({file_index} * 1000 + rdfentry_ / 1000)") \
+           .Define("event", f"(ULong64_t)({file_index} * {n_events} + rdfentry_)")
+
+    # the first triggers fire often and the rest rarely, as in data
+    for i, trigger in enumerate(config.TRIGGERS):
+        df = df.Define(trigger, f"skim_synth::flag(rdfslot_, {0.4 if i < 4 else 0.05})")
+    for flag in config.MET_FILTERS:
+        df = df.Define(flag, "skim_synth::flag(rdfslot_, 0.995)")
+
+    for name, expr in SCALARS.items():
+        df = df.Define(name, expr)
+
+    for collection, (mean, columns) in COLLECTIONS.items():
+        if collection in ("Muon", "Electron"):
+            mean *= lepton_scale
+        df = df.Define(f"n{collection}", f"skim_synth::poisson(rdfslot_, {mean})")
+        for column, expr in columns.items():
+            df = df.Define(f"{collection}_{column}",
+                           f"int n = n{collection}; return {expr};")
+        # extra float columns to mimic the ~30-100 columns of real collections
+        for i in range(extra_columns):
+            df = df.Define(f"{collection}_extra{i}",
+                           f"skim_synth::uniforms(rdfslot_, n{collection}, 0., 1.)")
+
+    for name, size in WEIGHT_ARRAYS.items():
+        df = df.Define(f"n{name}", f"(int){size}") \
+               .Define(name, f"skim_synth::gauss(rdfslot_, {size}, 1., 0.05)")
+
+    return df
+
+
+def write_file(path, n_events, file_index, extra_columns=0, lepton_scale=1.0, seed=1):
+    """Write one synthetic file (Events + Runs); returns its genEventSumw."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    n_slots = max(1, ROOT.ROOT.GetThreadPoolSize())
+    ROOT.skim_synth.seed(n_slots, seed * 100000 + file_index)
+
+    df = book_events(n_events, file_index, extra_columns, lepton_scale)
+    sumw = df.Sum("genWeight")
+    sumw2 = df.Define("skimGenWeight2", "genWeight * genWeight").Sum("skimGenWeight2")
+    df.Snapshot("Events", path, df.GetDefinedColumnNames())
+
+    opts = ROOT.RDF.RSnapshotOptions()
+    opts.fMode = "UPDATE"
+    ROOT.RDataFrame(1) \
+        .Define("run", "(UInt_t)1") \
+        .Define("genEventCount", f"(Long64_t){n_events}") \
+        .Define("genEventSumw", f"(double){sumw.GetValue()}") \
+        .Define("genEventSumw2", f"(double){sumw2.GetValue()}") \
+        .Snapshot("Runs", path, ["run", "genEventCount", "genEventSumw", "genEventSumw2"], opts)
+
+    return sumw.GetValue()
+
+
+def generate(outdir, n_files=2, n_events=100000, extra_columns=0, lepton_scale=1.0,
+             files_per_part=1, seed=1, process="synthetic"):
+    """
+    Write n_files synthetic files below outdir and a bundle JSON
+    (<outdir>/bundle.json) with process `process`. Returns the JSON path.
+    """
+    files = []
+    total_sumw = 0.0
+    for i in range(n_files):
+        path = os.path.join(os.path.abspath(outdir), "store", "mc", "Synthetic", "NANOAODSIM",
+                            f"synth_{i}.root")
+        if not os.path.exists(path):
+            print(f"Writing {path} ({n_events} events)")
+            total_sumw += write_file(path, n_events, i, extra_columns, lepton_scale, seed)
+        else:
+            runs = ROOT.RDataFrame("Runs", path)
+            total_sumw += runs.Sum("genEventSumw").GetValue()
+        files.append(path)
+
+    parts = {f"part{n + 1}": files[i:i + files_per_part]
+             for n, i in enumerate(range(0, len(files), files_per_part))}
+    bundle = {
+        process: {
+            "metadata": {"cross_section_fb": 1000.0, "sum_genweight": total_sumw, "is_data": False},
+            "files": parts,
+        }
+    }
+    bundle_path = os.path.join(outdir, "bundle.json")
+    with open(bundle_path, "w") as f:
+        json.dump(bundle, f, indent=4)
+    print(f"Bundle written to {bundle_path}")
+    return bundle_path
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("outdir")
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--events", type=int, default=100000, help="events per file")
+    parser.add_argument("--extra-columns", type=int, default=0,
+                        help="extra float columns per collection")
+    parser.add_argument("--lepton-scale", type=float, default=1.0,
+                        help="scale of the mean muon/electron multiplicity (tunes the 3-lepton pass rate)")
+    parser.add_argument("--files-per-part", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    generate(args.outdir, args.files, args.events, args.extra_columns, args.lepton_scale,
+             args.files_per_part, args.seed)
@@ -0,0 +1,135 @@
+import fnmatch
+import os
+from typing import Dict, List
+
+# Always written, whatever the allow/deny/usage lists say
+ALWAYS_KEEP = ["run", "luminosityBlock", "event"]
+
+
+def collection_of(branch: str):
+    """
+    Return (collection, field) for a NanoAOD branch name.
+    "Jet_pt" -> ("Jet", "pt"), "nJet" -> ("Jet", None), "MET_pt" -> ("MET", "pt").
+    """
+    if "_" in branch:
+        collection, field = branch.split("_", 1)
+        return collection, field
+    if branch.startswith("n") and branch[1:2].isupper():
+        return branch[1:], None
+    return branch, None
+
+
+def apply_collection_rules(branches: List[str], allow: Dict[str, List[str]] = None,
+                           deny: Dict[str, List[str]] = None) -> List[str]:
+    """
+    Filter branches with per-collection allow/deny lists of field patterns.
+
+    A collection present in `allow` keeps only the fields matching one of
+    its patterns; `deny` then removes matching fields. Counter branches
+    (nJet, ...) are kept as long as one field of their collection is.
+    """
+    allow = allow or {}
+    deny = deny or {}
+
+    kept = []
+    for branch in branches:
+        collection, field = collection_of(branch)
+        if field is None:
+            kept.append(branch)
+            continue
+        if collection in allow and not any(fnmatch.fnmatchcase(field, p) for p in allow[collection]):
+            continue
+        if any(fnmatch.fnmatchcase(field, p) for p in deny.get(collection, [])):
+            continue
+        kept.append(branch)
+
+    # drop counters whose whole collection has been removed
+    removed = _collections(branches) - _collections(kept)
+    return [b for b in kept if collection_of(b)[1] is not None or collection_of(b)[0] not in removed]
+
+
+def _collections(branches: List[str]):
+    """Collections that have at least one field branch in the list."""
+    return set(collection_of(b)[0] for b in branches if collection_of(b)[1] is not None)
+
+
+def read_usage_file(filename: str) -> List[str]:
+    """Branch names or fnmatch patterns read downstream, one per line."""
+    if not os.path.exists(filename):
+        raise RuntimeError(f"{filename} not found!")
+
+    with open(filename, "r") as f:
+        return [l.strip() for l in f if l.strip() and not l.startswith("#")]
+
+
+def prune_unused(branches: List[str], used_patterns: List[str]) -> List[str]:
+    """
+    Keep only the branches some downstream analysis reads.
+    Counters of kept collections and ALWAYS_KEEP branches are never dropped.
+    """
+    kept = [
+        b for b in branches
+        if b in ALWAYS_KEEP or any(fnmatch.fnmatchcase(b, p) for p in used_patterns)
+    ]
+    kept_collections = _collections(kept)
+
+    for b in branches:
+        collection, field = collection_of(b)
+        if field is None and collection in kept_collections and b not in kept:
+            kept.append(b)
+
+    dropped = len(branches) - len(kept)
+    print(f"[INFO] Usage list keeps {len(kept)} branches, drops {dropped} never-used branches")
+    return [b for b in branches if b in kept]
+
+
+def estimate_branch_sizes(input_file: str, tree_name: str, branches: List[str]):
+    """
+    Read basket info of the input TTree (no event loop).
+    Returns ({branch: (compressed_bytes, uncompressed_bytes)}, n_entries).
+    """
+    import ROOT
+
+    f = ROOT.TFile.Open(input_file)
+    if not f or f.IsZombie():
+        raise RuntimeError(f"Could not open {input_file}")
+
+    tree = f.Get(tree_name)
+    if not tree:
+        f.Close()
+        raise RuntimeError(f"Tree '{tree_name}' not found in {input_file}")
+
+    sizes = {}
+    for name in branches:
+        branch = tree.GetBranch(name)
+        if not branch:
+            continue
+        sizes[name] = (branch.GetZipBytes("*"), branch.GetTotBytes("*"))
+
+    entries = tree.GetEntries()
+    f.Close()
+    return sizes, entries
+
+
+def print_budget(sizes: Dict[str, tuple], entries: int, n_files: int = 1, top: int = 30):
+    """
+    Print the per-branch size estimate, largest first, scaled to n_files
+    input files of the same size as the sampled one.
+    """
+    rows = [(b, z * n_files, t * n_files) for b, (z, t) in sizes.items()]
+    rows.sort(key=lambda r: -r[1])
+
+    total_zip = sum(r[1] for r in rows)
+    total_tot = sum(r[2] for r in rows)
+
+    print("\n--- Column Budget (estimated from basket info) ---")
+    print(f"Sampled entries per file : {entries}")
+    print(f"Files                    : {n_files}")
+    print(f"{'Branch':<45} {'compressed MB':>14} {'uncompr. MB':>12} {'share':>7}")
+    for branch, zipped, total in rows[:top]:
+        share = 100.0 * zipped / total_zip if total_zip else 0.0
+        print(f"{branch:<45} {zipped / 1e6:14.2f} {total / 1e6:12.2f} {share:6.1f}%")
+    if len(rows) > top:
+        rest = sum(r[1] for r in rows[top:])
+        print(f"{f'... {len(rows) - top} more branches':<45} {rest / 1e6:14.2f}")
+    print(f"{'TOTAL':<45} {total_zip / 1e6:14.2f} {total_tot / 1e6:12.2f}")
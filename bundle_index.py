@@ -0,0 +1,253 @@
+"""
+Indexed bundle format.
+
+The bundle JSON written by create_bundles_o_path.py is loaded whole by
+every job just to read one process/part. An index keeps the same content
+in SQLite, one row per part, with the redirector prefix of each URL
+stored once in a separate table:
+
+    prefixes(id, prefix)                    "root://cmsxrootd.fnal.gov/"
+    processes(name, position, info)         metadata, part_stats, ... as JSON
+    parts(process, part, position, units)   [[prefix_id, "/store/...", first, last], ...]
+
+so reading one part is a primary-key lookup. The JSON stays the exchange
+format: `python bundle_index.py import X.json X.sqlite` builds the index
+and `export` writes the JSON back.
+
+open_bundle() returns the same reader interface for either format.
+"""
+
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, List
+
+from work_units import Unit, is_ranged, unit_file, unit_range
+
+INDEX_SUFFIXES = (".sqlite", ".db", ".index")
+
+
+def split_url(url: str):
+    """(prefix, path) of a URL, split before /store/ ("" prefix for others)."""
+    index = url.find("/store/")
+    if index <= 0:
+        return "", url
+    return url[:index], url[index:]
+
+
+class JsonBundle:
+    """Reader over the plain bundle JSON (loaded once)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "r") as f:
+            self.data = json.load(f)
+
+    def processes(self) -> List[str]:
+        return list(self.data)
+
+    def info(self, process: str) -> Dict:
+        """Process block without its file lists (metadata, part_stats, ...)."""
+        block = self._block(process)
+        return {k: v for k, v in block.items() if k != "files"}
+
+    def part_names(self, process: str) -> List[str]:
+        return list(self._block(process).get("files", {}))
+
+    def part(self, process: str, part: str) -> List[Unit]:
+        files = self._block(process).get("files", {})
+        if part not in files:
+            raise RuntimeError(f"Part '{part}' not found")
+        return files[part]
+
+    def parts(self, process: str) -> Dict[str, List[Unit]]:
+        return dict(self._block(process).get("files", {}))
+
+    def _block(self, process):
+        if process not in self.data:
+            raise RuntimeError(f"Process '{process}' not found")
+        return self.data[process]
+
+    def close(self):
+        pass
+
+
+class BundleIndex:
+    """Reader/writer of the SQLite bundle index."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS prefixes (
+                id INTEGER PRIMARY KEY,
+                prefix TEXT UNIQUE);
+            CREATE TABLE IF NOT EXISTS processes (
+                name TEXT PRIMARY KEY,
+                position INTEGER,
+                info TEXT);
+            CREATE TABLE IF NOT EXISTS parts (
+                process TEXT,
+                part TEXT,
+                position INTEGER,
+                units TEXT,
+                PRIMARY KEY (process, part));
+        """)
+        self._prefixes = None
+
+    # ---- reading ----
+
+    def processes(self) -> List[str]:
+        return [r[0] for r in self._db.execute("SELECT name FROM processes ORDER BY position")]
+
+    def info(self, process: str) -> Dict:
+        row = self._db.execute("SELECT info FROM processes WHERE name = ?", (process,)).fetchone()
+        if row is None:
+            raise RuntimeError(f"Process '{process}' not found")
+        return json.loads(row[0])
+
+    def part_names(self, process: str) -> List[str]:
+        self.info(process)
+        return [r[0] for r in self._db.execute(
+            "SELECT part FROM parts WHERE process = ? ORDER BY position", (process,))]
+
+    def part(self, process: str, part: str) -> List[Unit]:
+        row = self._db.execute("SELECT units FROM parts WHERE process = ? AND part = ?",
+                               (process, part)).fetchone()
+        if row is None:
+            self.info(process)
+            raise RuntimeError(f"Part '{part}' not found")
+        return self._decode(row[0])
+
+    def parts(self, process: str) -> Dict[str, List[Unit]]:
+        self.info(process)
+        rows = self._db.execute("SELECT part, units FROM parts WHERE process = ? ORDER BY position",
+                                (process,))
+        return {part: self._decode(units) for part, units in rows}
+
+    def _decode(self, text) -> List[Unit]:
+        if self._prefixes is None:
+            self._prefixes = dict(self._db.execute("SELECT id, prefix FROM prefixes"))
+        units = []
+        for prefix_id, path, first, last in json.loads(text):
+            url = self._prefixes[prefix_id] + path
+            units.append(url if first is None else {"file": url, "first": first, "last": last})
+        return units
+
+    # ---- writing ----
+
+    def write_process(self, process: str, block: Dict, position: int = None):
+        """Store (or replace) one process block in bundle-JSON layout."""
+        with self._transaction() as db:
+            if position is None:
+                row = db.execute("SELECT position FROM processes WHERE name = ?", (process,)).fetchone()
+                if row is None:
+                    row = db.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM processes").fetchone()
+                position = row[0]
+
+            info = {k: v for k, v in block.items() if k != "files"}
+            db.execute("INSERT OR REPLACE INTO processes (name, position, info) VALUES (?, ?, ?)",
+                       (process, position, json.dumps(info)))
+            db.execute("DELETE FROM parts WHERE process = ?", (process,))
+            for n, (part, units) in enumerate(block.get("files", {}).items()):
+                db.execute("INSERT INTO parts (process, part, position, units) VALUES (?, ?, ?, ?)",
+                           (process, part, n, self._encode(db, units)))
+
+    def _encode(self, db, units: List[Unit]) -> str:
+        rows = []
+        for unit in units:
+            prefix, path = split_url(unit_file(unit))
+            prefix_id = self._prefix_id(db, prefix)
+            first, last = unit_range(unit) if is_ranged(unit) else (None, None)
+            rows.append([prefix_id, path, first, last])
+        return json.dumps(rows, separators=(",", ":"))
+
+    def _prefix_id(self, db, prefix):
+        if self._prefixes is None:
+            self._prefixes = dict(db.execute("SELECT id, prefix FROM prefixes"))
+        for prefix_id, known in self._prefixes.items():
+            if known == prefix:
+                return prefix_id
+        prefix_id = db.execute("INSERT INTO prefixes (prefix) VALUES (?)", (prefix,)).lastrowid
+        self._prefixes[prefix_id] = prefix
+        return prefix_id
+
+    @contextmanager
+    def _transaction(self):
+        with self._db:
+            yield self._db
+
+    def close(self):
+        self._db.close()
+
+
+def is_index(path: str) -> bool:
+    return path.endswith(INDEX_SUFFIXES)
+
+
+def open_bundle(path: str):
+    """JsonBundle or BundleIndex for path, chosen by its extension."""
+    if not os.path.exists(path):
+        raise RuntimeError(f"{path} not found!")
+    return BundleIndex(path) if is_index(path) else JsonBundle(path)
+
+
+def import_json(json_path: str, index_path: str):
+    """Build (or rebuild) the index at index_path from a bundle JSON."""
+    bundle = JsonBundle(json_path)
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    index = BundleIndex(index_path)
+    for position, process in enumerate(bundle.processes()):
+        index.write_process(process, bundle.data[process], position)
+    index.close()
+
+
+def export_json(index_path: str, json_path: str):
+    """Write the bundle JSON back from an index."""
+    index = open_bundle(index_path)
+    data = {}
+    for process in index.processes():
+        block = index.info(process)
+        block["files"] = index.parts(process)
+        data[process] = block
+    index.close()
+    with open(json_path, "w") as f:
+        json.dump(data, f, indent=4)
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert between bundle JSON and the SQLite bundle index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="build an index from a bundle JSON")
+    imp.add_argument("json_file")
+    imp.add_argument("index_file")
+    exp = sub.add_parser("export", help="write the bundle JSON of an index")
+    exp.add_argument("index_file")
+    exp.add_argument("json_file")
+    show = sub.add_parser("show", help="print the parts of a process (or the processes)")
+    show.add_argument("bundle")
+    show.add_argument("process", nargs="?")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        import_json(args.json_file, args.index_file)
+        print(f"Index written to {args.index_file}")
+
+    elif args.command == "export":
+        export_json(args.index_file, args.json_file)
+        print(f"JSON written to {args.json_file}")
+
+    elif args.command == "show":
+        bundle = open_bundle(args.bundle)
+        if args.process is None:
+            for process in bundle.processes():
+                print(f"{len(bundle.part_names(process)):6d} parts  {process}")
+        else:
+            for part, units in bundle.parts(args.process).items():
+                print(f"{part:<10} {len(units):5d} units")
+        bundle.close()
@@ -5,6 +5,7 @@ DATASET_NAME = "/WZto3LNu_TuneCP5_13p6TeV_powheg-pythia8/RunIII2024Summer24NanoA
 REDIRECTOR = "root://cmsxrootd.fnal.gov/"
 OUTPUT_FILE = "WZ_3L.root"
 TREE_NAME = "Events"
+# Bundle JSON, or its SQLite index (.sqlite/.db, see bundle_index.py)
 JSON_FILE = "JSON_files/Big_2024_MC_file.json"
 
 
@@ -196,3 +197,236 @@ BRANCHES_WILDCARD_DATA = [
     "Jet_*"
 ]
 
+
+
+# --- Object selections ---
+# Per collection, the objects written to the output: the <Collection>_*
+# arrays and n<Collection> keep only objects passing the expression, and
+# index columns into the collection (Muon_jetIdx, GenPart_genPartIdxMother,
+# ...) are remapped. The event filters still see every object.
+# None writes the collections unchanged.
+OBJECT_SELECTIONS = None
+# Example:
+# OBJECT_SELECTIONS = {
+#     "Jet": "Jet_pt > 20 && abs(Jet_eta) < 4.7",
+#     "GenJet": "GenJet_pt > 15",
+#     # hard process (bit 7) or last copy (bit 13)
+#     "GenPart": "(GenPart_statusFlags & ((1 << 7) | (1 << 13))) != 0",
+# }
+
+# --- Data deduplication across primary datasets ---
+# Process tags of overlapping data streams in priority order. The skim of a
+# listed dataset drops events whose (run, luminosityBlock, event) is in the
+# index of a dataset ahead of it; build those first with
+# `python dedup.py build <process>` (from the inputs, or --outputs DIR).
+# cache_runs: runs whose shards a lookup keeps memory-mapped (inputs are
+# ordered by run, so 1-2 is enough).
+DEDUP = {
+    "enabled": False,
+    "index_dir": "dedup_index",
+    "priority": [],
+    # "priority": ["Muon_2024C", "MuonEG_2024C", "EGamma_2024C"],
+    "cache_runs": 2,
+}
+
+# --- Parallel execution (runner.py PROCESS ALL) ---
+# Number of parts skimmed at the same time, each in its own process.
+# 1 keeps the old sequential loop.
+N_WORKERS = 1
+# EnableImplicitMT threads given to each worker; None splits the CPUs
+# allocated to the job (see N_THREADS) evenly
+THREADS_PER_WORKER = None
+# Build every part's graph up front and run them together through
+# ROOT.RDF.RunGraphs, so the filters/defines are jitted once per job
+# instead of once per part. Only used when N_WORKERS == 1.
+SHARED_GRAPH = False
+
+# --- Trigger filter ---
+# Count how many events fire each trigger (one extra histogram in the same
+# event loop, and every bit is evaluated). Off: the plain short-circuit OR.
+TRIGGER_COUNTS = False
+# Triggers of TRIGGERS that may be missing from an input (e.g. paths that
+# do not exist in one era); they are left out of the OR with a warning.
+# Any other missing trigger fails the part.
+TRIGGERS_OPTIONAL = []
+# JSON file accumulating per-trigger acceptance across runs (filled only by
+# runs with TRIGGER_COUNTS). When present, triggers are tested
+# most-accepting first. None disables it.
+TRIGGER_STATS_FILE = None
+
+# --- Column budget ---
+# Per-collection field patterns (fnmatch) applied after wildcard expansion.
+# A collection listed in BRANCH_ALLOW keeps only the matching fields,
+# BRANCH_DENY removes matching fields. Keys are the part before the first
+# "_" (e.g. "Jet" for Jet_pt); nJet is dropped if no Jet field is left.
+# Example: BRANCH_ALLOW = {"Jet": ["pt", "eta", "phi", "mass", "btag*", "jetId"]}
+BRANCH_ALLOW = {}
+BRANCH_DENY = {}
+# Text file listing the branches downstream analyses read (names or
+# patterns, one per line). When set, every other branch is dropped.
+BRANCH_USAGE_FILE = None
+
+# --- Output profiles (Snapshot compression and basket settings) ---
+# compression: ZLIB / LZMA / LZ4 / ZSTD, level: 1-9,
+# autoflush: entries (>0) or bytes (<0) per cluster, basket_size in bytes
+# (needs ROOT >= 6.30), split_level as in TTree::Branch.
+OUTPUT_PROFILES = {
+    # ROOT defaults (ZSTD/LZ4 depending on version, autoflush 30 MB)
+    "default": {},
+    # intermediate skims re-read soon: cheap to write and to decompress
+    "intermediate": {
+        "compression": "LZ4",
+        "level": 4,
+        "autoflush": -50000000,
+        "basket_size": 256000,
+        "split_level": 99,
+    },
+    # final skims stored on EOS
+    "archival": {
+        "compression": "ZSTD",
+        "level": 5,
+        "autoflush": -30000000,
+        "split_level": 99,
+    },
+    # smallest files, slow to write
+    "archival_lzma": {
+        "compression": "LZMA",
+        "level": 8,
+        "autoflush": -30000000,
+        "split_level": 99,
+    },
+}
+OUTPUT_PROFILE = "default"
+
+# Output format of the Events tree: "ttree" or "rntuple".
+# RNTuple needs a ROOT build with RNTuple Snapshot support, otherwise a
+# TTree is written.
+OUTPUT_FORMAT = "ttree"
+
+# --- Input staging ---
+# Copy the inputs of upcoming parts to local scratch in background threads
+# while the current part is processed. fetcher: "xrdcp", "tfile"
+# (TFile::Cp) or "local:/path" (LFNs looked up below a local directory).
+# scratch_dir None uses $_CONDOR_SCRATCH_DIR/staged_inputs (or /tmp).
+STAGING = {
+    "enabled": False,
+    "fetcher": "xrdcp",
+    "scratch_dir": None,
+    "lookahead": 4,     # files prefetched beyond the part in use
+    "max_gb": 20,       # disk budget for prefetched files
+    "threads": 2,
+}
+
+# --- Condor submission (make_condor_submit.py) ---
+# Predicted events of each part come from the part_stats of a balanced
+# bundle or, without them, events_per_unit / bytes_per_unit per unit.
+# Per job: request_cpus = events / events_per_cpu (1 to max_cpus),
+# memory = memory_base_mb + memory_per_cpu_mb * cpus, disk = disk_base_gb
+# + output_fraction of the input (+ the staged inputs when STAGING is on).
+# Parts lighter than target_events are grouped (up to max_parts_per_job
+# per job); parts above split_above * max_cpus * events_per_cpu are split
+# into jobs of max_cpus cpus (a single file by entry ranges).
+CONDOR = {
+    "target_events": 5e6,
+    "split_above": 1.5,
+    "max_parts_per_job": 20,
+    "events_per_cpu": 5e6,
+    "max_cpus": 8,
+    "memory_base_mb": 2000,
+    "memory_per_cpu_mb": 1000,
+    "disk_base_gb": 2,
+    "output_fraction": 0.1,
+    "events_per_unit": 200000,
+    "bytes_per_unit": 1e9,
+}
+
+# --- Output upload ---
+# Ship each finished output to `destination` in a background process while
+# the next part is skimmed (runner.py --upload-to DEST turns it on). The
+# remote adler32 must match before the local file is deleted (delete_local);
+# failed copies are retried `retries` times, backing off from backoff_s.
+# command: "xrdcp", "cp" (local directory or FUSE mount) or a template such
+# as ["gfal-copy", "-f", "{src}", "{dest}"] with checksum_command
+# ["gfal-sum", "{dest}", "ADLER32"]; without a checksum_command the local
+# copy is kept. On rerun, deleted outputs whose upload matches the
+# manifest checksum are not skimmed again.
+UPLOAD = {
+    "enabled": False,
+    "destination": None,
+    "command": "xrdcp",
+    "checksum_command": None,
+    "retries": 3,
+    "backoff_s": 30,
+    "delete_local": True,
+}
+
+# --- Input reading ---
+# TTreeCache and read-ahead settings. When set, the skimmer reads through a
+# TChain configured with cache_size_mb / learn_entries / cluster_prefetch
+# (effective for single-threaded loops). async_prefetch and
+# cache_size_factor go through gEnv and also apply under implicit MT.
+# None keeps ROOT's defaults.
+READ_OPTIONS = None
+# Example for remote NanoAOD:
+# READ_OPTIONS = {
+#     "cache_size_mb": 100,
+#     "learn_entries": 100,
+#     "cluster_prefetch": True,
+#     "async_prefetch": True,
+#     "cache_size_factor": 2.0,
+# }
+# Report bytes read, read calls and MB/s per input file after each part
+IO_STATS = True
+
+# --- Resumable runs ---
+# Keep <process>_<part tag>_manifest.json (one per job) with input
+# fingerprint, output size, adler32 checksum and event count of every
+# finished part. Parts whose output still matches, locally or at the UPLOAD
+# destination, are skipped on rerun (runner.py --force redoes them). With
+# uploads on, the manifest of a previous attempt is fetched from there.
+MANIFEST = True
+
+# --- DAS file-list cache (shared with create_bundles_o_path.py) ---
+DAS_CACHE = "JSON_files/das_cache.sqlite"
+DAS_CACHE_TTL_HOURS = 168
+
+# --- Sum of generator weights ---
+# Set True to read genEventSumw / genEventCount of the input Runs trees
+# during the skim (MC only). With GENWEIGHT_CACHE set, the per-file sums are
+# stored there and get_SumOfGenWeight/Get_SOGWeight.py does not read those
+# files again.
+GENWEIGHT_FROM_SKIM = False
+GENWEIGHT_CACHE = None
+# GENWEIGHT_CACHE = "JSON_files/genweight_cache.sqlite"
+# Copy the input Runs trees and a "genWeightSums" histogram into every
+# output (MC only), so outputs can be re-normalized without the inputs.
+WRITE_RUNS_TREE = True
+# Write the cutflow (events read and passing each filter) into every output
+# as a "skimCutflow" histogram; merge.py and hadd add them up.
+WRITE_CUTFLOW = True
+
+# --- Merging part outputs (merge.py) ---
+# Part outputs of a process are combined into files of about
+# MERGE_TARGET_GB, MERGE_JOBS merges at a time ("auto": allocated CPUs).
+# MERGE_PROFILE None keeps the compression of the inputs and copies the
+# compressed baskets as they are; the name of an OUTPUT_PROFILES entry
+# recompresses with its compression / level.
+MERGE_TARGET_GB = 4.0
+MERGE_JOBS = "auto"
+MERGE_PROFILE = None
+
+# --- Performance metrics ---
+# Per part: JIT time, event-loop time, events per filter, bytes read,
+# output size, peak RSS and threads, written as each part finishes to
+# <output>_metrics.json and appended to <process>_metrics.csv (collect
+# many jobs with metrics.py). With SHARED_GRAPH the timing and I/O are
+# those of the shared loop, given once per part under "shared_loop".
+METRICS = True
+
+# --- Threads ---
+# Implicit MT threads with one worker. "auto" uses the CPUs allocated to the
+# job: the smallest of the HTCondor slot Cpus, the cgroup CPU quota and the
+# affinity mask (so request_cpus = 1 runs single-threaded). 1 disables MT.
+N_THREADS = "auto"
+# Pin each worker (or the single process) to its own cores, NUMA node by node
+PIN_CORES = False
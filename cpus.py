@@ -0,0 +1,149 @@
+"""
+CPU allocation of the job and the size of ROOT's implicit MT pool.
+
+The number of usable CPUs is the smallest of what the batch system and the
+kernel grant this process:
+
+  - the HTCondor machine/job ad (Cpus / RequestCpus), found through
+    $_CONDOR_MACHINE_AD / $_CONDOR_JOB_AD on worker nodes
+  - the cgroup CPU quota (cgroup v2 cpu.max, v1 cpu.cfs_quota_us)
+  - the CPU affinity mask of the process
+
+so a `request_cpus = 1` job gets one thread instead of one per core of the
+shared node.
+"""
+
+import math
+import os
+import re
+from typing import List, Optional
+
+_CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def condor_cpus() -> Optional[int]:
+    """Cpus of the HTCondor slot (or RequestCpus of the job), None outside Condor."""
+    for env, keys in (("_CONDOR_MACHINE_AD", ("Cpus",)), ("_CONDOR_JOB_AD", ("RequestCpus", "CpusProvisioned"))):
+        path = os.environ.get(env)
+        if not path or not os.path.exists(path):
+            continue
+        with open(path, "r") as f:
+            ad = f.read()
+        for key in keys:
+            match = re.search(rf"^\s*{key}\s*=\s*(\d+)\s*$", ad, re.MULTILINE | re.IGNORECASE)
+            if match:
+                return max(1, int(match.group(1)))
+    return None
+
+
+def _read(path):
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _own_cgroup_dirs():
+    """cgroup directories of this process (v2 unified path and v1 cpu controller)."""
+    dirs = []
+    for line in (_read("/proc/self/cgroup") or "").splitlines():
+        _, controllers, path = line.split(":", 2)
+        if controllers == "":
+            dirs.append(os.path.join(_CGROUP_ROOT, path.lstrip("/")))
+        elif "cpu" in controllers.split(","):
+            for name in ("cpu", "cpu,cpuacct", "cpuacct,cpu"):
+                dirs.append(os.path.join(_CGROUP_ROOT, name, path.lstrip("/")))
+    # inside a container the own cgroup is usually mounted at the root
+    dirs += [_CGROUP_ROOT, os.path.join(_CGROUP_ROOT, "cpu")]
+    return dirs
+
+
+def cgroup_cpus() -> Optional[int]:
+    """CPUs allowed by the cgroup CPU quota, None if there is no quota."""
+    for d in _own_cgroup_dirs():
+        # cgroup v2: "max 100000" or "200000 100000"
+        value = _read(os.path.join(d, "cpu.max"))
+        if value:
+            quota, _, period = value.partition(" ")
+            if quota != "max" and period:
+                return max(1, math.ceil(int(quota) / int(period)))
+            return None
+        # cgroup v1
+        quota = _read(os.path.join(d, "cpu.cfs_quota_us"))
+        period = _read(os.path.join(d, "cpu.cfs_period_us"))
+        if quota and period:
+            if int(quota) > 0:
+                return max(1, math.ceil(int(quota) / int(period)))
+            return None
+    return None
+
+
+def affinity_cpus() -> List[int]:
+    """CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def allocated_cpus() -> int:
+    """Number of CPUs this job should use (see module docstring)."""
+    limits = [len(affinity_cpus()), condor_cpus(), cgroup_cpus()]
+    return max(1, min(n for n in limits if n))
+
+
+def numa_ordered_cpus() -> List[int]:
+    """Usable CPUs ordered by NUMA node, so contiguous slices stay on one node."""
+    usable = set(affinity_cpus())
+    ordered = []
+    node_dir = "/sys/devices/system/node"
+    nodes = sorted((n for n in os.listdir(node_dir) if re.fullmatch(r"node\d+", n)),
+                   key=lambda n: int(n[4:])) if os.path.isdir(node_dir) else []
+    for node in nodes:
+        for chunk in (_read(os.path.join(node_dir, node, "cpulist")) or "").split(","):
+            if not chunk:
+                continue
+            first, _, last = chunk.partition("-")
+            for cpu in range(int(first), int(last or first) + 1):
+                if cpu in usable and cpu not in ordered:
+                    ordered.append(cpu)
+    ordered += [cpu for cpu in sorted(usable) if cpu not in ordered]
+    return ordered
+
+
+def worker_cores(index: int, n_threads: int) -> List[int]:
+    """Cores of pool worker `index` when each worker gets n_threads of them."""
+    cpus = numa_ordered_cpus()
+    start = (index * n_threads) % len(cpus)
+    return [cpus[(start + i) % len(cpus)] for i in range(min(n_threads, len(cpus)))]
+
+
+def pin_cores(cores: List[int]):
+    """Restrict this process (and the threads it starts later) to cores."""
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+
+def resolve_threads(n_threads=None) -> int:
+    """Thread count from a config/CLI value: None or "auto" means allocated_cpus()."""
+    if n_threads in (None, "auto", 0):
+        return allocated_cpus()
+    return max(1, int(n_threads))
+
+
+def configure_threads(n_threads=None) -> int:
+    """
+    Size ROOT's implicit MT pool. 1 thread runs event loops sequentially
+    (no pool at all). Returns the number of threads used.
+    """
+    import ROOT
+
+    n = resolve_threads(n_threads)
+    if ROOT.ROOT.IsImplicitMTEnabled():
+        if ROOT.ROOT.GetThreadPoolSize() == n:
+            return n
+        ROOT.ROOT.DisableImplicitMT()
+    if n > 1:
+        ROOT.ROOT.EnableImplicitMT(n)
+    print(f"Implicit MT: {n} thread{'s' if n > 1 else ''}")
+    return n
@@ -1,45 +1,173 @@
 import os
+import sys
 import json
-import subprocess
+import heapq
+import math
+from concurrent.futures import ThreadPoolExecutor
 
+from bundle_index import import_json
+from das_cache import DAS_CLIENT, DEFAULT_CACHE, DEFAULT_TTL, DASCache, parse_file_details, run_das_query
 
-def query_das(dataset):
+
+def query_das(dataset, das_client=DAS_CLIENT, retries=3, backoff=2.0, cache=None, refresh="ttl"):
     """
     Query DAS and return list of ROOT files.
+    Failed queries are retried with exponential backoff.
+    With a DASCache, still-valid cached lists are returned without querying.
     """
+    if cache is not None:
+        return cache.get_files(dataset, refresh)
+
     print(f"Querying DAS for dataset:\n  {dataset}")
+    return run_das_query(f"file dataset={dataset}", das_client, retries, backoff)
 
-    cmd = f'dasgoclient --query="file dataset={dataset}"'
 
-    process = subprocess.Popen(
-        cmd,
-        shell=True,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
-    )
+def query_das_details(dataset, das_client=DAS_CLIENT, retries=3, backoff=2.0, cache=None, refresh="ttl"):
+    """
+    Query DAS and return [{"name", "size", "nevents"}] for every file.
+    """
+    if cache is not None:
+        return cache.get_file_details(dataset, refresh)
+
+    print(f"Querying DAS for dataset:\n  {dataset}")
+    return parse_file_details(
+        run_das_query(f"file dataset={dataset}", das_client, retries, backoff, as_json=True))
+
+
+def query_das_many(datasets, jobs=8, das_client=DAS_CLIENT, retries=3, backoff=2.0,
+                   cache=None, refresh="ttl", details=False):
+    """
+    Run query_das (query_das_details with details=True) for many datasets
+    with at most `jobs` queries at a time.
+    Returns {dataset: result} or {dataset: exception} for failed ones.
+    """
+    query = query_das_details if details else query_das
+
+    def one(dataset):
+        try:
+            return dataset, query(dataset, das_client, retries, backoff, cache, refresh)
+        except Exception as e:
+            return dataset, e
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        return dict(pool.map(one, datasets))
+
+
+def balance_parts(details, target_events=None, target_gb=None):
+    """
+    Pack files into parts of roughly target_events events (or target_gb
+    GB), using the per-file nevents / size from DAS.
+
+    The number of parts is total / target; files are then assigned
+    largest first to the currently lightest part, so every part ends up
+    close to the mean. Files inside a part keep their DAS order. Files with
+    unknown nevents/size count as the dataset average.
+    """
+    key = "nevents" if target_events else "size"
+    target = target_events if target_events else target_gb * 1e9
+
+    known = [d[key] for d in details if d.get(key)]
+    average = sum(known) / len(known) if known else 1
+    weights = [d[key] if d.get(key) else average for d in details]
+
+    n_parts = max(1, min(len(details), math.ceil(sum(weights) / target)))
+
+    heap = [(0, i) for i in range(n_parts)]
+    members = [[] for _ in range(n_parts)]
+    for index in sorted(range(len(details)), key=lambda i: -weights[i]):
+        load, part = heapq.heappop(heap)
+        members[part].append(index)
+        heapq.heappush(heap, (load + weights[index], part))
+
+    # parts ordered by their first file, files in DAS order
+    members = sorted((sorted(m) for m in members if m), key=lambda m: m[0])
+    return [[details[i] for i in m] for m in members]
+
 
-    stdout, stderr = process.communicate()
+def split_large_files(details, max_events):
+    """
+    Replace files with more than max_events events by entry-range units
+    of at most max_events events each (size scaled by the fraction of
+    entries). Ranged units carry "first" (included) and "last" (excluded).
+    """
+    units = []
+    for d in details:
+        n = d.get("nevents")
+        if not n or n <= max_events:
+            units.append(d)
+            continue
+
+        n_chunks = math.ceil(n / max_events)
+        step = math.ceil(n / n_chunks)
+        for first in range(0, n, step):
+            last = min(n, first + step)
+            units.append(dict(d, first=first, last=last, nevents=last - first,
+                              size=(d.get("size") or 0) * (last - first) // n))
+        print(f"  Split {d['name']} ({n} events) into {n_chunks} entry ranges")
+    return units
+
+
+def unit_entry(unit, redirector):
+    """Bundle JSON entry of a unit: the URL, or a {"file", "first", "last"} range."""
+    url = redirector + unit["name"]
+    if "first" in unit:
+        return {"file": url, "first": unit["first"], "last": unit["last"]}
+    return url
 
-    if process.returncode != 0:
-        raise RuntimeError(f"DAS error:\n{stderr.decode()}")
 
-    files = stdout.decode().strip().split("\n")
-    return [f for f in files if f]
+def part_stats(part):
+    """Predicted events / bytes / files of one part."""
+    return {
+        "nevents": sum(d.get("nevents") or 0 for d in part),
+        "bytes": sum(d.get("size") or 0 for d in part),
+        "n_files": len(set(d["name"] for d in part)),
+    }
+
+
+def print_part_report(tag, stats):
+    """Distribution of the predicted part sizes of one dataset."""
+    events = sorted(s["nevents"] for s in stats)
+    sizes = sorted(s["bytes"] for s in stats)
+    if not events:
+        return
+
+    mean = sum(events) / len(events)
+    print(f"  Predicted parts for {tag}: {len(stats)}")
+    print(f"    events / part : min {events[0]:,}  median {events[len(events) // 2]:,}  "
+          f"max {events[-1]:,}  (max/mean {events[-1] / mean if mean else 0:.2f})")
+    print(f"    GB / part     : min {sizes[0] / 1e9:.2f}  median {sizes[len(sizes) // 2] / 1e9:.2f}  "
+          f"max {sizes[-1] / 1e9:.2f}")
 
 
 def create_bundles_from_dataset_txt(
     txt_file,
     files_per_part=25,
     output_json="Big_2024_MC_file.json",
-    redirector="root://cmsxrootd.fnal.gov/"
+    redirector="root://cmsxrootd.fnal.gov/",
+    jobs=8,
+    das_client=DAS_CLIENT,
+    retries=3,
+    cache=None,
+    refresh="ttl",
+    target_events=None,
+    target_gb=None,
+    max_events_per_unit=None
 ):
     """
     Reads dataset + metadata from txt file.
-    Queries DAS.
-    Splits files into parts.
-    Writes structured JSON including metadata.
+    Queries DAS (up to `jobs` datasets concurrently, through the DASCache
+    `cache` if given).
+    Splits files into parts: files_per_part files each, or balanced to
+    target_events events / target_gb GB per part when one is given.
+    Files above max_events_per_unit events are first cut into entry-range
+    units (see work_units.py).
+    Writes structured JSON including metadata, and returns the tags of
+    the datasets whose DAS query failed (their previous entries are kept).
     """
 
+    balanced = bool(target_events or target_gb)
+    need_details = balanced or bool(max_events_per_unit)
+
     if not os.path.exists(txt_file):
         raise FileNotFoundError(f"{txt_file} not found")
 
@@ -55,6 +183,7 @@ def create_bundles_from_dataset_txt(
     with open(txt_file, "r") as f:
         lines = [line.strip() for line in f if line.strip()]
 
+    entries = []
     for line in lines:
 
         parts = line.split()
@@ -81,14 +210,35 @@ def create_bundles_from_dataset_txt(
         if len(parts) >= 4:
             sum_genweight = float(parts[3])
 
+        entries.append((dataset, tag, cross_section, sum_genweight, is_data))
+
+    # ---- Query DAS for all datasets ----
+    das_results = query_das_many(
+        [e[0] for e in entries], jobs=jobs, das_client=das_client, retries=retries,
+        cache=cache, refresh=refresh, details=need_details
+    )
+
+    failed = []
+    for dataset, tag, cross_section, sum_genweight, is_data in entries:
+
         print(f"\nProcessing tag: {tag}")
         print(f"  is_data = {is_data}")
         print(f"  cross_section = {cross_section} in fb")
         print(f"  sum_genweight = {sum_genweight}")
 
-        # ---- Query DAS ----
-        lfns = query_das(dataset)
-        files = [redirector + lfn for lfn in lfns]
+        result = das_results[dataset]
+        if isinstance(result, Exception):
+            print(f"DAS query failed for {tag}: {result}")
+            failed.append(tag)
+            continue
+
+        if need_details:
+            units = result
+            if max_events_per_unit:
+                units = split_large_files(result, max_events_per_unit)
+            files = [unit_entry(u, redirector) for u in units]
+        else:
+            files = [redirector + lfn for lfn in result]
         total_files = len(files)
 
         if total_files == 0:
@@ -108,13 +258,20 @@ def create_bundles_from_dataset_txt(
         }
 
         # ---- Split into parts ----
-        part_counter = 1
-        for i in range(0, total_files, files_per_part):
-            chunk = files[i: i + files_per_part]
-            tag_dict["files"][f"part{part_counter}"] = chunk
-            part_counter += 1
-
-        print(f"  -> Created {part_counter - 1} parts for {tag}")
+        if balanced:
+            tag_dict["part_stats"] = {}
+            for n, part in enumerate(balance_parts(units, target_events, target_gb), 1):
+                tag_dict["files"][f"part{n}"] = [unit_entry(u, redirector) for u in part]
+                tag_dict["part_stats"][f"part{n}"] = part_stats(part)
+            print_part_report(tag, list(tag_dict["part_stats"].values()))
+        else:
+            part_counter = 1
+            for i in range(0, total_files, files_per_part):
+                chunk = files[i: i + files_per_part]
+                tag_dict["files"][f"part{part_counter}"] = chunk
+                part_counter += 1
+
+        print(f"  -> Created {len(tag_dict['files'])} parts for {tag}")
 
         # Store in global cache
         full_cache[tag] = tag_dict
@@ -123,25 +280,70 @@ def create_bundles_from_dataset_txt(
     with open(output_json, "w") as f:
         json.dump(full_cache, f, indent=4)
 
-    print(f"\nSuccess: JSON written to {output_json}")
+    if failed:
+        print(f"\nERROR: DAS failed for {len(failed)} datasets, kept previous entries: {', '.join(failed)}")
+        print(f"JSON written to {output_json} without fresh file lists for them")
+    else:
+        print(f"\nSuccess: JSON written to {output_json}")
+    return failed
 
 
 # ------------------ Entry Point ------------------
 
 if __name__ == "__main__":
 
-    import sys
+    import argparse
 
-    if len(sys.argv) < 2:
-        print("Usage:")
-        print("  python create_bundles_o_path.py datasets.txt")
-        sys.exit(1)
-
-    txt_file = sys.argv[1]
-
-    create_bundles_from_dataset_txt(
-        txt_file=txt_file,
-        files_per_part=5,
-        output_json="JSON_files/2024_Data_file.json"
+    parser = argparse.ArgumentParser(
+        description="Build the JSON bundle of file parts from a datasets txt file."
+    )
+    parser.add_argument("txt_file", help="datasets file: DATASET TAG XSEC|DATA [SUM_GENWEIGHT]")
+    parser.add_argument("--output", default="JSON_files/2024_Data_file.json", help="output JSON")
+    parser.add_argument("--files-per-part", type=int, default=5)
+    parser.add_argument("--target-events", type=int, default=None,
+                        help="balance parts to about this many events (uses DAS file nevents)")
+    parser.add_argument("--target-gb", type=float, default=None,
+                        help="balance parts to about this many GB (uses DAS file size)")
+    parser.add_argument("--max-events-per-unit", type=int, default=None,
+                        help="cut files with more events into entry-range units")
+    parser.add_argument("--jobs", type=int, default=8, help="concurrent DAS queries")
+    parser.add_argument("--retries", type=int, default=3, help="retries per failed DAS query")
+    parser.add_argument("--das-client", default=DAS_CLIENT,
+                        help="DAS client command (e.g. a local fake dasgoclient script)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help="DAS file-list cache (SQLite)")
+    parser.add_argument("--no-cache", action="store_true", help="always query DAS, do not use the cache")
+    parser.add_argument("--refresh", choices=["ttl", "incremental", "force"], default="ttl",
+                        help="ttl: trust fresh entries; incremental: re-query only datasets changed "
+                             "in DAS; force: re-query everything")
+    parser.add_argument("--ttl-hours", type=float, default=DEFAULT_TTL / 3600)
+    parser.add_argument("--index", default=None,
+                        help="also write the SQLite bundle index (see bundle_index.py) to this path")
+    args = parser.parse_args()
+    if args.retries < 0:
+        parser.error("--retries must be >= 0")
+
+    cache = None
+    if not args.no_cache:
+        cache = DASCache(args.cache, ttl=args.ttl_hours * 3600,
+                         das_client=args.das_client, retries=args.retries)
+
+    failed = create_bundles_from_dataset_txt(
+        txt_file=args.txt_file,
+        files_per_part=args.files_per_part,
+        output_json=args.output,
+        jobs=args.jobs,
+        das_client=args.das_client,
+        retries=args.retries,
+        cache=cache,
+        refresh=args.refresh,
+        target_events=args.target_events,
+        target_gb=args.target_gb,
+        max_events_per_unit=args.max_events_per_unit
     )
 
+    if args.index:
+        import_json(args.output, args.index)
+        print(f"Index written to {args.index}")
+
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,221 @@
+import json
+import os
+import shlex
+import sqlite3
+import subprocess
+import time
+from contextlib import contextmanager
+
+DAS_CLIENT = "dasgoclient"
+
+# Shared by create_bundles_o_path.py, runner.py and get_SumOfGenWeight/
+DEFAULT_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "JSON_files", "das_cache.sqlite")
+DEFAULT_TTL = 7 * 24 * 3600
+
+
+def run_das_query(query, das_client=DAS_CLIENT, retries=0, backoff=2.0, as_json=False):
+    """
+    Run one DAS query and return its output lines (or the parsed JSON
+    with as_json=True). Failed queries are retried with exponential backoff.
+    """
+    if retries < 0:
+        raise ValueError(f"retries must be >= 0, got {retries}")
+    cmd = shlex.split(das_client) + [f"--query={query}"]
+    if as_json:
+        cmd.append("-json")
+
+    for attempt in range(retries + 1):
+
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate()
+
+        if process.returncode == 0:
+            if as_json:
+                return json.loads(stdout.decode() or "[]")
+            return [l for l in stdout.decode().strip().split("\n") if l]
+
+        if attempt < retries:
+            wait = backoff * 2 ** attempt
+            print(f"DAS query failed: {query} (attempt {attempt + 1}), retrying in {wait:.0f}s")
+            time.sleep(wait)
+
+    raise RuntimeError(f"DAS error:\n{stderr.decode()}")
+
+
+def parse_file_details(records):
+    """
+    [{"name", "size", "nevents"}] from the JSON of a 'file dataset=...'
+    query. DAS may return one record per service for the same file; their
+    fields are merged.
+    """
+    details = {}
+    for record in records:
+        for info in record.get("file", []):
+            name = info.get("name")
+            if not name:
+                continue
+            entry = details.setdefault(name, {"name": name, "size": None, "nevents": None})
+            for key in ("size", "nevents"):
+                if entry[key] is None and info.get(key) is not None:
+                    entry[key] = int(info[key])
+    return list(details.values())
+
+
+def dataset_status(dataset, das_client=DAS_CLIENT, retries=0):
+    """
+    (status, last_modification_date) of a dataset, from the cheap
+    'dataset' query. Used to tell whether a cached file list is stale.
+    """
+    records = run_das_query(f"dataset dataset={dataset}", das_client, retries, as_json=True)
+    for record in records:
+        for info in record.get("dataset", []):
+            if info.get("last_modification_date") is not None or info.get("status"):
+                return info.get("status"), info.get("last_modification_date")
+    return None, None
+
+
+class DASCache:
+    """
+    On-disk (SQLite) cache of DAS file lists keyed by dataset name.
+
+    refresh modes of get_files():
+      "ttl"          cached lists younger than ttl are used as is; older
+                     ones are kept if the dataset status and last
+                     modification date in DAS did not change
+      "incremental"  always check status/last modification, re-query the
+                     file list only if they changed
+      "force"        always re-query
+    """
+
+    def __init__(self, path=DEFAULT_CACHE, ttl=DEFAULT_TTL, das_client=DAS_CLIENT, retries=3):
+        self.path = path
+        self.ttl = ttl
+        self.das_client = das_client
+        self.retries = retries
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS datasets (
+                              dataset TEXT PRIMARY KEY,
+                              files TEXT,
+                              status TEXT,
+                              last_modified INTEGER,
+                              fetched REAL)""")
+            columns = [row[1] for row in db.execute("PRAGMA table_info(datasets)")]
+            if "details" not in columns:
+                db.execute("ALTER TABLE datasets ADD COLUMN details TEXT")
+
+    @contextmanager
+    def _connect(self):
+        # one connection per call: safe from the bundler's query threads
+        db = sqlite3.connect(self.path, timeout=60)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def lookup(self, dataset):
+        """Cached row as a dict, or None."""
+        with self._connect() as db:
+            row = db.execute("SELECT files, status, last_modified, fetched, details FROM datasets "
+                             "WHERE dataset = ?", (dataset,)).fetchone()
+        if row is None:
+            return None
+        return {"files": json.loads(row[0]), "status": row[1], "last_modified": row[2], "fetched": row[3],
+                "details": json.loads(row[4]) if row[4] else None}
+
+    def store(self, dataset, files, status=None, last_modified=None, details=None):
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO datasets (dataset, files, status, last_modified, fetched, details) "
+                       "VALUES (?, ?, ?, ?, ?, ?)",
+                       (dataset, json.dumps(files), status, last_modified, time.time(),
+                        json.dumps(details) if details is not None else None))
+
+    def touch(self, dataset):
+        with self._connect() as db:
+            db.execute("UPDATE datasets SET fetched = ? WHERE dataset = ?", (time.time(), dataset))
+
+    def invalidate(self, dataset=None):
+        """Drop one dataset (or everything with dataset=None) from the cache."""
+        with self._connect() as db:
+            if dataset is None:
+                db.execute("DELETE FROM datasets")
+            else:
+                db.execute("DELETE FROM datasets WHERE dataset = ?", (dataset,))
+
+    def get_files(self, dataset, refresh="ttl"):
+        """LFNs of a dataset, from the cache when it is still valid."""
+        return self._get(dataset, refresh, with_details=False)["files"]
+
+    def get_file_details(self, dataset, refresh="ttl"):
+        """[{"name", "size", "nevents"}] per file, from the cache when still valid."""
+        return self._get(dataset, refresh, with_details=True)["details"]
+
+    def _get(self, dataset, refresh, with_details):
+        cached = None if refresh == "force" else self.lookup(dataset)
+        if cached is not None and with_details and cached["details"] is None:
+            # only the plain file list was cached so far
+            cached = None
+
+        if cached is not None and refresh == "ttl" and time.time() - cached["fetched"] < self.ttl:
+            print(f"DAS cache hit: {dataset}")
+            return cached
+
+        status, last_modified = None, None
+        if cached is not None:
+            try:
+                status, last_modified = dataset_status(dataset, self.das_client, self.retries)
+            except RuntimeError as e:
+                print(f"[WARNING] DAS status query failed for {dataset}: {e}")
+
+            if last_modified is not None and \
+                    (status, last_modified) == (cached["status"], cached["last_modified"]):
+                print(f"DAS cache hit (unchanged in DAS): {dataset}")
+                self.touch(dataset)
+                return cached
+
+        print(f"Querying DAS for dataset:\n  {dataset}")
+        details = None
+        if with_details:
+            details = parse_file_details(
+                run_das_query(f"file dataset={dataset}", self.das_client, self.retries, as_json=True))
+            files = [d["name"] for d in details]
+        else:
+            files = run_das_query(f"file dataset={dataset}", self.das_client, self.retries)
+
+        if cached is None:
+            try:
+                status, last_modified = dataset_status(dataset, self.das_client, self.retries)
+            except RuntimeError as e:
+                print(f"[WARNING] DAS status query failed for {dataset}: {e}")
+
+        self.store(dataset, files, status, last_modified, details)
+        return {"files": files, "details": details}
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or invalidate the DAS file-list cache.")
+    parser.add_argument("--cache", default=DEFAULT_CACHE)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="list cached datasets")
+    inv = sub.add_parser("invalidate", help="drop datasets from the cache")
+    inv.add_argument("datasets", nargs="*", help="datasets to drop (all if none given)")
+    args = parser.parse_args()
+
+    cache = DASCache(args.cache)
+
+    if args.command == "list":
+        with cache._connect() as db:
+            rows = db.execute("SELECT dataset, files, status, fetched FROM datasets ORDER BY dataset").fetchall()
+        for dataset, files, status, fetched in rows:
+            age = (time.time() - fetched) / 3600
+            print(f"{len(json.loads(files)):6d} files  {str(status):<10} {age:8.1f} h  {dataset}")
+
+    elif args.command == "invalidate":
+        for dataset in args.datasets or [None]:
+            cache.invalidate(dataset)
+        print("Invalidated", ", ".join(args.datasets) if args.datasets else "all datasets")
@@ -0,0 +1,440 @@
+"""
+Event deduplication across overlapping primary datasets.
+
+The same collision can be recorded in several data streams (MuonEG and
+EGamma, ...). With DEDUP["priority"] listing the process tags in priority
+order, the skim of a dataset drops every event already present in a
+dataset ahead of it, so the outputs of all datasets can be added without
+a separate dedup pass.
+
+The event IDs of a dataset are kept in an index directory, one shard per
+run:
+
+    <index_dir>/<process>/run_<run>.u64    sorted, unique uint64 keys
+                                           (luminosityBlock << 44 | event)
+    <index_dir>/<process>/meta.json        events, runs and sources
+
+Building streams (run, luminosityBlock, event) through per-thread buffers
+of bounded size into sorted chunk files, merged per run at the end, so
+memory does not grow with the dataset. Lookups memory-map the shards of a
+run from every higher-priority index, keep the maps of `cache_runs` runs
+(LRU) and binary-search them: only the pages a search touches are read,
+and they are page cache the kernel can drop, not a copy of every key, so
+memory stays bounded however large a run is. NanoAOD files are ordered by
+run (and luminosity block), so a run is mapped about once per file and
+its searches stay on a few pages. Building again into an existing index
+adds to it (one builder per index at a time).
+
+Usage:
+    python dedup.py build MuonEG_2024C                        # event IDs of the bundle inputs
+    python dedup.py build MuonEG_2024C --outputs skims/       # or of the skim outputs
+    python dedup.py show MuonEG_2024C
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+from typing import Dict, List
+
+_DECLARED = [False]
+
+_CODE = """
+#include <algorithm>
+#include <cstdint>
+#include <cstdio>
+#include <fstream>
+#include <functional>
+#include <list>
+#include <map>
+#include <memory>
+#include <mutex>
+#include <queue>
+#include <string>
+#include <unordered_map>
+#include <utility>
+#include <vector>
+
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+namespace skim_dedup {
+
+constexpr int kEventBits = 44;
+
+inline std::uint64_t key(unsigned lumi, unsigned long long event) {
+    return (std::uint64_t(lumi) << kEventBits) | (event & ((1ULL << kEventBits) - 1));
+}
+
+inline std::string shard_name(const std::string &dir, unsigned run) {
+    return dir + "/run_" + std::to_string(run) + ".u64";
+}
+
+// read-only memory map of a sorted key file (empty if it does not exist)
+class MappedShard {
+public:
+    explicit MappedShard(const std::string &path) {
+        const int fd = ::open(path.c_str(), O_RDONLY);
+        if (fd < 0) return;
+        struct stat st;
+        if (::fstat(fd, &st) == 0 && st.st_size >= static_cast<off_t>(sizeof(std::uint64_t))) {
+            void *addr = ::mmap(nullptr, st.st_size, PROT_READ, MAP_SHARED, fd, 0);
+            if (addr != MAP_FAILED) {
+                fAddr = addr;
+                fBytes = st.st_size;
+                ::madvise(fAddr, fBytes, MADV_RANDOM);
+            }
+        }
+        ::close(fd);
+    }
+    ~MappedShard() { if (fAddr) ::munmap(fAddr, fBytes); }
+    MappedShard(const MappedShard &) = delete;
+    MappedShard &operator=(const MappedShard &) = delete;
+
+    const std::uint64_t *begin() const { return static_cast<const std::uint64_t *>(fAddr); }
+    const std::uint64_t *end() const { return begin() + (fAddr ? fBytes / sizeof(std::uint64_t) : 0); }
+
+private:
+    void *fAddr = nullptr;
+    std::size_t fBytes = 0;
+};
+
+// sequential reader of a sorted key file
+struct Reader {
+    std::ifstream in;
+    std::vector<std::uint64_t> buf;
+    std::size_t pos = 0, n = 0;
+    explicit Reader(const std::string &path) : in(path, std::ios::binary), buf(1 << 16) { Fill(); }
+    void Fill() {
+        in.read(reinterpret_cast<char *>(buf.data()), buf.size() * sizeof(std::uint64_t));
+        n = static_cast<std::size_t>(in.gcount()) / sizeof(std::uint64_t);
+        pos = 0;
+    }
+    bool Done() const { return pos >= n; }
+    std::uint64_t Peek() const { return buf[pos]; }
+    void Next() { if (++pos >= n && in) Fill(); }
+};
+
+// k-way merge of sorted key files into one sorted, unique file
+void merge_files(const std::vector<std::string> &inputs, const std::string &output) {
+    std::vector<std::unique_ptr<Reader>> readers;
+    for (auto &path : inputs) readers.emplace_back(new Reader(path));
+    using Item = std::pair<std::uint64_t, std::size_t>;
+    std::priority_queue<Item, std::vector<Item>, std::greater<Item>> heap;
+    for (std::size_t i = 0; i < readers.size(); ++i)
+        if (!readers[i]->Done()) heap.emplace(readers[i]->Peek(), i);
+
+    const std::string tmp = output + ".tmp";
+    std::ofstream out(tmp, std::ios::binary | std::ios::trunc);
+    std::vector<std::uint64_t> buf;
+    buf.reserve(1 << 16);
+    bool any = false;
+    std::uint64_t last = 0;
+    while (!heap.empty()) {
+        const Item top = heap.top();
+        heap.pop();
+        if (!any || top.first != last) {
+            buf.push_back(top.first);
+            last = top.first;
+            any = true;
+            if (buf.size() == buf.capacity()) {
+                out.write(reinterpret_cast<const char *>(buf.data()), buf.size() * sizeof(std::uint64_t));
+                buf.clear();
+            }
+        }
+        readers[top.second]->Next();
+        if (!readers[top.second]->Done()) heap.emplace(readers[top.second]->Peek(), top.second);
+    }
+    out.write(reinterpret_cast<const char *>(buf.data()), buf.size() * sizeof(std::uint64_t));
+    out.close();
+    std::rename(tmp.c_str(), output.c_str());
+}
+
+class Writer {
+public:
+    Writer(const std::string &dir, unsigned n_slots, std::size_t max_buffered)
+        : fDir(dir), fMax(std::max<std::size_t>(1, max_buffered / std::max(1u, n_slots))),
+          fSlots(n_slots), fCount(n_slots, 0) {}
+
+    void Add(unsigned slot, unsigned run, unsigned lumi, unsigned long long event) {
+        fSlots[slot][run].push_back(key(lumi, event));
+        if (++fCount[slot] >= fMax) Flush(slot);
+    }
+
+    // merge the chunks (and an existing shard) of every run; returns the runs written
+    std::vector<unsigned> Finish() {
+        for (unsigned slot = 0; slot < fSlots.size(); ++slot) Flush(slot);
+        std::vector<unsigned> runs;
+        for (auto &kv : fChunks) {
+            std::vector<std::string> inputs = kv.second;
+            const std::string shard = shard_name(fDir, kv.first);
+            if (std::ifstream(shard).good()) {
+                const std::string old = shard + ".old";
+                std::rename(shard.c_str(), old.c_str());
+                inputs.push_back(old);
+            }
+            merge_files(inputs, shard);
+            for (auto &path : inputs) std::remove(path.c_str());
+            runs.push_back(kv.first);
+        }
+        fChunks.clear();
+        return runs;
+    }
+
+private:
+    void Flush(unsigned slot) {
+        for (auto &kv : fSlots[slot]) WriteChunk(kv.first, kv.second);
+        fSlots[slot].clear();
+        fCount[slot] = 0;
+    }
+
+    void WriteChunk(unsigned run, std::vector<std::uint64_t> &keys) {
+        std::sort(keys.begin(), keys.end());
+        keys.erase(std::unique(keys.begin(), keys.end()), keys.end());
+        std::string name;
+        {
+            std::lock_guard<std::mutex> lock(fMutex);
+            auto &chunks = fChunks[run];
+            name = shard_name(fDir, run) + ".chunk" + std::to_string(chunks.size());
+            chunks.push_back(name);
+        }
+        std::ofstream out(name, std::ios::binary | std::ios::trunc);
+        out.write(reinterpret_cast<const char *>(keys.data()), keys.size() * sizeof(std::uint64_t));
+    }
+
+    std::string fDir;
+    std::size_t fMax;
+    std::vector<std::map<unsigned, std::vector<std::uint64_t>>> fSlots;
+    std::vector<std::size_t> fCount;
+    std::map<unsigned, std::vector<std::string>> fChunks;
+    std::mutex fMutex;
+};
+
+class Lookup {
+public:
+    using Shards = std::vector<std::unique_ptr<const MappedShard>>;
+
+    Lookup(const std::vector<std::string> &dirs, std::size_t cache_runs)
+        : fDirs(dirs), fCapacity(std::max<std::size_t>(1, cache_runs)) {}
+
+    bool Seen(unsigned run, unsigned lumi, unsigned long long event) {
+        // the run of the previous event of this thread needs no lock; rdfslot_
+        // cannot key it, concurrent graphs (RunGraphs) reuse the same slots
+        thread_local Last last;
+        if (last.owner != this || !last.shards || last.run != run) last = {this, run, Get(run)};
+        const std::uint64_t k = key(lumi, event);
+        for (auto &shard : *last.shards)
+            if (std::binary_search(shard->begin(), shard->end(), k)) return true;
+        return false;
+    }
+
+    std::size_t Loads() {
+        std::lock_guard<std::mutex> lock(fMutex);
+        return fLoads;
+    }
+
+private:
+    struct Last {
+        const Lookup *owner = nullptr;
+        unsigned run = 0;
+        std::shared_ptr<const Shards> shards;
+    };
+
+    std::shared_ptr<const Shards> Get(unsigned run) {
+        std::lock_guard<std::mutex> lock(fMutex);
+        auto it = fCache.find(run);
+        if (it != fCache.end()) {
+            fOrder.splice(fOrder.begin(), fOrder, it->second.second);
+            return it->second.first;
+        }
+        auto shards = std::make_shared<Shards>();
+        for (auto &dir : fDirs) shards->emplace_back(new MappedShard(shard_name(dir, run)));
+        ++fLoads;
+        fOrder.push_front(run);
+        fCache[run] = {shards, fOrder.begin()};
+        if (fCache.size() > fCapacity) {
+            fCache.erase(fOrder.back());
+            fOrder.pop_back();
+        }
+        return shards;
+    }
+
+    std::vector<std::string> fDirs;
+    std::size_t fCapacity;
+    std::size_t fLoads = 0;
+    std::mutex fMutex;
+    std::list<unsigned> fOrder;
+    std::unordered_map<unsigned, std::pair<std::shared_ptr<const Shards>, std::list<unsigned>::iterator>> fCache;
+};
+
+std::unique_ptr<Writer> gWriter;
+std::vector<std::unique_ptr<Lookup>> gLookups;
+
+void open_writer(const std::string &dir, unsigned n_slots, std::size_t max_buffered) {
+    gWriter.reset(new Writer(dir, n_slots, max_buffered));
+}
+
+int add(unsigned slot, unsigned run, unsigned lumi, unsigned long long event) {
+    gWriter->Add(slot, run, lumi, event);
+    return 1;
+}
+
+std::vector<unsigned> close_writer() {
+    auto runs = gWriter->Finish();
+    gWriter.reset();
+    return runs;
+}
+
+int add_lookup(const std::vector<std::string> &dirs, std::size_t cache_runs) {
+    gLookups.emplace_back(new Lookup(dirs, cache_runs));
+    return static_cast<int>(gLookups.size()) - 1;
+}
+
+bool seen(int id, unsigned run, unsigned lumi, unsigned long long event) {
+    return gLookups[id]->Seen(run, lumi, event);
+}
+
+std::size_t loads(int id) { return gLookups[id]->Loads(); }
+
+} // namespace skim_dedup
+"""
+
+# keys buffered in memory while building, over all threads (8 bytes each)
+DEFAULT_MAX_BUFFERED = 50_000_000
+
+# (index directories, cache_runs) -> lookup id, reused by later parts
+_LOOKUPS: Dict[tuple, int] = {}
+
+
+def _root():
+    """ROOT with the skim_dedup helpers declared (imported on first use)."""
+    import ROOT
+
+    if not _DECLARED[0]:
+        ROOT.gInterpreter.Declare(_CODE)
+        _DECLARED[0] = True
+    return ROOT
+
+
+def index_dir_of(index_dir: str, process: str) -> str:
+    return os.path.join(index_dir, process)
+
+
+def read_meta(index_dir: str, process: str) -> Dict:
+    """meta.json of an index ({} if the index does not exist)."""
+    path = os.path.join(index_dir_of(index_dir, process), "meta.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def higher_priority(process: str, priority: List[str]) -> List[str]:
+    """Processes whose events `process` must not repeat ([] if it is not in the list)."""
+    if process not in priority:
+        return []
+    return priority[:priority.index(process)]
+
+
+def build_index(process: str, files: List[str], index_dir: str, tree_name: str = "Events",
+                max_buffered: int = DEFAULT_MAX_BUFFERED) -> Dict:
+    """Add the event IDs of files to the index of process; returns its meta.json content."""
+    ROOT = _root()
+    directory = index_dir_of(index_dir, process)
+    os.makedirs(directory, exist_ok=True)
+
+    start = time.time()
+    df = ROOT.RDataFrame(tree_name, files)
+    ROOT.skim_dedup.open_writer(directory, df.GetNSlots(), max_buffered)
+    n_added = df.Define("skimDedupAdd", "skim_dedup::add(rdfslot_, run, luminosityBlock, event)") \
+                .Sum("skimDedupAdd")
+    try:
+        n_events = int(n_added.GetValue())
+    finally:
+        runs = [int(r) for r in ROOT.skim_dedup.close_writer()]
+
+    meta = read_meta(index_dir, process)
+    n_keys = {int(name[4:-4]): os.path.getsize(os.path.join(directory, name)) // 8
+              for name in os.listdir(directory) if name.startswith("run_") and name.endswith(".u64")}
+    meta.update(
+        process=process,
+        events=sum(n_keys.values()),
+        runs=len(n_keys),
+        largest_run_events=max(n_keys.values(), default=0),
+        sources=meta.get("sources", []) + files,
+        built=time.strftime("%Y-%m-%d %H:%M:%S"),
+    )
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=4)
+    print(f"Indexed {n_events} events of {process} in {len(runs)} runs "
+          f"({time.time() - start:.1f} s), index now {meta['events']} events")
+    return meta
+
+
+def dedup_filter(df, directories: List[str], cache_runs: int = 2, name: str = "Dedup"):
+    """
+    Filter dropping the events present in any of the index directories.
+    The lookup (and its locked cache of run shards) is shared by every
+    graph of the process that uses the same directories; the current run
+    is cached per thread, so graphs may run concurrently.
+    """
+    ROOT = _root()
+    key = (tuple(directories), cache_runs)
+    if key not in _LOOKUPS:
+        dirs = ROOT.std.vector("std::string")()
+        for d in directories:
+            dirs.push_back(d)
+        _LOOKUPS[key] = int(ROOT.skim_dedup.add_lookup(dirs, cache_runs))
+    return df.Filter(f"!skim_dedup::seen({_LOOKUPS[key]}, run, luminosityBlock, event)", name)
+
+
+if __name__ == "__main__":
+
+    import config
+    from bundle_index import open_bundle
+    from work_units import unit_files
+
+    settings = getattr(config, "DEDUP", None) or {}
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index-dir", default=settings.get("index_dir", "dedup_index"),
+                        help="directory of the indexes (default: config.DEDUP index_dir)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("build", help="add the event IDs of a process to its index")
+    p.add_argument("process_tag")
+    p.add_argument("--outputs", default=None,
+                   help="read the skim outputs <process>_part*.root in this directory instead of "
+                        "the bundle inputs")
+    p.add_argument("--max-buffered", type=int, default=DEFAULT_MAX_BUFFERED,
+                   help="event IDs held in memory before a chunk is written")
+    p.add_argument("--threads", default=None, help="implicit MT threads (default: config.N_THREADS)")
+    p = sub.add_parser("show", help="print the meta data of an index")
+    p.add_argument("process_tag")
+    args = parser.parse_args()
+
+    if args.command == "show":
+        meta = read_meta(args.index_dir, args.process_tag)
+        if not meta:
+            raise SystemExit(f"No index for {args.process_tag} in {args.index_dir}")
+        print(json.dumps({k: v for k, v in meta.items() if k != "sources"}, indent=4))
+        print(f"{len(meta.get('sources', []))} source files")
+
+    else:
+        from cpus import configure_threads
+
+        configure_threads(args.threads if args.threads is not None else getattr(config, "N_THREADS", "auto"))
+        if args.outputs:
+            files = sorted(glob.glob(os.path.join(args.outputs, f"{glob.escape(args.process_tag)}_part*.root")))
+        else:
+            bundle = open_bundle(config.JSON_FILE)
+            try:
+                files = unit_files([u for units in bundle.parts(args.process_tag).values() for u in units])
+            finally:
+                bundle.close()
+        if not files:
+            raise SystemExit(f"No files found for {args.process_tag}")
+        build_index(args.process_tag, files, args.index_dir, config.TREE_NAME, args.max_buffered)
@@ -0,0 +1,207 @@
+import re
+import ROOT
+from typing import Dict, List, Tuple
+
+# (expression, column types, return type) -> name of the declared C++ function.
+# Declaring goes through Cling once per process; every later graph
+# (next part, next skimmer) only calls the already compiled function.
+_COMPILED_EXPRESSIONS: Dict[Tuple[str, Tuple[str, ...], str], str] = {}
+
+_IDENTIFIER = re.compile(r"\b[A-Za-z_]\w*\b")
+
+
+def expression_columns(df, expression: str) -> List[str]:
+    """
+    Return the dataframe columns used in an expression, in order of appearance.
+    """
+    available = set(str(c) for c in df.GetColumnNames())
+    columns = []
+    for token in _IDENTIFIER.findall(expression):
+        if token in available and token not in columns:
+            columns.append(token)
+    return columns
+
+
+def compile_expression(df, expression: str, return_type: str = "bool") -> Tuple[str, List[str]]:
+    """
+    Declare `expression` as a C++ function of its columns (once per process)
+    and return (function_name, columns). return_type "auto" lets the
+    compiler deduce it (e.g. an RVec mask for a per-object selection).
+    """
+    columns = expression_columns(df, expression)
+    types = tuple(str(df.GetColumnType(c)) for c in columns)
+
+    key = (expression, types, return_type)
+    if key not in _COMPILED_EXPRESSIONS:
+        name = f"skim_expr_{len(_COMPILED_EXPRESSIONS)}"
+        args = ", ".join(f"const {t} &{c}" for t, c in zip(types, columns))
+        code = f"{return_type} {name}({args}) {{ return {expression}; }}"
+
+        if not ROOT.gInterpreter.Declare(code):
+            raise RuntimeError(f"Could not compile filter expression: {expression}")
+
+        _COMPILED_EXPRESSIONS[key] = name
+
+    return _COMPILED_EXPRESSIONS[key], columns
+
+
+def typed_filter(df, function: str, columns: List[str], name: str = ""):
+    """
+    df.Filter with the declared C++ function itself, so the graph calls it
+    through its type and nothing is jitted. Older PyROOT without C++
+    callables in Filter gets the "function(columns)" string instead.
+    """
+    try:
+        return df.Filter(getattr(ROOT, function), list(columns), name)
+    except TypeError:
+        return df.Filter(f"{function}({', '.join(columns)})", name)
+
+
+def typed_define(df, column: str, function: str, columns: List[str]):
+    """df.Define with the declared C++ function itself (see typed_filter)."""
+    try:
+        return df.Define(column, getattr(ROOT, function), list(columns))
+    except TypeError:
+        return df.Define(column, f"{function}({', '.join(columns)})")
+
+
+def typed_redefine(df, column: str, function: str, columns: List[str]):
+    """df.Redefine with the declared C++ function itself (see typed_filter)."""
+    try:
+        return df.Redefine(column, getattr(ROOT, function), list(columns))
+    except TypeError:
+        return df.Redefine(column, f"{function}({', '.join(columns)})")
+
+
+def compiled_filter(df, expression: str, name: str = ""):
+    """
+    Same as df.Filter(expression, name) but the expression body is compiled
+    once per process and shared by all graphs that use it.
+    """
+    function, columns = compile_expression(df, expression)
+    return typed_filter(df, function, columns, name)
+
+
+def compiled_define(df, column: str, expression: str):
+    """
+    Same as df.Define(column, expression) with the expression compiled
+    once per process; its type is deduced from the expression.
+    """
+    function, columns = compile_expression(df, expression, return_type="auto")
+    return typed_define(df, column, function, columns)
+
+
+ROOT.gInterpreter.Declare("""
+ROOT::RVec<int> skim_fired_bits(ULong64_t bits) {
+    ROOT::RVec<int> fired;
+    for (int i = 0; bits; ++i, bits >>= 1)
+        if (bits & 1ULL) fired.push_back(i);
+    return fired;
+}
+""")
+
+# (triggers, column types, mode) -> name of the declared C++ function
+_TRIGGER_FUNCTIONS: Dict[Tuple[Tuple[str, ...], Tuple[str, ...], str], str] = {}
+
+
+class TriggerFilter:
+    """
+    OR of HLT bits evaluated by a typed C++ function declared once per
+    trigger set, instead of a jitted " || ".join(triggers) string.
+
+    Triggers are tested in order of decreasing acceptance (order_hint, e.g.
+    the counts of a previous run) so the OR short-circuits on the first
+    bits. With count=True the function returns the fired bits as a mask
+    and per-trigger acceptance is histogrammed in the same event loop.
+
+    A trigger missing from the input is an error, as with the jitted
+    string, unless it is listed in `optional` (e.g. paths absent in one
+    era); those are dropped from the OR with a warning.
+    """
+
+    MAX_COUNTED = 64
+
+    def __init__(self, triggers: List[str], order_hint: Dict[str, float] = None, count: bool = False,
+                 optional: List[str] = None):
+        self.triggers = list(triggers)
+        self.optional = set(optional or [])
+        if order_hint:
+            # stable sort: unknown triggers keep their config order at the end
+            self.triggers.sort(key=lambda t: -order_hint.get(t, -1))
+        self.count = count
+        self.counts_hist = None
+        self.n_seen = None
+
+    def _declare(self, triggers, types, mode):
+        key = (tuple(triggers), tuple(types), mode)
+        if key in _TRIGGER_FUNCTIONS:
+            return _TRIGGER_FUNCTIONS[key]
+
+        name = f"skim_trigger_{mode}_{len(_TRIGGER_FUNCTIONS)}"
+        args = ", ".join(f"const {t} &b{i}" for i, t in enumerate(types))
+
+        if mode == "mask":
+            body = " | ".join(f"(ULong64_t(b{i} != 0) << {i})" for i in range(len(triggers)))
+            code = f"ULong64_t {name}({args}) {{ return {body}; }}"
+        else:
+            body = " || ".join(f"b{i}" for i in range(len(triggers)))
+            code = f"bool {name}({args}) {{ return {body}; }}"
+
+        if not ROOT.gInterpreter.Declare(code):
+            raise RuntimeError(f"Could not compile trigger function for {len(triggers)} triggers")
+
+        _TRIGGER_FUNCTIONS[key] = name
+        return name
+
+    def apply(self, df, name: str = "Combined Trigger Cut"):
+        """Return df filtered on the trigger OR, booking the acceptance counts."""
+
+        available = set(str(c) for c in df.GetColumnNames())
+        missing = [t for t in self.triggers if t not in available]
+        required = [t for t in missing if t not in self.optional]
+        if required:
+            raise RuntimeError(f"{len(required)} triggers not in input: {', '.join(required)} "
+                               f"(list them in TRIGGERS_OPTIONAL if they may be absent)")
+        if missing:
+            print(f"[WARNING] {len(missing)} optional triggers not in input, ignored: {', '.join(missing)}")
+            self.triggers = [t for t in self.triggers if t in available]
+
+        if not self.triggers:
+            raise RuntimeError("None of the requested triggers exist in the input")
+
+        types = [str(df.GetColumnType(t)) for t in self.triggers]
+
+        if self.count and len(self.triggers) > self.MAX_COUNTED:
+            print(f"[WARNING] More than {self.MAX_COUNTED} triggers, acceptance counts disabled")
+            self.count = False
+
+        if not self.count:
+            function = self._declare(self.triggers, types, "or")
+            return typed_filter(df, function, self.triggers, name)
+
+        function = self._declare(self.triggers, types, "mask")
+        n = len(self.triggers)
+
+        df = typed_define(df, "skimTriggerBits", function, self.triggers)
+        self.n_seen = df.Count()
+        self.counts_hist = df.Define("skimTriggerFired", "skim_fired_bits(skimTriggerBits)") \
+                             .Histo1D(("skimTriggerCounts", "", n, 0, n), "skimTriggerFired")
+
+        return df.Filter("skimTriggerBits != 0", name)
+
+    def acceptance(self) -> Dict[str, int]:
+        """Per-trigger number of events that fired it (after the event loop)."""
+        if self.counts_hist is None:
+            return {}
+        hist = self.counts_hist.GetValue()
+        return {t: int(hist.GetBinContent(i + 1)) for i, t in enumerate(self.triggers)}
+
+    def print_acceptance(self):
+        counts = self.acceptance()
+        if not counts:
+            return
+        n_seen = self.n_seen.GetValue()
+        print("\n--- Trigger Acceptance ---")
+        for trigger, n in sorted(counts.items(), key=lambda item: -item[1]):
+            frac = 100.0 * n / n_seen if n_seen else 0.0
+            print(f"  {trigger:<55} {n:>12} ({frac:6.2f}%)")
@@ -0,0 +1,104 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+from staging import lfn_of
+
+# Shared by get_SumOfGenWeight/Get_SOGWeight.py and runner.py
+DEFAULT_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "JSON_files", "genweight_cache.sqlite")
+
+
+class RunsSums:
+    """
+    Lazy per-file sums of genEventSumw and genEventCount over the Runs
+    tree of `files`. Results are booked with Take so the loops of many
+    datasets can run together through ROOT.RDF.RunGraphs. `df` is the
+    plain Runs dataframe, for actions that should share the same loop.
+    """
+
+    def __init__(self, files: List[str], tree_name: str = "Runs"):
+        import ROOT
+
+        self.files = list(files)
+        self.handles = []
+        self.df = None
+        if not self.files:
+            return
+
+        self.df = ROOT.RDataFrame(tree_name, self.files)
+        # sample names are "file/Runs"
+        df = self.df.DefinePerSample("skimGWFile", "std::string(rdfsampleinfo_.AsString())")
+        self.handles = [
+            df.Take["std::string"]("skimGWFile"),
+            df.Take["double"]("genEventSumw"),
+            df.Take["Long64_t"]("genEventCount"),
+        ]
+
+    def values(self) -> Dict[str, Tuple[float, int]]:
+        """{file: (sumw, count)}; runs the event loop if it has not run yet."""
+        sums = {f: (0.0, 0) for f in self.files}
+        if not self.handles:
+            return sums
+
+        names, sumw, count = (h.GetValue() for h in self.handles)
+        by_name = {}
+        for f in self.files:
+            by_name[f] = f
+            by_name[lfn_of(f)] = f
+        for name, w, n in zip(names, sumw, count):
+            name = str(name).rsplit("/", 1)[0]
+            f = by_name.get(name, by_name.get(lfn_of(name), name))
+            old_w, old_n = sums.get(f, (0.0, 0))
+            sums[f] = (old_w + float(w), old_n + int(n))
+        return sums
+
+
+class GenWeightCache:
+    """
+    On-disk (SQLite) cache of per-file genEventSumw / genEventCount keyed
+    by LFN, so redirectors and staged copies share entries. Files of a
+    NanoAOD dataset never change, so a cached entry stays valid and only
+    files new to a dataset need to be read.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS files (
+                              lfn TEXT PRIMARY KEY,
+                              sumw REAL,
+                              count INTEGER,
+                              computed REAL)""")
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=60)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def lookup(self, files: Iterable[str]) -> Dict[str, Tuple[float, int]]:
+        """{file: (sumw, count)} for the files already in the cache."""
+        keys = {lfn_of(f): f for f in files}
+        found = {}
+        with self._connect() as db:
+            names = list(keys)
+            # stay below SQLite's bound-parameter limit
+            for i in range(0, len(names), 500):
+                chunk = names[i:i + 500]
+                rows = db.execute(f"SELECT lfn, sumw, count FROM files WHERE lfn IN "
+                                  f"({','.join('?' * len(chunk))})", chunk)
+                for lfn, sumw, count in rows:
+                    found[keys[lfn]] = (sumw, count)
+        return found
+
+    def store(self, sums: Dict[str, Tuple[float, int]]):
+        now = time.time()
+        with self._connect() as db:
+            db.executemany("INSERT OR REPLACE INTO files (lfn, sumw, count, computed) VALUES (?, ?, ?, ?)",
+                           [(lfn_of(f), float(w), int(n), now) for f, (w, n) in sums.items()])
@@ -1,8 +1,14 @@
-import ROOT
-import subprocess
+import os
+import sys
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from cpus import configure_threads
+from das_cache import DASCache
+from genweight_cache import DEFAULT_CACHE, GenWeightCache, RunsSums
+
 # === User Config ===
 redirector = "root://cmsxrootd.fnal.gov/"
 dataset_file = "GetGnWeight.txt"
@@ -24,33 +30,27 @@ def read_datasets(filename):
 # DAS query
 # ---------------------------------------------------------
 def get_das_files(dataset):
-    cmd = ["dasgoclient", "-query", f"file dataset={dataset}"]
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-
-    if result.returncode != 0:
+    # shared on-disk cache: frozen datasets are not re-queried
+    try:
+        files = DASCache().get_files(dataset)
+    except RuntimeError:
         print(f"[ERROR] DAS failed for {dataset}")
         return []
 
-    files = result.stdout.strip().split("\n")
     return [redirector + f for f in files if f.strip()]
 
 
 # ---------------------------------------------------------
-# RDataFrame genEventSumw calculation
+# Per-file genEventSumw, from the cache or the Runs trees
 # ---------------------------------------------------------
-def sum_genEventSumw_rdf(files):
-
-    if not files:
-        return 0.0
-
-    try:
-        df = ROOT.RDataFrame("Runs", files)
-        total = df.Sum("genEventSumw").GetValue()
-        return total
-
-    except Exception as e:
-        print(f"[ERROR] RDF failed: {e}")
-        return 0.0
+def sum_genEventSumw_rdf(files, cache=None):
+    """
+    Book the per-file sums of the files not yet in the cache.
+    Returns (cached {file: (sumw, count)}, RunsSums of the rest).
+    """
+    cached = cache.lookup(files) if cache is not None else {}
+    missing = [f for f in files if f not in cached]
+    return cached, RunsSums(missing)
 
 
 # ---------------------------------------------------------
@@ -60,7 +60,12 @@ def get_short_name(dataset):
 
 
 # ---------------------------------------------------------
-def process_all():
+def process_all(jobs=8, cache=None):
+    """
+    File lists of all datasets are queried concurrently (jobs threads),
+    then the Runs trees of every file missing from the cache are read in
+    one ROOT.RDF.RunGraphs call across datasets.
+    """
 
     datasets = read_datasets(dataset_file)
 
@@ -70,13 +75,16 @@ def process_all():
     print(f"Processing {len(datasets)} datasets")
     print("="*80)
 
-    for i, dataset in enumerate(datasets, 1):
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        file_lists = list(pool.map(get_das_files, datasets))
+
+    booked = []
+
+    for i, (dataset, files) in enumerate(zip(datasets, file_lists), 1):
 
         short_name = get_short_name(dataset)
         print(f"\n[{i}/{len(datasets)}] {short_name}")
 
-        files = get_das_files(dataset)
-
         if not files:
             print("  No files found.")
             results[short_name] = {
@@ -87,14 +95,47 @@ def process_all():
             }
             continue
 
-        print(f"  Found {len(files)} files")
+        cached, runs_sums = sum_genEventSumw_rdf(files, cache)
+        print(f"  Found {len(files)} files ({len(cached)} cached, {len(runs_sums.files)} to read)")
+        booked.append((short_name, dataset, files, cached, runs_sums))
+
+    handles = [h for *_, runs_sums in booked for h in runs_sums.handles]
+    if handles:
+        import ROOT
+
+        print(f"\nReading the Runs trees of {sum(len(b[-1].files) for b in booked)} files")
+        try:
+            ROOT.RDF.RunGraphs(handles)
+        except Exception as e:
+            # one bad file fails the shared loop: fall back to one loop per dataset
+            print(f"[ERROR] RDF failed: {e}, retrying dataset by dataset")
+
+    for short_name, dataset, files, cached, runs_sums in booked:
+
+        try:
+            new = runs_sums.values()
+        except Exception as e:
+            print(f"[ERROR] RDF failed for {short_name}: {e}")
+            results[short_name] = {
+                "dataset": dataset,
+                "total_genEventSumw": 0.0,
+                "num_files": len(files),
+                "status": "failed"
+            }
+            continue
+
+        if cache is not None and new:
+            cache.store(new)
 
-        total_sumw = sum_genEventSumw_rdf(files)
+        sums = dict(cached, **new)
+        total_sumw = sum(sums[f][0] for f in files)
 
         results[short_name] = {
             "dataset": dataset,
             "total_genEventSumw": float(total_sumw),
+            "total_genEventCount": int(sum(sums[f][1] for f in files)),
             "num_files": len(files),
+            "num_files_read": len(new),
             "status": "success"
         }
 
@@ -134,9 +175,21 @@ def save_results(results, summary_lines):
 # ---------------------------------------------------------
 if __name__ == "__main__":
 
-    ROOT.ROOT.EnableImplicitMT()   # Multithreading
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sum genEventSumw over the files of each dataset.")
+    parser.add_argument("--datasets", default=dataset_file, help="txt file with one dataset per line")
+    parser.add_argument("--jobs", type=int, default=8, help="concurrent DAS queries")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help="per-file genEventSumw cache (SQLite)")
+    parser.add_argument("--no-cache", action="store_true", help="read every file, do not use the cache")
+    args = parser.parse_args()
+
+    dataset_file = args.datasets
+    cache = None if args.no_cache else GenWeightCache(args.cache)
+
+    configure_threads()   # Multithreading, sized to the allocated CPUs
 
-    results, summary_lines = process_all()
+    results, summary_lines = process_all(jobs=args.jobs, cache=cache)
     save_results(results, summary_lines)
 
     print("\nDone.")
@@ -0,0 +1,229 @@
+import ROOT
+from typing import Dict
+
+ROOT.gInterpreter.Declare("""
+#include <chrono>
+#include <map>
+#include <mutex>
+#include <string>
+#include <vector>
+
+namespace skim_io {
+
+struct FileStats { Long64_t bytes = 0; Long64_t calls = 0; Long64_t entries = 0; double seconds = 0.; };
+
+struct Recorder {
+    std::map<std::string, FileStats> files;
+    // per slot: sample in progress and counters when it started
+    std::vector<std::string> current;
+    std::vector<Long64_t> bytes0, calls0;
+    std::vector<double> t0;
+    // counters at the first mark (start of the event loop) and at finish()
+    bool started = false;
+    double tStart = 0., tEnd = 0.;
+    Long64_t bytesStart = 0, callsStart = 0, bytesEnd = 0, callsEnd = 0;
+};
+
+std::mutex gMutex;
+std::map<int, Recorder> gRecorders;
+
+double now() {
+    return std::chrono::duration<double>(std::chrono::steady_clock::now().time_since_epoch()).count();
+}
+
+void close_slot(Recorder &r, unsigned slot, double t, Long64_t bytes, Long64_t calls) {
+    if (slot >= r.current.size() || r.current[slot].empty()) return;
+    auto &s = r.files[r.current[slot]];
+    s.bytes += bytes - r.bytes0[slot];
+    s.calls += calls - r.calls0[slot];
+    s.seconds += t - r.t0[slot];
+    r.current[slot].clear();
+}
+
+int mark(int id, unsigned slot, const ROOT::RDF::RSampleInfo &info) {
+    std::lock_guard<std::mutex> lock(gMutex);
+    auto &r = gRecorders[id];
+    if (slot >= r.current.size()) {
+        r.current.resize(slot + 1); r.bytes0.resize(slot + 1);
+        r.calls0.resize(slot + 1); r.t0.resize(slot + 1);
+    }
+    double t = now();
+    Long64_t bytes = TFile::GetFileBytesRead(), calls = TFile::GetFileReadCalls();
+    if (!r.started) {
+        r.started = true;
+        r.tStart = t; r.bytesStart = bytes; r.callsStart = calls;
+    }
+    close_slot(r, slot, t, bytes, calls);
+    r.current[slot] = info.AsString();
+    r.files[r.current[slot]].entries += info.EntryRange().second - info.EntryRange().first;
+    r.bytes0[slot] = bytes; r.calls0[slot] = calls; r.t0[slot] = t;
+    return 0;
+}
+
+void finish(int id) {
+    std::lock_guard<std::mutex> lock(gMutex);
+    auto &r = gRecorders[id];
+    double t = now();
+    Long64_t bytes = TFile::GetFileBytesRead(), calls = TFile::GetFileReadCalls();
+    for (unsigned slot = 0; slot < r.current.size(); ++slot)
+        close_slot(r, slot, t, bytes, calls);
+    r.tEnd = t; r.bytesEnd = bytes; r.callsEnd = calls;
+}
+
+// bytes read, read calls and seconds from the first mark to finish()
+std::vector<double> totals(int id) {
+    std::lock_guard<std::mutex> lock(gMutex);
+    auto &r = gRecorders[id];
+    if (!r.started) return {0., 0., 0.};
+    return {double(r.bytesEnd - r.bytesStart), double(r.callsEnd - r.callsStart), r.tEnd - r.tStart};
+}
+
+std::vector<std::string> file_names(int id) {
+    std::lock_guard<std::mutex> lock(gMutex);
+    std::vector<std::string> names;
+    for (auto &kv : gRecorders[id].files) names.push_back(kv.first);
+    return names;
+}
+
+std::vector<double> file_stats(int id, const std::string &name) {
+    std::lock_guard<std::mutex> lock(gMutex);
+    auto &s = gRecorders[id].files[name];
+    return {double(s.bytes), double(s.calls), s.seconds, double(s.entries)};
+}
+
+} // namespace skim_io
+""")
+
+_NEXT_ID = [0]
+
+
+def apply_read_options(read_options: Dict = None):
+    """
+    Process-wide read settings that also reach the trees RDataFrame opens
+    itself under implicit MT.
+    """
+    read_options = read_options or {}
+    if read_options.get("async_prefetch"):
+        ROOT.gEnv.SetValue("TFile.AsyncPrefetching", 1)
+    if read_options.get("cache_size_factor"):
+        ROOT.gEnv.SetValue("TTreeCache.Size", float(read_options["cache_size_factor"]))
+
+
+def make_chain(tree_name: str, input_files, read_options: Dict = None):
+    """
+    TChain over input_files with TTreeCache size, learning entries and
+    cluster prefetching set from read_options. These per-chain settings
+    apply to single-threaded event loops; under implicit MT RDataFrame
+    builds its own trees and only apply_read_options() settings are used.
+    """
+    read_options = read_options or {}
+    apply_read_options(read_options)
+
+    chain = ROOT.TChain(tree_name)
+    for f in ([input_files] if isinstance(input_files, str) else input_files):
+        chain.Add(f)
+
+    if read_options.get("cache_size_mb") is not None:
+        chain.SetCacheSize(int(read_options["cache_size_mb"] * 1024 * 1024))
+    if read_options.get("learn_entries") is not None:
+        chain.SetCacheLearnEntries(int(read_options["learn_entries"]))
+    if read_options.get("cluster_prefetch") is not None:
+        chain.SetClusterPrefetch(bool(read_options["cluster_prefetch"]))
+
+    return chain
+
+
+class IOStats:
+    """
+    Bytes read, number of read calls and effective MB/s per input file,
+    from TFile's global read counters sampled at every file switch.
+
+    The counters are process-wide. With one slot the difference across a
+    file is exactly its reads. With several slots every delta also holds
+    the reads of the other threads, so the measured total is split over
+    the files in proportion to the compressed bytes of the entries each
+    one contributed, and read calls are not given per file. "seconds" of
+    a file is the slot time spent in it; the totals run from the first
+    entry of the event loop (no JIT time) and are exact for the process.
+    """
+
+    def __init__(self):
+        self.id = _NEXT_ID[0]
+        _NEXT_ID[0] += 1
+        self.n_slots = 1
+        self.totals = None
+
+    def attach(self, df):
+        """Book the per-file marks on df (no extra columns are written)."""
+        self.n_slots = int(df.GetNSlots())
+        return df.DefinePerSample("skimIOMark", f"skim_io::mark({self.id}, rdfslot_, rdfsampleinfo_)")
+
+    def finish(self):
+        ROOT.skim_io.finish(self.id)
+        nbytes, calls, elapsed = ROOT.skim_io.totals(self.id)
+        self.totals = {
+            "bytes_read": int(nbytes),
+            "read_calls": int(calls),
+            "seconds": elapsed,
+            "MBps": nbytes / 1e6 / elapsed if elapsed else 0.0,
+        }
+        return self.totals
+
+    def per_file(self) -> Dict[str, Dict]:
+        """
+        {file: {bytes_read, read_calls, seconds, MBps}} after finish();
+        read_calls is None with several slots (see class docstring).
+        """
+        files = {}
+        for sample in ROOT.skim_io.file_names(self.id):
+            nbytes, calls, seconds, entries = ROOT.skim_io.file_stats(self.id, sample)
+            # sample names are "file/tree", several entries may share a file
+            name, tree_name = str(sample).rsplit("/", 1)
+            entry = files.setdefault(name, {"bytes_read": 0, "read_calls": 0, "seconds": 0.0,
+                                            "tree": tree_name, "entries": 0})
+            entry["bytes_read"] += int(nbytes)
+            entry["read_calls"] += int(calls)
+            entry["seconds"] += seconds
+            entry["entries"] += int(entries)
+
+        if self.n_slots > 1 and files:
+            weights = {name: self._compressed_bytes(name, e["tree"], e["entries"])
+                       for name, e in files.items()}
+            total_weight = sum(weights.values())
+            for name, entry in files.items():
+                share = weights[name] / total_weight if total_weight else 1.0 / len(files)
+                entry["bytes_read"] = int(self.totals["bytes_read"] * share)
+                entry["read_calls"] = None
+
+        for entry in files.values():
+            del entry["tree"], entry["entries"]
+            entry["MBps"] = entry["bytes_read"] / 1e6 / entry["seconds"] if entry["seconds"] else 0.0
+        return files
+
+    @staticmethod
+    def _compressed_bytes(name, tree_name, entries):
+        """Compressed bytes of `entries` entries of the tree in file name (0 if it cannot be read)."""
+        tfile = ROOT.TFile.Open(name)
+        if not tfile or tfile.IsZombie():
+            return 0
+        try:
+            tree = tfile.Get(tree_name)
+            if not tree or not tree.GetEntries():
+                return 0
+            return tree.GetZipBytes() * entries / tree.GetEntries()
+        finally:
+            tfile.Close()
+
+    def print_report(self):
+        if self.totals is None:
+            return
+        print("\n--- Input I/O ---")
+        if self.n_slots > 1:
+            print(f"  ({self.n_slots} slots: per-file bytes are shares of the total)")
+        for name, s in self.per_file().items():
+            print(f"  {name}")
+            reads = f"{s['read_calls'] if s['read_calls'] is not None else '-':>8} reads"
+            print(f"      {s['bytes_read'] / 1e6:10.1f} MB  {reads}  {s['MBps']:8.1f} MB/s")
+        t = self.totals
+        print(f"  TOTAL {t['bytes_read'] / 1e6:10.1f} MB  {t['read_calls']:8d} reads  "
+              f"{t['MBps']:8.1f} MB/s over {t['seconds']:.1f} s")
@@ -1,4 +1,5 @@
 from skimmer import AnalysisSkimmer
+from cpus import configure_threads
 
 def main():
     # --- Configuration ---
@@ -28,6 +29,9 @@ def main():
     ]
 
     # --- Execution ---
+
+    # Threads matched to the CPUs allocated to this job
+    configure_threads()
     
     # 1. Initialize
     skimmer = AnalysisSkimmer(INPUT_FILE, TREE_NAME)
@@ -1,41 +1,169 @@
-import json
+"""
+Condor submit file for the parts of a bundle.
 
-# Read your JSON bundle file
-with open("JSON_files/Big_2024_MC_file.json") as f:
-    cache = json.load(f)
+Instead of one arguments/queue stanza per part, the jobs go into an
+itemdata file read by a single `queue ... from` statement:
 
-submit_filename = "submit.jdl"
+    arguments      = $(process) $(parts)
+    request_cpus   = $(cpus)
+    ...
+    queue process,parts,cpus,memory_mb,disk_gb from submit_jobs.txt
 
-with open(submit_filename, "w") as sub:
+Jobs are planned per process from the predicted cost of each part
+(part_stats of a balanced bundle, otherwise its number of units):
 
-    # Basic condor settings
-    sub.write("executable = run_job.sh\n")
-    sub.write("universe   = vanilla\n")
-    sub.write('+JobFlavour = "nextweek"\n')
-    sub.write("stream_output = True\n")
-    sub.write("stream_error  = True\n\n")
+  - a job gets one cpu per events_per_cpu predicted events (up to
+    max_cpus), so jobs take about the same wall time whatever their size;
+    memory follows the cpus and disk the input bytes (see config.CONDOR)
+  - a part above split_above times the largest job (max_cpus *
+    events_per_cpu) is split into slices of about that size (runner.py
+    tag part7:2/4): by units, or by entry ranges when there are more
+    slices than units (a single heavy file)
+  - consecutive parts below target_events are packed into one job
+    (part1+part2+part3), up to max_parts_per_job; heavier parts run alone
+  - jobs are queued largest first so the long ones do not finish last
 
-    sub.write("should_transfer_files = YES\n")
-    sub.write("WhenToTransferOutput  = ON_EXIT\n")
-    sub.write("notification = never\n")
-    sub.write("getenv     = True\n\n")
+Usage:
+    python make_condor_submit.py                          # config.JSON_FILE
+    python make_condor_submit.py JSON_files/Big_2024_MC_file.sqlite --target-events 5e6
+"""
 
-    sub.write("Transfer_Input_Files = .\n")
-    sub.write("request_cpus = 1\n")
-    sub.write("request_memory = 8 GB\n")
-    sub.write("request_disk = 50 GB\n\n")
+import argparse
+import math
 
-    sub.write("output = logs/$(Cluster)_$(Process).out\n")
-    sub.write("error  = logs/$(Cluster)_$(Process).err\n")
-    sub.write("log    = logs/$(Cluster).log\n\n")
+import config
+from bundle_index import open_bundle
+from work_units import format_part_tag
 
-    for process, proc_info in cache.items():
+ITEM_FIELDS = ["process", "parts", "cpus", "memory_mb", "disk_gb"]
 
-        files_dict = proc_info.get("files", {})
 
-        for part in files_dict:
-            sub.write(f"arguments = {process} {part}\n")
-            sub.write("queue\n\n")
+def part_costs(bundle, process, settings):
+    """[(part, events, bytes, n_units)] of a process, estimated from the units without part_stats."""
+    stats = bundle.info(process).get("part_stats") or {}
+    costs = []
+    for part, units in bundle.parts(process).items():
+        s = stats.get(part)
+        if s:
+            costs.append((part, s["nevents"], s["bytes"], len(units)))
+        else:
+            costs.append((part, len(units) * settings["events_per_unit"],
+                          len(units) * settings["bytes_per_unit"], len(units)))
+    return costs
 
-print(f"Condor submit file '{submit_filename}' created successfully.")
 
+def plan_jobs(process, costs, settings):
+    """Jobs of one process: {"process", "items", "events", "bytes"} (see module docstring)."""
+    target = settings["target_events"]
+    largest = settings["max_cpus"] * settings["events_per_cpu"]
+
+    # split heavy parts into (part, index, n) slices, by entry ranges past one per unit
+    items = []
+    for part, events, nbytes, n_units in costs:
+        n = 1
+        if events > settings["split_above"] * largest:
+            n = math.ceil(events / largest)
+        for index in range(1, n + 1):
+            items.append(((part, index, n), events / n, nbytes / n))
+
+    # pack consecutive light items
+    jobs = []
+    current = None
+    for item, events, nbytes in items:
+        if current is None or current["events"] + events > target \
+                or len(current["items"]) >= settings["max_parts_per_job"]:
+            current = {"process": process, "items": [], "events": 0.0, "bytes": 0.0}
+            jobs.append(current)
+        current["items"].append(item)
+        current["events"] += events
+        current["bytes"] += nbytes
+    return jobs
+
+
+def job_resources(job, settings, staging):
+    """cpus, memory_mb and disk_gb of a job."""
+    cpus = min(settings["max_cpus"], max(1, math.ceil(job["events"] / settings["events_per_cpu"])))
+    memory_mb = int(settings["memory_base_mb"] + settings["memory_per_cpu_mb"] * cpus)
+    disk = settings["disk_base_gb"] + job["bytes"] / 1e9 * settings["output_fraction"]
+    if staging.get("enabled", False):
+        disk += min(job["bytes"] / 1e9, staging.get("max_gb", 20))
+    return {"cpus": cpus, "memory_mb": memory_mb, "disk_gb": math.ceil(disk)}
+
+
+def write_submit(submit_filename, jobs_filename):
+    with open(submit_filename, "w") as sub:
+
+        # Basic condor settings
+        sub.write("executable = run_job.sh\n")
+        sub.write("universe   = vanilla\n")
+        sub.write('+JobFlavour = "nextweek"\n')
+        sub.write("stream_output = True\n")
+        sub.write("stream_error  = True\n\n")
+
+        sub.write("should_transfer_files = YES\n")
+        sub.write("WhenToTransferOutput  = ON_EXIT\n")
+        sub.write("notification = never\n")
+        sub.write("getenv     = True\n\n")
+
+        sub.write("Transfer_Input_Files = .\n")
+        sub.write("request_cpus = $(cpus)\n")
+        sub.write("request_memory = $(memory_mb) MB\n")
+        sub.write("request_disk = $(disk_gb) GB\n\n")
+
+        sub.write("output = logs/$(Cluster)_$(Process).out\n")
+        sub.write("error  = logs/$(Cluster)_$(Process).err\n")
+        sub.write("log    = logs/$(Cluster).log\n\n")
+
+        sub.write("arguments = $(process) $(parts)\n")
+        sub.write(f"queue {','.join(ITEM_FIELDS)} from {jobs_filename}\n")
+
+
+def write_jobs(jobs_filename, rows):
+    with open(jobs_filename, "w") as f:
+        for row in rows:
+            f.write(" ".join(str(row[k]) for k in ITEM_FIELDS) + "\n")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("bundle", nargs="?", default=config.JSON_FILE,
+                        help="bundle JSON or its SQLite index (default: config.JSON_FILE)")
+    parser.add_argument("--processes", nargs="+", default=None, help="only these processes")
+    parser.add_argument("--target-events", type=float, default=None,
+                        help="events per job (default: config.CONDOR target_events)")
+    parser.add_argument("--submit", default="submit.jdl")
+    parser.add_argument("--jobs-file", default="submit_jobs.txt", help="itemdata of the queue statement")
+    args = parser.parse_args()
+
+    settings = dict(config.CONDOR)
+    if args.target_events:
+        settings["target_events"] = args.target_events
+    staging = getattr(config, "STAGING", None) or {}
+
+    bundle = open_bundle(args.bundle)
+    jobs = []
+    n_parts = 0
+    for process in args.processes or bundle.processes():
+        costs = part_costs(bundle, process, settings)
+        n_parts += len(costs)
+        jobs += plan_jobs(process, costs, settings)
+    bundle.close()
+
+    rows = []
+    for job in sorted(jobs, key=lambda j: j["events"], reverse=True):
+        rows.append(dict(process=job["process"], parts=format_part_tag(job["items"]),
+                         events=job["events"], **job_resources(job, settings, staging)))
+
+    write_jobs(args.jobs_file, rows)
+    write_submit(args.submit, args.jobs_file)
+
+    print(f"{n_parts} parts -> {len(rows)} jobs")
+    if rows:
+        events = sorted(r["events"] for r in rows)
+        print(f"  events / job : min {events[0]:,.0f}  median {events[len(events) // 2]:,.0f}  "
+              f"max {events[-1]:,.0f}")
+        for cpus in sorted(set(r["cpus"] for r in rows)):
+            print(f"  {sum(1 for r in rows if r['cpus'] == cpus):5d} jobs with {cpus} cpus")
+    print(f"Condor submit file '{args.submit}' created successfully ({args.jobs_file}).")
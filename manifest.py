@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import time
+import zlib
+from typing import Callable, Dict, List, Optional
+
+from work_units import unit_file, unit_label
+
+
+def adler32_file(filename: str, chunk_size: int = 4 * 1024 * 1024) -> str:
+    """Adler-32 of a file as 8 hex digits (same value as xrdadler32)."""
+    value = 1
+    with open(filename, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            value = zlib.adler32(chunk, value)
+    return f"{value & 0xffffffff:08x}"
+
+
+def inputs_fingerprint(file_list: List[str]) -> str:
+    """
+    Hash of a part's inputs: the file names (and entry ranges), plus size
+    and mtime for the ones present on local disk. Changes whenever the
+    part is re-bundled.
+    """
+    h = hashlib.sha1()
+    for unit in file_list:
+        name = unit_file(unit)
+        h.update(unit_label(unit).encode())
+        if os.path.exists(name):
+            st = os.stat(name)
+            h.update(f":{st.st_size}:{int(st.st_mtime)}".encode())
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def manifest_name(process: str, part_tag: str) -> str:
+    """
+    Manifest of one job: <process>_<part tag>_manifest.json (":" and "/"
+    of slice tags become "_" and "-"), so jobs never write the same file.
+    """
+    tag = part_tag.replace(":", "_").replace("/", "-")
+    return f"{process}_{tag}_manifest.json"
+
+
+class PartManifest:
+    """
+    Completion record of the parts of one process, kept as JSON next to
+    the outputs:
+
+        {"part3": {"inputs": <fingerprint>, "n_inputs": 25,
+                   "output": "WZ_part3.root", "size": ..., "adler32": "...",
+                   "n_events": ..., "finished": "..."}}
+
+    A part is done when its entry exists, its inputs did not change and
+    the output on disk still has the recorded size and checksum.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.parts: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                try:
+                    self.parts = json.load(f)
+                except json.JSONDecodeError:
+                    print(f"[WARNING] Corrupt manifest {path}, starting a new one")
+                    self.parts = {}
+
+    def save(self):
+        # write-then-rename so a killed job never leaves a truncated manifest
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.parts, f, indent=4)
+        os.replace(tmp, self.path)
+
+    def record(self, part: str, file_list: List[str], output: str, n_events: int = None):
+        """Mark part as completed with output, and save the manifest."""
+        self.parts[part] = {
+            "inputs": inputs_fingerprint(file_list),
+            "n_inputs": len(file_list),
+            "output": output,
+            "size": os.path.getsize(output),
+            "adler32": adler32_file(output),
+            "n_events": n_events,
+            "finished": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        self.save()
+
+    def forget(self, part: str):
+        if self.parts.pop(part, None) is not None:
+            self.save()
+
+    def check(self, part: str, file_list: List[str], output: str,
+              remote_checksum: Callable[[str], Optional[str]] = None):
+        """
+        (valid, reason) for the recorded output of part. remote_checksum
+        (output -> adler32 at the upload destination, None if absent)
+        accepts an output that is no longer local but was uploaded.
+        """
+        entry = self.parts.get(part)
+        if entry is None:
+            return False, "not done"
+        if entry["inputs"] != inputs_fingerprint(file_list):
+            return False, "inputs changed"
+        if entry["output"] != output:
+            return False, "output name changed"
+        if not os.path.exists(output):
+            if remote_checksum is not None and remote_checksum(output) == entry["adler32"]:
+                return True, "done (at upload destination)"
+            return False, "output missing"
+        if os.path.getsize(output) != entry["size"]:
+            return False, "output size differs"
+        if adler32_file(output) != entry["adler32"]:
+            return False, "output checksum differs"
+        return True, "done"
@@ -0,0 +1,337 @@
+"""
+Merge the part outputs of a process into fewer, larger files.
+
+Every job writes <process>_<part>.root, so a process ends up as hundreds
+of small files. merge.py groups them, in part order, into files of about
+MERGE_TARGET_GB and merges the groups in parallel (one spawned process per
+merge, ROOT's TFileMerger as in hadd):
+
+  - inputs with the compression settings of the output are merged by
+    copying the compressed baskets (fast merge, no recompression)
+  - otherwise (mixed inputs, or MERGE_PROFILE asks for another
+    compression) the entries are decompressed and written again
+
+Everything in the files is merged: the Events tree, the Runs tree and the
+genWeightSums / skimCutflow histograms, which are summed. Each merged file
+is checked against the Events entries of its inputs and recorded in
+<process>_merged.json with its inputs, size, adler32, events, the summed
+genweights and the cutflow. Groups whose output is still as recorded are
+not merged again.
+
+Usage:
+    python merge.py WZ_3L
+    python merge.py WZ_3L --dir /eos/uscms/store/user/msahoo/2024 --output-dir merged --target-gb 2 --jobs 4
+"""
+
+import argparse
+import fnmatch
+import glob
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from typing import Dict, List
+
+import config
+from cpus import allocated_cpus
+from manifest import PartManifest, adler32_file
+
+
+def _natural_key(name):
+    return [int(t) if t.isdigit() else t for t in re.split(r"(\d+)", name)]
+
+
+def part_outputs(process: str, directory: str = ".") -> List[str]:
+    """
+    Part outputs of process in directory: every <process>_part*.root. The
+    job manifests (<process>_*_manifest.json) only check the files they
+    list; a file whose size or adler32 differs from its entry is not
+    merged, a file no manifest lists is merged with a warning.
+    """
+    pattern = f"{glob.escape(process)}_part*.root"
+    recorded = {}
+    for manifest_path in sorted(glob.glob(os.path.join(directory, f"{glob.escape(process)}_*manifest.json"))):
+        for part, entry in PartManifest(manifest_path).parts.items():
+            if fnmatch.fnmatchcase(entry["output"], pattern):
+                recorded[entry["output"]] = (part, entry)
+
+    outputs = []
+    for path in glob.glob(os.path.join(directory, pattern)):
+        name = os.path.basename(path)
+        if name not in recorded:
+            print(f"[WARNING] {name} is not in any manifest of {process}, merged unchecked")
+            outputs.append(path)
+            continue
+        part, entry = recorded.pop(name)
+        if os.path.getsize(path) != entry.get("size"):
+            print(f"[WARNING] {part}: {name} size differs from the manifest, not merged")
+        elif entry.get("adler32") and adler32_file(path) != entry["adler32"]:
+            print(f"[WARNING] {part}: {name} checksum differs from the manifest, not merged")
+        else:
+            outputs.append(path)
+    for name, (part, _) in sorted(recorded.items()):
+        print(f"[WARNING] {part}: {name} is in the manifest but missing from {directory}")
+    return sorted(outputs, key=_natural_key)
+
+
+def plan_groups(files: List[str], target_bytes: float) -> List[List[str]]:
+    """
+    Consecutive groups of files of about target_bytes each. A group is
+    closed before the file that would take it over the target; a file
+    larger than the target gets a group of its own.
+    """
+    groups = []
+    current, size = [], 0
+    for name in files:
+        file_size = os.path.getsize(name)
+        if current and size + file_size > target_bytes:
+            groups.append(current)
+            current, size = [], 0
+        current.append(name)
+        size += file_size
+    if current:
+        groups.append(current)
+    return groups
+
+
+def merged_name(process: str, index: int) -> str:
+    return f"{process}_merged{index}.root"
+
+
+def profile_compression(profile: Dict):
+    """Compression settings (algorithm * 100 + level) of an output profile, None if it has none."""
+    if not profile or "compression" not in profile:
+        return None
+    import ROOT
+
+    algorithms = ROOT.ROOT.RCompressionSetting.EAlgorithm
+    name = profile["compression"].upper()
+    if not hasattr(algorithms, f"k{name}"):
+        raise RuntimeError(f"Unknown compression algorithm '{profile['compression']}'")
+    # same default level as the Snapshot of skimmer.snapshot_options()
+    level = int(profile.get("level", ROOT.RDF.RSnapshotOptions().fCompressionLevel))
+    return int(ROOT.ROOT.CompressionSettings(getattr(algorithms, f"k{name}"), level))
+
+
+# ---- merge worker (runs in a spawned process) ----
+
+def _events_entries(tfile):
+    """Entries of the Events TTree or RNTuple of an open TFile, None if unknown."""
+    import ROOT
+
+    obj = tfile.Get("Events")
+    if not obj:
+        return None
+    if isinstance(obj, ROOT.TTree):
+        return int(obj.GetEntries())
+    for ns in (ROOT, ROOT.Experimental):
+        reader = getattr(ns, "RNTupleReader", None)
+        if reader is not None:
+            try:
+                return int(reader.Open("Events", tfile.GetName()).GetNEntries())
+            except Exception:
+                continue
+    return None
+
+
+def _histogram_contents(tfile, name):
+    """(label, content) of the bins of a histogram in tfile, [] if absent."""
+    hist = tfile.Get(name)
+    if not hist:
+        return []
+    axis = hist.GetXaxis()
+    return [(str(axis.GetBinLabel(i)), hist.GetBinContent(i)) for i in range(1, hist.GetNbinsX() + 1)]
+
+
+def merge_group(task: Dict) -> Dict:
+    """
+    Merge task["inputs"] into task["output"]; returns its record (see
+    module docstring), with "error" set if the merge or the check failed.
+    """
+    record = {"output": task["output"], "inputs": [os.path.basename(n) for n in task["inputs"]],
+              "error": None}
+    start = time.time()
+    tmp_name = task["output"] + ".tmp"
+    try:
+        import ROOT
+        ROOT.gROOT.SetBatch(True)
+
+        settings = set()
+        n_input_events = 0
+        for name in task["inputs"]:
+            f = ROOT.TFile.Open(name, "READ")
+            if not f or f.IsZombie():
+                raise RuntimeError(f"cannot open {name}")
+            settings.add(int(f.GetCompressionSettings()))
+            entries = _events_entries(f)
+            n_input_events = None if entries is None or n_input_events is None else n_input_events + entries
+            f.Close()
+
+        compression = task["compression"]
+        if compression is None:
+            # keep the inputs' settings (those of the first input if they differ, like hadd -ff)
+            first = ROOT.TFile.Open(task["inputs"][0], "READ")
+            compression = int(first.GetCompressionSettings())
+            first.Close()
+        fast = settings == {compression}
+
+        merger = ROOT.TFileMerger(False, False)
+        merger.SetPrintLevel(0)
+        merger.SetFastMethod(fast)
+        if not merger.OutputFile(tmp_name, "RECREATE", compression):
+            raise RuntimeError(f"cannot create {tmp_name}")
+        for name in task["inputs"]:
+            if not merger.AddFile(name, False):
+                raise RuntimeError(f"cannot add {name}")
+        if not merger.Merge():
+            raise RuntimeError("TFileMerger failed")
+
+        out = ROOT.TFile.Open(tmp_name, "READ")
+        n_events = _events_entries(out)
+        genweight = dict(_histogram_contents(out, "genWeightSums"))
+        cutflow = _histogram_contents(out, "skimCutflow")
+        out.Close()
+        if n_input_events is not None and n_events != n_input_events:
+            raise RuntimeError(f"merged Events has {n_events} entries, inputs {n_input_events}")
+
+        os.replace(tmp_name, task["output"])
+        record.update(
+            size=os.path.getsize(task["output"]),
+            adler32=adler32_file(task["output"]),
+            n_events=n_events,
+            fast=fast,
+            compression=compression,
+            genweight={"sumw": genweight["genEventSumw"], "count": genweight["genEventCount"]}
+            if genweight else None,
+            cutflow=[{"name": label, "events": int(value)} for label, value in cutflow],
+        )
+    except Exception as e:
+        record["error"] = str(e)
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+    record["elapsed"] = time.time() - start
+    record["merged"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    return record
+
+
+# ---- driver ----
+
+class ProcessMerger:
+    """
+    Plan and run the merges of one process. The records of finished
+    merges are kept in <output_dir>/<process>_merged.json.
+    """
+
+    def __init__(self, process: str, directory: str = ".", output_dir: str = None,
+                 target_gb: float = None, jobs=None, profile: str = None, force: bool = False):
+        self.process = process
+        self.directory = directory
+        self.output_dir = output_dir or directory
+        self.target_gb = target_gb if target_gb is not None else getattr(config, "MERGE_TARGET_GB", 4.0)
+        self.jobs = jobs if jobs is not None else getattr(config, "MERGE_JOBS", "auto")
+        self.profile = profile if profile is not None else getattr(config, "MERGE_PROFILE", None)
+        self.force = force
+        self.record_path = os.path.join(self.output_dir, f"{process}_merged.json")
+        self.records = {}
+        if os.path.exists(self.record_path):
+            with open(self.record_path, "r") as f:
+                self.records = json.load(f)
+
+    def plan(self) -> List[Dict]:
+        """Merge tasks of the process, without the ones already done."""
+        inputs = part_outputs(self.process, self.directory)
+        groups = plan_groups(inputs, self.target_gb * 1e9)
+        compression = None
+        if self.profile:
+            if self.profile not in config.OUTPUT_PROFILES:
+                raise RuntimeError(f"Unknown output profile '{self.profile}'")
+            compression = profile_compression(config.OUTPUT_PROFILES[self.profile])
+
+        tasks = []
+        for i, group in enumerate(groups):
+            output = os.path.join(self.output_dir, merged_name(self.process, i))
+            task = {"output": output, "inputs": group, "compression": compression}
+            if not self.force and self.is_done(task):
+                print(f"{os.path.basename(output)} already merged, skipping")
+                continue
+            tasks.append(task)
+
+        planned = {merged_name(self.process, i) for i in range(len(groups))}
+        for name in sorted(set(self.records) - planned, key=_natural_key):
+            print(f"[WARNING] {name} is not part of the current plan, remove it by hand")
+        print(f"{len(inputs)} part outputs of {self.process} -> {len(groups)} merged files "
+              f"(target {self.target_gb} GB), {len(tasks)} to merge")
+        return tasks
+
+    def is_done(self, task: Dict) -> bool:
+        record = self.records.get(os.path.basename(task["output"]))
+        return bool(record) and record.get("error") is None \
+            and record["inputs"] == [os.path.basename(n) for n in task["inputs"]] \
+            and record.get("compression_requested") == task["compression"] \
+            and os.path.exists(task["output"]) and os.path.getsize(task["output"]) == record["size"]
+
+    def run(self, delete_inputs: bool = False) -> List[Dict]:
+        tasks = self.plan()
+        if not tasks:
+            return []
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        jobs = allocated_cpus() if self.jobs in (None, "auto", 0) else int(self.jobs)
+        jobs = max(1, min(jobs, len(tasks)))
+        print(f"Merging on {jobs} processes")
+
+        results = []
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(jobs) as pool:
+            for task, record in zip(tasks, pool.imap(merge_group, tasks)):
+                record["compression_requested"] = task["compression"]
+                results.append(record)
+                name = os.path.basename(record["output"])
+                if record["error"]:
+                    print(f"ERROR merging {name}: {record['error']}")
+                    continue
+                self.records[name] = record
+                self.save()
+                print(f"{name}: {len(record['inputs'])} files, {record['n_events']} events, "
+                      f"{record['size'] / 1e9:.2f} GB, {'fast' if record['fast'] else 'recompressed'}, "
+                      f"{record['elapsed']:.1f} s")
+                if delete_inputs:
+                    for input_name in task["inputs"]:
+                        os.remove(input_name)
+        return results
+
+    def save(self):
+        tmp = self.record_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.records, f, indent=4)
+        os.replace(tmp, self.record_path)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("process_tag", help="process whose <process>_<part>.root outputs are merged")
+    parser.add_argument("--dir", default=".", help="directory of the part outputs (default: .)")
+    parser.add_argument("--output-dir", default=None, help="directory of the merged files (default: --dir)")
+    parser.add_argument("--target-gb", type=float, default=None,
+                        help="size of the merged files (default: config.MERGE_TARGET_GB)")
+    parser.add_argument("--jobs", default=None,
+                        help="merges run in parallel, a number or 'auto' (default: config.MERGE_JOBS)")
+    parser.add_argument("--profile", default=None,
+                        help="recompress with this config.OUTPUT_PROFILES entry (default: config.MERGE_PROFILE)")
+    parser.add_argument("--force", action="store_true", help="merge again groups already recorded as done")
+    parser.add_argument("--delete-inputs", action="store_true",
+                        help="remove the part outputs of a group once its merged file is checked "
+                             "(runner.py then no longer sees those parts as done)")
+    args = parser.parse_args()
+
+    merger = ProcessMerger(args.process_tag, directory=args.dir, output_dir=args.output_dir,
+                           target_gb=args.target_gb, jobs=args.jobs, profile=args.profile,
+                           force=args.force)
+    results = merger.run(delete_inputs=args.delete_inputs)
+
+    if any(r["error"] for r in results):
+        sys.exit(1)
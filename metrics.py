@@ -0,0 +1,203 @@
+import csv
+import json
+import os
+import resource
+import socket
+import time
+from typing import Dict, List
+
+_DECLARED = [False]
+
+_CODE = """
+#include <chrono>
+#include <map>
+#include <mutex>
+
+namespace skim_metrics {
+
+std::mutex gMutex;
+std::map<int, double> gFirstSample;
+
+double now() {
+    return std::chrono::duration<double>(std::chrono::system_clock::now().time_since_epoch()).count();
+}
+
+// called once per sample and slot: the first call is the start of the event loop proper
+int mark(int id) {
+    std::lock_guard<std::mutex> lock(gMutex);
+    if (gFirstSample.find(id) == gFirstSample.end()) gFirstSample[id] = now();
+    return 0;
+}
+
+double first(int id) {
+    std::lock_guard<std::mutex> lock(gMutex);
+    auto it = gFirstSample.find(id);
+    return it == gFirstSample.end() ? 0. : it->second;
+}
+
+} // namespace skim_metrics
+"""
+
+
+def _root():
+    """ROOT with the skim_metrics helpers declared (imported on first use)."""
+    import ROOT
+
+    if not _DECLARED[0]:
+        ROOT.gInterpreter.Declare(_CODE)
+        _DECLARED[0] = True
+    return ROOT
+
+
+_NEXT_ID = [0]
+
+CSV_FIELDS = [
+    "process", "part", "output", "status", "n_inputs", "events_read", "events_passed",
+    "jit_seconds", "loop_seconds", "total_seconds", "bytes_read", "MBps",
+    "output_bytes", "peak_rss_mb", "threads", "host", "finished", "shared_parts",
+]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process so far (Linux reports KiB)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def thread_count() -> int:
+    """Threads of the implicit MT pool (1 when MT is off)."""
+    return max(1, int(_root().ROOT.GetThreadPoolSize()))
+
+
+class PartMetrics:
+    """
+    Performance record of one part.
+
+    JIT time is the time from booking the Snapshot (start()) until the
+    first sample starts being read, which RDataFrame spends jitting the
+    graph; the rest up to stop() is the event loop. The first-sample time
+    comes from a DefinePerSample callback, so nothing is added per event.
+
+    Peak RSS is the peak of the whole process: per part in pool workers,
+    cumulative when parts run one after another in one process.
+
+    Parts run together in one RunGraphs call (SHARED_GRAPH) share the JIT,
+    the event loop and the input reads: their per-part timing and I/O
+    fields are left empty and the totals of the shared loop are given in
+    "shared_loop" ("shared_parts" parts).
+    """
+
+    def __init__(self, process: str, part: str):
+        _root()
+        self.id = _NEXT_ID[0]
+        _NEXT_ID[0] += 1
+        self.process = process
+        self.part = part
+        self.t0 = 0.0
+        self.t1 = 0.0
+        self.data = None
+
+    def attach(self, df):
+        """Book the first-sample mark on df (no extra columns are written)."""
+        return df.DefinePerSample("skimMetricsMark", f"skim_metrics::mark({self.id})")
+
+    def start(self):
+        """Call right before the event loop is triggered."""
+        self.t0 = time.time()
+
+    def stop(self):
+        """Call when the event loop returned."""
+        self.t1 = time.time()
+
+    def finish(self, summary: Dict, skimmer=None, shared_loop: Dict = None) -> Dict:
+        """
+        Collect the metrics of a finished (or failed) part into a dict;
+        shared_loop: {"parts", "seconds", "bytes_read", "MBps"} of the
+        RunGraphs call the part ran in.
+        """
+        end = self.t1 or time.time()
+        first = _root().skim_metrics.first(self.id) if self.t0 else 0.0
+
+        filters = []
+        if skimmer is not None and skimmer.report is not None and summary["status"] == "ok":
+            for cut in skimmer.report.GetValue():
+                filters.append({"name": str(cut.GetName()), "all": int(cut.GetAll()),
+                                "pass": int(cut.GetPass())})
+
+        output = summary["output"]
+        io = summary.get("io") or {}
+        self.data = {
+            "process": self.process,
+            "part": self.part,
+            "output": output,
+            "status": summary["status"],
+            "n_inputs": summary["n_files"],
+            "events_read": filters[0]["all"] if filters else None,
+            "events_passed": summary.get("n_events"),
+            "jit_seconds": first - self.t0 if first else None,
+            "loop_seconds": end - first if first else None,
+            "total_seconds": summary.get("elapsed"),
+            "bytes_read": io.get("bytes_read"),
+            "MBps": io.get("MBps"),
+            "output_bytes": os.path.getsize(output) if os.path.exists(output) else None,
+            "peak_rss_mb": peak_rss_mb(),
+            "threads": thread_count(),
+            "host": socket.gethostname(),
+            "finished": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "shared_parts": None,
+            "filters": filters,
+        }
+        if shared_loop:
+            self.data.update(jit_seconds=None, loop_seconds=None, total_seconds=None,
+                             bytes_read=None, MBps=None, shared_parts=shared_loop["parts"],
+                             shared_loop=shared_loop)
+        return self.data
+
+
+def metrics_json_name(output: str) -> str:
+    """<output stem>_metrics.json next to the output file."""
+    return os.path.splitext(output)[0] + "_metrics.json"
+
+
+def write_metrics(process: str, records: List[Dict]):
+    """
+    Write each record as <output>_metrics.json and append one row per
+    record to <process>_metrics.csv (filters only go to the JSON).
+    """
+    records = [r for r in records if r]
+    if not records:
+        return
+
+    for record in records:
+        with open(metrics_json_name(record["output"]), "w") as f:
+            json.dump(record, f, indent=4)
+
+    csv_name = f"{process}_metrics.csv"
+    append_csv(csv_name, records)
+    print(f"Metrics of {', '.join(r['part'] for r in records)} written to {csv_name}")
+
+
+def append_csv(csv_name: str, records: List[Dict]):
+    new_file = not os.path.exists(csv_name)
+    with open(csv_name, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        if new_file:
+            writer.writeheader()
+        writer.writerows(records)
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Collect per-part *_metrics.json files (e.g. from many Condor jobs) into one CSV.")
+    parser.add_argument("output_csv")
+    parser.add_argument("json_files", nargs="+")
+    args = parser.parse_args()
+
+    records = []
+    for name in args.json_files:
+        with open(name, "r") as f:
+            records.append(json.load(f))
+    append_csv(args.output_csv, records)
+    print(f"{len(records)} records added to {args.output_csv}")
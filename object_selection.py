@@ -0,0 +1,155 @@
+"""
+Per-object selections that slim the jagged collections written by the skim.
+
+OBJECT_SELECTIONS maps a collection to a per-object expression, e.g.
+
+    {"Jet": "Jet_pt > 20 && abs(Jet_eta) < 4.7",
+     "GenPart": "GenPart_statusFlags & (1 << 13)"}
+
+For every selected collection a mask column skimMask_<Collection> is
+defined from the original columns, then every written RVec column
+<Collection>_* is redefined to the objects passing the mask and
+n<Collection> to their count (same type as before). Index columns
+pointing into a slimmed collection (Muon_jetIdx, Jet_genJetIdx,
+GenPart_genPartIdxMother, ...) are remapped to the new positions, -1
+where the object was dropped.
+
+The redefinitions call typed instances of the skim_slim_* templates
+(one per column type, declared once per process) instead of jitting an
+expression per column and graph. Columns that are not written are left
+alone. Event filters booked before the slimming still see the full
+collections.
+"""
+
+import re
+from typing import Dict, List, Tuple
+
+import ROOT
+
+from filter_engine import compiled_define, typed_redefine
+
+ROOT.gInterpreter.Declare("""
+template <typename I, typename M>
+ROOT::RVec<I> skim_remap_index(const ROOT::RVec<I> &idx, const ROOT::RVec<M> &mask) {
+    ROOT::RVec<long> position(mask.size(), -1);
+    long n = 0;
+    for (std::size_t i = 0; i < mask.size(); ++i)
+        if (mask[i]) position[i] = n++;
+    ROOT::RVec<I> out(idx.size());
+    for (std::size_t j = 0; j < idx.size(); ++j) {
+        const long k = idx[j];
+        out[j] = (k >= 0 && k < static_cast<long>(position.size())) ? static_cast<I>(position[k]) : I(-1);
+    }
+    return out;
+}
+
+template <typename T, typename M>
+ROOT::RVec<T> skim_slim_take(const ROOT::RVec<T> &v, const ROOT::RVec<M> &mask) { return v[mask]; }
+
+template <typename I, typename M>
+ROOT::RVec<I> skim_slim_remap(const ROOT::RVec<I> &idx, const ROOT::RVec<M> &target_mask) {
+    return skim_remap_index(idx, target_mask);
+}
+
+template <typename I, typename M, typename N>
+ROOT::RVec<I> skim_slim_take_remap(const ROOT::RVec<I> &idx, const ROOT::RVec<M> &mask,
+                                   const ROOT::RVec<N> &target_mask) {
+    return skim_remap_index(ROOT::RVec<I>(idx[mask]), target_mask);
+}
+
+template <typename C, typename M>
+C skim_slim_count(const ROOT::RVec<M> &mask) { return static_cast<C>(ROOT::VecOps::Nonzero(mask).size()); }
+""")
+
+# (template, return type, argument types) -> name of the declared instance
+_SLIM_FUNCTIONS: Dict[Tuple[str, str, Tuple[str, ...]], str] = {}
+
+# <Collection>_<target>Idx, <Collection>_<target>Idx1/2, <Collection>_<target>IdxMother
+_INDEX_COLUMN = re.compile(r"^(?P<collection>[A-Za-z0-9]+)_(?P<target>[a-z][A-Za-z0-9]*?)Idx(?:\d+|Mother)?$")
+
+# index prefixes whose collection is not the prefix with a capital first letter
+_INDEX_TARGETS = {"sv": "SV"}
+
+
+def mask_column(collection: str) -> str:
+    return f"skimMask_{collection}"
+
+
+def index_target(column: str):
+    """Collection an index column points into (Muon_jetIdx -> Jet), None if not an index."""
+    match = _INDEX_COLUMN.match(column)
+    if not match:
+        return None
+    target = match.group("target")
+    return _INDEX_TARGETS.get(target, target[0].upper() + target[1:])
+
+
+def slim_function(template: str, return_type: str, types: List[str]) -> str:
+    """
+    Name of a plain function forwarding to the skim_slim_<template>
+    instance for these column types, declared on first use.
+    """
+    key = (template, return_type, tuple(types))
+    if key not in _SLIM_FUNCTIONS:
+        name = f"skim_slim_{template}_{len(_SLIM_FUNCTIONS)}"
+        args = ", ".join(f"const {t} &a{i}" for i, t in enumerate(types))
+        call = ", ".join(f"a{i}" for i in range(len(types)))
+        # the count instance needs its return type, the others deduce theirs
+        target = f"skim_slim_{template}<{return_type}>" if template == "count" else f"skim_slim_{template}"
+        if not ROOT.gInterpreter.Declare(f"{return_type} {name}({args}) {{ return {target}({call}); }}"):
+            raise RuntimeError(f"Could not declare skim_slim_{template} for {', '.join(types)}")
+        _SLIM_FUNCTIONS[key] = name
+    return _SLIM_FUNCTIONS[key]
+
+
+def collection_columns(df, collection: str) -> List[str]:
+    """RVec columns <collection>_* of df (the per-object columns)."""
+    return [str(c) for c in df.GetColumnNames()
+            if str(c).startswith(f"{collection}_") and "RVec" in str(df.GetColumnType(str(c)))]
+
+
+def slim_collections(df, selections: Dict[str, str], columns: List[str] = None):
+    """
+    Apply OBJECT_SELECTIONS to df (see module docstring) and return the
+    new node. columns: the branches that will be written (default: every
+    column); only those are redefined. Collections absent from the input
+    are skipped.
+    """
+    available = set(str(c) for c in df.GetColumnNames())
+    written = available if columns is None else available & set(columns)
+    selections = {c: expr for c, expr in (selections or {}).items() if f"n{c}" in available}
+
+    # masks first, while every column still has its original content
+    for collection, expression in selections.items():
+        df = compiled_define(df, mask_column(collection), expression)
+
+    # every collection: keep selected objects, remap indices into slimmed ones
+    collections = set(selections)
+    for column in sorted(written):
+        owner = column.split("_", 1)[0]
+        target = index_target(column)
+        if owner not in collections and target not in collections:
+            continue
+        column_type = str(df.GetColumnType(column))
+        if "RVec" not in column_type:
+            continue
+        args = [column]
+        if owner in collections:
+            args.append(mask_column(owner))
+        if target in collections:
+            args.append(mask_column(target))
+            template = "take_remap" if owner in collections else "remap"
+        else:
+            template = "take"
+        function = slim_function(template, column_type, [str(df.GetColumnType(c)) for c in args])
+        df = typed_redefine(df, column, function, args)
+
+    for collection in selections:
+        counter = f"n{collection}"
+        if counter in written:
+            mask = mask_column(collection)
+            function = slim_function("count", str(df.GetColumnType(counter)), [str(df.GetColumnType(mask))])
+            df = typed_redefine(df, counter, function, [mask])
+        print(f"[INFO] {collection}: objects kept where {selections[collection]}")
+
+    return df
@@ -32,13 +32,43 @@ fi
 
 echo "Running python skimmer..."
 
-python3 runner.py ${process} ${part}
-
 outputdir="root://cmseos.fnal.gov//store/user/msahoo/2024"
 
 if [ -n "${_CONDOR_SCRATCH_DIR}" ]; then
-    echo "Copying output to EOS"
-    xrdcp -f ${process}_${part}.root ${outputdir}/
+    # each part is uploaded (and removed from scratch) while the next one runs
+    python3 runner.py ${process} ${part} --upload-to ${outputdir}
+else
+    python3 runner.py ${process} ${part}
+fi
+
+# Copy a file to EOS unless an identical copy (same adler32) is already there
+copy_if_changed() {
+    local file=$1
+    local server=${outputdir%%//store*}
+    local remote=/store${outputdir#*//store}/$(basename ${file})
+    local local_sum=$(xrdadler32 ${file} | awk '{print $1}')
+    local remote_sum=$(xrdfs ${server} query checksum ${remote} 2>/dev/null | awk '{print $2}')
+
+    if [ -n "${remote_sum}" ] && [ "${remote_sum}" == "${local_sum}" ]; then
+        echo "Already on EOS with same checksum: ${file}"
+    else
+        xrdcp -f ${file} ${outputdir}/
+    fi
+}
+
+if [ -n "${_CONDOR_SCRATCH_DIR}" ]; then
+    # outputs the background upload could not confirm are still here
+    echo "Copying remaining output to EOS"
+    for f in ${process}_*.root; do
+        [ -e "${f}" ] && copy_if_changed ${f}
+    done
+    # one manifest per job (runner.py manifest_name), restored by a rerun of the job
+    manifest=${process}_$(echo ${part} | tr ':/' '_-')_manifest.json
+    [ -e ${manifest} ] && xrdcp -f ${manifest} ${outputdir}/
+    # per-part metrics; collect with: python3 metrics.py all.csv *_metrics.json
+    for f in ${process}_*_metrics.json; do
+        [ -e "${f}" ] && xrdcp -f ${f} ${outputdir}/
+    done
     echo "Cleanup"
     rm -rf CMSSW_13_3_3
     rm *.root
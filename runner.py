@@ -1,39 +1,73 @@
-import ROOT
+import argparse
+import glob
+import importlib
+import multiprocessing
 import os
-import subprocess
 import sys
+import threading
 import time
-from skimmer import AnalysisSkimmer
+from queue import Empty, Queue
+from branch_budget import estimate_branch_sizes, print_budget, read_usage_file
+from staging import FileStager
+from upload import UploadQueue, destination_of, make_transfer
+from dedup import higher_priority, index_dir_of, read_meta
+from manifest import PartManifest, manifest_name
+from work_units import parse_part_tag, part_slice, slice_name, unit_file, unit_files, with_file
+from bundle_index import open_bundle
+from das_cache import DEFAULT_CACHE, DEFAULT_TTL, DASCache
+from genweight_cache import GenWeightCache
+from metrics import PartMetrics, write_metrics
+from cpus import allocated_cpus, configure_threads, numa_ordered_cpus, pin_cores, worker_cores
 import config 
 import json
 
+# ROOT (and skimmer.py, which needs it) are imported where an event loop is
+# built, so argument parsing, part listing and manifest checks start fast.
+
 class AnalysisRunner:
-    def __init__(self, config_module, process_tag=None, part_tag=None):
+    def __init__(self, config_module, process_tag=None, part_tag=None,
+                 n_workers=None, threads_per_worker=None, shared_graph=None,
+                 dry_run=False, output_profile=None, output_format=None, force=False,
+                 n_threads=None, upload_to=None):
         """
         Initialize with the configuration module.
+        n_workers / threads_per_worker / shared_graph override the
+        N_WORKERS / THREADS_PER_WORKER / SHARED_GRAPH config values.
+        dry_run only reports the column budget, no output is written.
+        output_profile overrides OUTPUT_PROFILE (a key of OUTPUT_PROFILES).
+        output_format overrides OUTPUT_FORMAT ("ttree" or "rntuple").
+        force reruns parts the manifest already records as done.
+        n_threads overrides N_THREADS (implicit MT threads of a single
+        worker; "auto" matches the CPUs allocated to the job).
+        upload_to overrides UPLOAD["destination"] and turns uploads on.
         """
         self.cfg = config_module
         self.process_tag = process_tag
         self.part_tag = part_tag
+        self.n_workers = n_workers
+        self.threads_per_worker = threads_per_worker
+        self.shared_graph = shared_graph
+        self.dry_run = dry_run
+        self.output_profile = output_profile
+        self.output_format = output_format or getattr(config_module, "OUTPUT_FORMAT", "ttree")
         self.files = []
+        self.results = []
+        self.stager = None
+        self.manifest = None
+        self.genweight_cache = None
+        self.force = force
+        self.n_threads = n_threads
+        self.upload_to = upload_to
+        self.uploader = None
         self.start_time = 0
         self.end_time = 0
-        
-        # Enable multi-threading immediately
-        ROOT.ROOT.EnableImplicitMT()
 
     def _query_das(self):
-        """Private method to run the DAS command."""
-        print(f"Querying DAS for: {self.cfg.DATASET_NAME} ...")
-        cmd = f'dasgoclient --query="file dataset={self.cfg.DATASET_NAME}"'
+        """Private method to get the DAS file list (through the shared DAS cache)."""
         try:
-            process = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            stdout, stderr = process.communicate()
-            if process.returncode != 0:
-                raise RuntimeError(f"DAS Error: {stderr.decode()}")
-            
-            files = stdout.decode().strip().split('\n')
-            return [f for f in files if f]
+            cache = DASCache(getattr(self.cfg, "DAS_CACHE", DEFAULT_CACHE),
+                             ttl=getattr(self.cfg, "DAS_CACHE_TTL_HOURS", DEFAULT_TTL / 3600) * 3600)
+            return cache.get_files(self.cfg.DATASET_NAME)
         except Exception as e:
             print(f"FATAL: {e}")
             sys.exit(1)
@@ -43,46 +77,59 @@ class AnalysisRunner:
         cache_filename = self.cfg.JSON_FILE
         print(f"The cache file {cache_filename} is being used")
 
-        if not os.path.exists(cache_filename):
-            raise RuntimeError(f"{cache_filename} not found!")
-
-        with open(cache_filename, "r") as f:
-            cache_data = json.load(f)
-
-        if self.process_tag not in cache_data:
-            raise RuntimeError(f"Process '{self.process_tag}' not found")
-
-        # ---- Extract process block ----
-        process_block = cache_data[self.process_tag]
-
-        # ---- Extract metadata ----
-        metadata = process_block.get("metadata", {})
-        files_dict = process_block.get("files", {})
-
-        # Store metadata in runner
-        self.cross_section = metadata.get("cross_section_fb")
-        self.sum_genweight = metadata.get("sum_genweight")
-        self.is_data = metadata.get("is_data", False)
-
-        print("Metadata loaded:")
-        print(f"  is_data        = {self.is_data}")
-        print(f"  cross_section  = {self.cross_section}")
-        print(f"  sum_genweight  = {self.sum_genweight}")
+        # bundle JSON, or its SQLite index (bundle_index.py) for one-row lookups
+        bundle = open_bundle(cache_filename)
 
-        if not files_dict:
-            raise RuntimeError("No file parts found for this process")
-
-        # ---- If ALL return all parts ----
-        if self.part_tag.upper() == "ALL":
-            print(f"Running ALL parts for {self.process_tag}")
+        try:
+            # ---- Extract process block ----
+            process_block = bundle.info(self.process_tag)
+
+            # ---- Extract metadata ----
+            metadata = process_block.get("metadata", {})
+
+            # Store metadata in runner
+            self.cross_section = metadata.get("cross_section_fb")
+            self.sum_genweight = metadata.get("sum_genweight")
+            self.is_data = metadata.get("is_data", False)
+
+            print("Metadata loaded:")
+            print(f"  is_data        = {self.is_data}")
+            print(f"  cross_section  = {self.cross_section}")
+            print(f"  sum_genweight  = {self.sum_genweight}")
+
+            # ---- If ALL return all parts ----
+            if self.part_tag.upper() == "ALL":
+                files_dict = bundle.parts(self.process_tag)
+                if not files_dict:
+                    raise RuntimeError("No file parts found for this process")
+                print(f"Running ALL parts for {self.process_tag}")
+                return files_dict
+
+            # ---- One part, several parts or slices of parts (see parse_part_tag) ----
+            files_dict = {}
+            for part, index, n in parse_part_tag(self.part_tag):
+                units = bundle.part(self.process_tag, part)
+                if n == 1:
+                    files_dict[part] = units
+                else:
+                    files_dict[slice_name(part, index, n)] = part_slice(units, index, n, self.file_entries)
             return files_dict
 
-        # ---- If single part ----
-        if self.part_tag not in files_dict:
-            raise RuntimeError(f"Part '{self.part_tag}' not found")
+        finally:
+            bundle.close()
 
-        return {self.part_tag: files_dict[self.part_tag]}
 
+    def file_entries(self, url):
+        """Entries of the input tree of a file (slicing a part finer than its files)."""
+        import ROOT
+
+        tfile = ROOT.TFile.Open(url)
+        if not tfile or tfile.IsZombie():
+            raise RuntimeError(f"Cannot open {url} to count its entries")
+        try:
+            return int(tfile.Get(self.cfg.TREE_NAME).GetEntries())
+        finally:
+            tfile.Close()
 
     def start_timer(self):
         self.start_time = time.time()
@@ -103,8 +150,228 @@ class AnalysisRunner:
         print(f"Files Processed : {len(self.files)}")
         print(f"Output File     : {self.cfg.OUTPUT_FILE}")
         print(f"Total Time      : {hours}h {minutes}m {seconds}s")
+
+        if self.results:
+            n_ok = sum(1 for r in self.results if r["status"] == "ok")
+            n_skipped = sum(1 for r in self.results if r["status"] == "skipped")
+            print(f"Parts OK        : {n_ok + n_skipped}/{len(self.results)} ({n_skipped} already done)")
+            sums = [r["genweight"]["sumw"] for r in self.results if r.get("genweight")]
+            if sums:
+                print(f"genEventSumw    : {sum(sums):.6g} over {len(sums)} parts "
+                      f"(metadata sum_genweight = {self.sum_genweight})")
+            for r in self.results:
+                line = f"  {r['part']:<10} {r['status']:<7} {r['elapsed']:8.1f}s  {r['output']}"
+                m = r.get("metrics") or {}
+                if m.get("jit_seconds") is not None:
+                    line += f"  (jit {m['jit_seconds']:.1f}s, loop {m['loop_seconds']:.1f}s)"
+                elif m.get("shared_parts"):
+                    line += f"  (shared loop of {m['shared_parts']} parts)"
+                if r.get("upload"):
+                    line += f"  [upload {r['upload']}]"
+                if r["error"]:
+                    line += f"  ({r['error']})"
+                print(line)
         print("-" * 40)
 
+    def setup_skimmer(self, file_list):
+        """
+        Build the skim graph (weights, filters, branch list) for one part.
+        Returns (skimmer, branches_to_save); no event loop is run here.
+        """
+
+        from skimmer import AnalysisSkimmer
+
+        # Initialize skimmer
+        skimmer = AnalysisSkimmer(
+            file_list, self.cfg.TREE_NAME,
+            read_options=getattr(self.cfg, "READ_OPTIONS", None),
+            io_stats=getattr(self.cfg, "IO_STATS", True)
+        )
+
+        is_data = any("/store/data/" in unit_file(u) for u in file_list)
+
+        print("Calculating total weight...")
+
+        if not self.is_data:
+
+            if self.cross_section is None or self.sum_genweight is None:
+                raise RuntimeError(
+                    "MC sample missing cross_section or sum_genweight in metadata"
+                )
+
+            print("Calculating normalization factor from metadata")
+            print(f"  cross_section  = {self.cross_section}")
+            print(f"  sum_genweight  = {self.sum_genweight}")
+
+            skimmer.define_total_weight(self.cross_section, self.sum_genweight)
+
+            if getattr(self.cfg, "GENWEIGHT_FROM_SKIM", False):
+                skimmer.book_genweight_sums()
+
+        else:
+            print("This is a data sample skipping normalization")
+
+        print("Applying filters...")
+        skimmer.apply_global_filters(
+            triggers=self.cfg.TRIGGERS,
+            met_filters=self.cfg.MET_FILTERS,
+            trigger_order=self.load_trigger_stats(),
+            count_triggers=getattr(self.cfg, "TRIGGER_COUNTS", False),
+            optional_triggers=getattr(self.cfg, "TRIGGERS_OPTIONAL", None)
+        )
+        if self.is_data:
+            dedup = getattr(self.cfg, "DEDUP", None) or {}
+            higher = self.dedup_indexes()
+            skimmer.apply_dedup(higher, dedup.get("cache_runs", 2),
+                                name=f"Not in {', '.join(os.path.basename(d) for d in higher)}")
+        branches_to_save = self.select_branches(skimmer, is_data)
+        skimmer.select_objects(getattr(self.cfg, "OBJECT_SELECTIONS", None), branches_to_save)
+
+        return skimmer, branches_to_save
+
+    def select_branches(self, skimmer, is_data):
+        """
+        Final list of branches to write, after wildcard expansion and the
+        BRANCH_ALLOW / BRANCH_DENY / BRANCH_USAGE_FILE column budget.
+        """
+
+        used_branches = None
+        usage_file = getattr(self.cfg, "BRANCH_USAGE_FILE", None)
+        if usage_file:
+            used_branches = read_usage_file(usage_file)
+
+        budget = dict(
+            allow=getattr(self.cfg, "BRANCH_ALLOW", None),
+            deny=getattr(self.cfg, "BRANCH_DENY", None),
+            used_branches=used_branches
+        )
+
+        if not is_data:
+            branches_input = self.cfg.BRANCHES_TO_SAVE + ([] if is_data else self.cfg.BRANCHES_MC)
+            branches_to_save = skimmer.build_branch_list(
+                branches_input,
+                getattr(self.cfg, "BRANCHES_WILDCARD", None),
+                **budget
+            )
+            print("Branch required for MC process")
+        else:
+            branches_to_save = skimmer.build_branch_list(
+                self.cfg.BRANCHES_TO_SAVE,
+                getattr(self.cfg, "BRANCHES_WILDCARD_DATA", None),
+                **budget
+            )
+            print("Branch required for MC process")
+
+        return branches_to_save
+
+    def dry_run_report(self, parts_dict):
+        """
+        Print the branches that would be written and their estimated
+        compressed/uncompressed size, from the basket info of the first
+        input file scaled to all files. No event loop is run.
+        """
+
+        first_file = unit_file(next(u for file_list in parts_dict.values() for u in file_list))
+        n_files = len(self.files)
+        is_data = self.is_data or "/store/data/" in first_file
+
+        from skimmer import AnalysisSkimmer
+
+        print(f"Dry run: sampling {first_file}")
+        skimmer = AnalysisSkimmer(first_file, self.cfg.TREE_NAME)
+        branches = self.select_branches(skimmer, is_data)
+
+        sizes, entries = estimate_branch_sizes(first_file, self.cfg.TREE_NAME, branches)
+        missing = [b for b in branches if b not in sizes]
+        if missing:
+            print(f"[WARNING] {len(missing)} selected branches not in input: {', '.join(missing)}")
+
+        print_budget(sizes, entries, n_files=n_files)
+
+    def list_parts(self):
+        """Print the parts of the process and their manifest status (no ROOT needed)."""
+        parts_dict = self.get_file_list()
+        self.manifest = self.load_manifest(restore=False)
+
+        print(f"{len(parts_dict)} parts of {self.process_tag}:")
+        for part_name, file_list in parts_dict.items():
+            status = "-"
+            if self.manifest is not None:
+                output = self._new_summary(part_name, file_list)["output"]
+                _, status = self.check_part(part_name, file_list, output)
+            print(f"  {part_name:<10} {len(file_list):5d} units  {len(unit_files(file_list)):5d} files  {status}")
+
+    def _new_summary(self, part_name, file_list):
+        """Per-part result record, marked failed until the part completes."""
+        return {
+            "part": part_name,
+            "n_files": len(file_list),
+            # Create part-specific output name
+            "output": f"{self.process_tag}_{part_name}.root",
+            "status": "failed",
+            "elapsed": 0.0,
+            "error": None,
+            "trigger_acceptance": {},
+            "io": None,
+            "n_events": None,
+            "genweight": None,
+            "metrics": None,
+            "upload": None,
+        }
+
+    def _fill_summary(self, summary, skimmer):
+        """Mark a part ok and collect the results of its finished event loop."""
+        summary["status"] = "ok"
+        summary["trigger_acceptance"] = skimmer.trigger_filter.acceptance() \
+            if skimmer.trigger_filter else {}
+        summary["io"] = skimmer.io_stats.totals if skimmer.io_stats else None
+        summary["n_events"] = int(skimmer.n_selected.GetValue())
+        if skimmer.genweight_sums is not None:
+            summary["genweight"] = self.genweight_summary(skimmer.genweight_sums)
+
+    def process_part(self, part_name, file_list):
+        """
+        Skim a single part and return a summary dict for it.
+        Errors are caught and reported in the summary, not raised.
+        """
+
+        print("\n" + "="*50)
+        print(f"Processing {self.process_tag} - {part_name}")
+        print(f"Files in this part: {len(file_list)}")
+        print("="*50)
+
+        part_start = time.time()
+
+        summary = self._new_summary(part_name, file_list)
+        output_name = summary["output"]
+        metrics = PartMetrics(self.process_tag, part_name)
+        skimmer = None
+
+        try:
+            skimmer, branches_to_save = self.setup_skimmer(file_list)
+            skimmer.df = metrics.attach(skimmer.df)
+
+            print(f"Writing output to {output_name}")
+
+            metrics.start()
+            skimmer.save_snapshot(output_name, branches_to_save, profile=self.get_output_profile(),
+                                  output_format=self.output_format)
+            metrics.stop()
+            print(f"{output_name} saved successfully.")
+            if self.write_runs():
+                skimmer.save_runs(output_name, profile=self.get_output_profile())
+            if getattr(self.cfg, "WRITE_CUTFLOW", True):
+                skimmer.save_cutflow(output_name)
+            self._fill_summary(summary, skimmer)
+
+        except Exception as e:
+            print(f"ERROR during {part_name}: {e}")
+            summary["error"] = str(e)
+
+        summary["elapsed"] = time.time() - part_start
+        summary["metrics"] = metrics.finish(summary, skimmer)
+        return summary
+
     def run(self):
 
         self.start_timer()
@@ -116,96 +383,591 @@ class AnalysisRunner:
             print("No files to process. Exiting.")
             return
 
-        # Loop over parts sequentially
-        for part_name, file_list in parts_dict.items():
+        self.files = unit_files([u for file_list in parts_dict.values() for u in file_list])
 
-            print("\n" + "="*50)
-            print(f"Processing {self.process_tag} - {part_name}")
-            print(f"Files in this part: {len(file_list)}")
-            print("="*50)
+        if self.dry_run:
+            self.dry_run_report(parts_dict)
+            return
 
-            # Initialize skimmer
-            skimmer = AnalysisSkimmer(file_list, self.cfg.TREE_NAME)
+        all_parts = list(parts_dict)
+        skipped = self.skip_completed(parts_dict)
+        parts_dict = {p: f for p, f in parts_dict.items() if p not in skipped}
 
-            is_data = any("/store/data/" in f for f in file_list)
-            
-            print("Calculating total weight...")
+        if not parts_dict:
+            print("All parts already done.")
+            self.results = [skipped[p] for p in all_parts]
+            self.print_stats()
+            return
 
-            if not self.is_data:
+        n_workers = self.n_workers
+        if n_workers is None:
+            n_workers = getattr(self.cfg, "N_WORKERS", 1)
+        n_workers = max(1, min(int(n_workers), len(parts_dict)))
 
-                if self.cross_section is None or self.sum_genweight is None:
-                    raise RuntimeError(
-                        "MC sample missing cross_section or sum_genweight in metadata"
-                    )
+        shared_graph = self.shared_graph
+        if shared_graph is None:
+            shared_graph = getattr(self.cfg, "SHARED_GRAPH", False)
 
-                print("Calculating normalization factor from metadata")
-                print(f"  cross_section  = {self.cross_section}")
-                print(f"  sum_genweight  = {self.sum_genweight}")
+        self.genweight_cache = self.load_genweight_cache()
+        self.stager = self.make_stager()
+        if self.stager:
+            # prefetch in processing order
+            self.stager.schedule(self.files)
+        self.uploader = self.make_uploader()
 
-                skimmer.define_total_weight(self.cross_section, self.sum_genweight)
+        if n_workers == 1:
+            self.setup_threads()
 
+        try:
+            if n_workers > 1:
+                self.results = self._run_pool(parts_dict, n_workers)
+            elif shared_graph and len(parts_dict) > 1:
+                self.results = self._run_shared_graph(parts_dict)
             else:
-                print("This is a data sample skipping normalization")
+                # Loop over parts sequentially
+                self.results = []
+                for part_name, file_list in parts_dict.items():
+                    local_files = self.stage_in(file_list)
+                    summary = self.process_part(part_name, local_files)
+                    self.stage_out(file_list)
+                    self.record_part(summary, file_list)
+                    self.upload_part(summary)
+                    self.results.append(summary)
+        finally:
+            if self.stager:
+                self.stager.close()
+            if self.uploader:
+                uploads = self.uploader.close()
+                for summary in self.results:
+                    if summary["output"] in uploads:
+                        summary["upload"] = uploads[summary["output"]]["status"]
+
+        done = {r["part"]: r for r in self.results}
+        done.update(skipped)
+        self.results = [done[p] for p in all_parts]
+
+        self.save_trigger_stats()
+        self.print_stats()
 
-            print("Applying filters...")
-            skimmer.apply_global_filters(
-                triggers=self.cfg.TRIGGERS,
-                met_filters=self.cfg.MET_FILTERS
-            )
-            
-            if not is_data:
-                branches_input = self.cfg.BRANCHES_TO_SAVE + ([] if is_data else self.cfg.BRANCHES_MC)
-                branches_to_save = skimmer.build_branch_list(
-                    branches_input,
-                    getattr(self.cfg, "BRANCHES_WILDCARD", None)
-                )
-                print("Branch required for MC process")
-            else:
-                branches_to_save = skimmer.build_branch_list(
-                    self.cfg.BRANCHES_TO_SAVE,
-                    getattr(self.cfg, "BRANCHES_WILDCARD_DATA", None)
-                )
-                print("Branch required for MC process")
+    def setup_threads(self):
+        """Size the implicit MT pool of this process (and pin it with PIN_CORES)."""
+        n_threads = self.n_threads
+        if n_threads is None:
+            n_threads = getattr(self.cfg, "N_THREADS", "auto")
+        n = configure_threads(n_threads)
+        if getattr(self.cfg, "PIN_CORES", False):
+            pin_cores(numa_ordered_cpus()[:n])
+        return n
+
+    def load_manifest(self, restore=True):
+        """
+        PartManifest of this job (see manifest_name), or None if MANIFEST is
+        off. With uploads on and no local copy (a Condor rerun on fresh
+        scratch), the manifest of the previous attempt is fetched from the
+        upload destination first.
+        """
+        if not getattr(self.cfg, "MANIFEST", True):
+            return None
+        path = manifest_name(self.process_tag, self.part_tag)
+        upload = self.upload_settings()
+        if restore and upload and not os.path.exists(path):
+            try:
+                make_transfer(upload.get("command", "xrdcp"), upload.get("checksum_command")) \
+                    .copy(destination_of(upload["destination"], path), path)
+                print(f"Restored {path} from {upload['destination']}")
+            except Exception:
+                print(f"No previous {path} at {upload['destination']}")
+        return PartManifest(path)
+
+    def remote_checksum(self):
+        """output -> adler32 of its copy at the upload destination, None if uploads are off."""
+        upload = self.upload_settings()
+        if not upload:
+            return None
+        transfer = make_transfer(upload.get("command", "xrdcp"), upload.get("checksum_command"))
+
+        def checksum(output):
+            try:
+                return transfer.checksum(destination_of(upload["destination"], output))
+            except Exception:
+                return None
+        return checksum
 
+    def check_part(self, part_name, file_list, output, remote_checksum=None):
+        """
+        (valid, reason) of a part from this job's manifest, or else from the
+        manifest of another local job of the process (e.g. part3 run alone
+        before ALL); an entry found there is copied into this job's manifest.
+        """
+        valid, reason = self.manifest.check(part_name, file_list, output, remote_checksum)
+        if valid or reason != "not done":
+            return valid, reason
+        for path in sorted(glob.glob(f"{glob.escape(self.process_tag)}_*_manifest.json")):
+            if os.path.abspath(path) == os.path.abspath(self.manifest.path):
+                continue
+            other = PartManifest(path)
+            if other.check(part_name, file_list, output, remote_checksum)[0]:
+                self.manifest.parts[part_name] = other.parts[part_name]
+                self.manifest.save()
+                return True, f"done (in {path})"
+        return valid, reason
+
+    def skip_completed(self, parts_dict):
+        """
+        Summaries of the parts whose recorded output is still valid; these
+        are not rerun. With force=True every part is redone.
+        """
+        self.manifest = self.load_manifest()
+        if self.manifest is None:
+            return {}
 
-            # Create part-specific output name
-            output_name = f"{self.process_tag}_{part_name}.root"
+        remote_checksum = self.remote_checksum()
+        skipped = {}
+        for part_name, file_list in parts_dict.items():
+            summary = self._new_summary(part_name, file_list)
+            if self.force:
+                continue
 
-            print(f"Writing output to {output_name}")
+            valid, reason = self.check_part(part_name, file_list, summary["output"], remote_checksum)
+            if valid:
+                print(f"Skipping {part_name}: {summary['output']} {reason}")
+                summary["status"] = "skipped"
+                summary["n_events"] = self.manifest.parts[part_name].get("n_events")
+                skipped[part_name] = summary
+            elif reason != "not done":
+                print(f"Redoing {part_name}: {reason}")
+
+        return skipped
+
+    def record_part(self, summary, file_list):
+        """
+        Write the metrics of a finished part (so a job that dies later
+        keeps them), and add it to the manifest and its genweight sums to
+        the cache if it succeeded.
+        """
+        if getattr(self.cfg, "METRICS", True) and summary.get("metrics"):
+            write_metrics(self.process_tag, [summary["metrics"]])
+        if summary["status"] != "ok":
+            return
+        if self.genweight_cache is not None and summary.get("genweight"):
+            self.genweight_cache.store(summary["genweight"]["files"])
+        if self.manifest is not None:
+            self.manifest.record(summary["part"], file_list, summary["output"], summary.get("n_events"))
+
+    def dedup_indexes(self):
+        """
+        Event-ID index directories of the datasets ahead of this process in
+        DEDUP["priority"] ([] when dedup is off or nothing is ahead of it).
+        """
+        dedup = getattr(self.cfg, "DEDUP", None) or {}
+        if not dedup.get("enabled", False):
+            return []
+        index_dir = dedup.get("index_dir", "dedup_index")
+        directories = []
+        for process in higher_priority(self.process_tag, dedup.get("priority", [])):
+            if not read_meta(index_dir, process):
+                raise RuntimeError(f"No dedup index for {process} in {index_dir} "
+                                   f"(python dedup.py build {process})")
+            directories.append(index_dir_of(index_dir, process))
+        return directories
+
+    def upload_part(self, summary):
+        """Hand a successfully finished output to the upload queue."""
+        if self.uploader is None or summary["status"] != "ok":
+            return
+        entry = self.manifest.parts.get(summary["part"], {}) if self.manifest is not None else {}
+        self.uploader.submit(summary["output"], adler32=entry.get("adler32"))
+
+    def upload_settings(self):
+        """UPLOAD config with the upload_to override, None if uploads are off."""
+        upload = dict(getattr(self.cfg, "UPLOAD", None) or {})
+        if self.upload_to:
+            upload.update(enabled=True, destination=self.upload_to)
+        if not upload.get("enabled", False):
+            return None
+        if not upload.get("destination"):
+            raise RuntimeError("UPLOAD is enabled but has no destination")
+        return upload
+
+    def make_uploader(self):
+        """UploadQueue from upload_settings(), None if uploads are off."""
+        upload = self.upload_settings()
+        if not upload:
+            return None
+
+        print(f"Uploading outputs to {upload['destination']} in the background")
+        return UploadQueue(
+            destination=upload["destination"],
+            transfer=upload.get("command", "xrdcp"),
+            checksum_command=upload.get("checksum_command"),
+            retries=upload.get("retries", 3),
+            backoff_s=upload.get("backoff_s", 30),
+            delete_local=upload.get("delete_local", True)
+        )
+
+    def genweight_summary(self, runs_sums):
+        """Totals and per-file (sumw, count) of a part's Runs trees."""
+        files = runs_sums.values()
+        summary = {
+            "sumw": sum(w for w, _ in files.values()),
+            "count": sum(n for _, n in files.values()),
+            "files": files,
+        }
+        print(f"genEventSumw of the inputs: {summary['sumw']:.6g} ({summary['count']} events)")
+        return summary
+
+    def write_runs(self):
+        """True if the Runs tree goes into the outputs (WRITE_RUNS_TREE, MC only)."""
+        return getattr(self.cfg, "WRITE_RUNS_TREE", True) and not self.is_data
+
+    def load_genweight_cache(self):
+        """GenWeightCache receiving the sums read during the skim, or None."""
+        path = getattr(self.cfg, "GENWEIGHT_CACHE", None)
+        if not path or not getattr(self.cfg, "GENWEIGHT_FROM_SKIM", False):
+            return None
+        return GenWeightCache(path)
+
+    def make_stager(self):
+        """FileStager from the STAGING config, or None if staging is off."""
+        staging = getattr(self.cfg, "STAGING", None) or {}
+        if not staging.get("enabled", False):
+            return None
+
+        scratch = staging.get("scratch_dir") or \
+            os.path.join(os.environ.get("_CONDOR_SCRATCH_DIR", "/tmp"), "staged_inputs")
+
+        print(f"Staging inputs to {scratch} "
+              f"(lookahead {staging.get('lookahead', 4)} files, budget {staging.get('max_gb', 20)} GB)")
+
+        return FileStager(
+            fetcher=staging.get("fetcher", "xrdcp"),
+            scratch_dir=scratch,
+            lookahead=staging.get("lookahead", 4),
+            max_bytes=staging.get("max_gb", 20) * 1e9,
+            n_threads=staging.get("threads", 2)
+        )
+
+    def stage_in(self, file_list, wait=True):
+        """
+        Local copies of file_list when staging is on, else file_list itself
+        (see FileStager.acquire_part for wait).
+        """
+        if not self.stager:
+            return file_list
+        urls = unit_files(file_list)
+        local = dict(zip(urls, self.stager.acquire_part(urls, wait=wait)))
+        return [with_file(u, local[unit_file(u)]) for u in file_list]
+
+    def stage_out(self, file_list):
+        """Drop the local copies of a processed part."""
+        if self.stager:
+            self.stager.release_part(unit_files(file_list))
+
+    def get_output_profile(self):
+        """Compression / basket settings of the selected output profile."""
+        name = self.output_profile or getattr(self.cfg, "OUTPUT_PROFILE", None)
+        if not name:
+            return None
+
+        profiles = getattr(self.cfg, "OUTPUT_PROFILES", {})
+        if name not in profiles:
+            raise RuntimeError(f"Output profile '{name}' not found in OUTPUT_PROFILES")
+        return profiles[name]
+
+    def load_trigger_stats(self):
+        """Accumulated per-trigger acceptance from TRIGGER_STATS_FILE, if any."""
+        stats_file = getattr(self.cfg, "TRIGGER_STATS_FILE", None)
+        if not stats_file or not os.path.exists(stats_file):
+            return None
+        with open(stats_file, "r") as f:
+            return json.load(f)
+
+    def save_trigger_stats(self):
+        """Add this run's per-trigger acceptance to TRIGGER_STATS_FILE."""
+        stats_file = getattr(self.cfg, "TRIGGER_STATS_FILE", None)
+        if not stats_file:
+            return
+
+        stats = self.load_trigger_stats() or {}
+        for result in self.results:
+            for trigger, n in result.get("trigger_acceptance", {}).items():
+                stats[trigger] = stats.get(trigger, 0) + n
+
+        with open(stats_file, "w") as f:
+            json.dump(stats, f, indent=4)
+        print(f"Trigger acceptance written to {stats_file}")
+
+    def _run_shared_graph(self, parts_dict):
+        """
+        Book the Snapshot of every part lazily and run them all with one
+        ROOT.RDF.RunGraphs call.
+
+        All graphs are jitted in a single Cling invocation instead of once
+        per part, and the event loops of the parts share one thread pool.
+        A part whose graph cannot be built is reported failed; an error in
+        the combined event loop fails every booked part. No part is released
+        before the loop ends, so a part is staged only while it fits the
+        staging budget and read remotely otherwise.
+        """
+
+        import ROOT
+
+        print(f"Building one shared computation for {len(parts_dict)} parts")
+
+        booked = []
+        results = {}
+        metrics = {}
+        skimmers = {}
+        shared_loop = None
+
+        for part_name, file_list in parts_dict.items():
+
+            summary = self._new_summary(part_name, file_list)
+            results[part_name] = summary
+            metrics[part_name] = PartMetrics(self.process_tag, part_name)
 
             try:
-                skimmer.save_snapshot(output_name, branches_to_save)
-                print(f"{output_name} saved successfully.")
+                skimmer, branches_to_save = self.setup_skimmer(self.stage_in(file_list, wait=False))
+                skimmer.df = metrics[part_name].attach(skimmer.df)
+                skimmers[part_name] = skimmer
+                handle = skimmer.save_snapshot(summary["output"], branches_to_save, lazy=True,
+                                               profile=self.get_output_profile(),
+                                               output_format=self.output_format)
+                booked.append((summary, skimmer, handle))
             except Exception as e:
                 print(f"ERROR during {part_name}: {e}")
-                continue
+                summary["error"] = str(e)
 
-        self.print_stats()
+        if booked:
+            loop_start = time.time()
+            try:
+                handles = [handle for _, _, handle in booked]
+                if not self.write_runs():
+                    # otherwise read by the Runs copy after the Events loop
+                    for _, skimmer, _ in booked:
+                        if skimmer.genweight_sums is not None:
+                            handles.extend(skimmer.genweight_sums.handles)
+                for summary, _, _ in booked:
+                    metrics[summary["part"]].start()
+                bytes0 = ROOT.TFile.GetFileBytesRead()
+                ROOT.RDF.RunGraphs(handles)
+                for summary, _, _ in booked:
+                    metrics[summary["part"]].stop()
+                seconds = time.time() - loop_start
+                nbytes = int(ROOT.TFile.GetFileBytesRead() - bytes0)
+                shared_loop = {"parts": len(booked), "seconds": seconds, "bytes_read": nbytes,
+                               "MBps": nbytes / 1e6 / seconds if seconds else 0.0}
+                for summary, skimmer, _ in booked:
+                    print(f"\n{summary['output']} saved successfully.")
+                    skimmer.print_report()
+                    if self.write_runs():
+                        skimmer.save_runs(summary["output"], profile=self.get_output_profile())
+                    if getattr(self.cfg, "WRITE_CUTFLOW", True):
+                        skimmer.save_cutflow(summary["output"])
+                    self._fill_summary(summary, skimmer)
+            except Exception as e:
+                print(f"ERROR during shared event loop: {e}")
+                for summary, _, _ in booked:
+                    summary["error"] = str(e)
 
+            for summary, _, _ in booked:
+                summary["elapsed"] = time.time() - loop_start
 
-# --- Entry Point ---
-#if __name__ == "__main__":
-    # Create the runner with the imported config module
-#    runner = AnalysisRunner(config)
-#    runner.run()
+        for part_name, summary in results.items():
+            summary["metrics"] = metrics[part_name].finish(summary, skimmers.get(part_name),
+                                                           shared_loop if part_name in skimmers else None)
+            self.record_part(summary, parts_dict[part_name])
+            self.upload_part(summary)
 
-if __name__ == "__main__":
+        for file_list in parts_dict.values():
+            self.stage_out(file_list)
 
-    if len(sys.argv) < 3:
-        print("Usage:")
-        print("  python runner.py PROCESS_TAG PART_TAG")
-        print("Example:")
-        print("  python runner.py WZ_3L ALL")
-        sys.exit(1)
+        return [results[part_name] for part_name in parts_dict]
 
-    process_tag = sys.argv[1]
-    part_tag = sys.argv[2]
+    def _run_pool(self, parts_dict, n_workers):
+        """
+        Schedule parts onto n_workers processes, one process per part.
+
+        Each part runs in a fresh spawned interpreter so a crash inside
+        ROOT (segfault, abort) only fails that part. Every worker gets its
+        own EnableImplicitMT budget of threads_per_worker threads, by
+        default an even share of the CPUs allocated to the job; with
+        PIN_CORES each worker is pinned to its own NUMA-ordered cores.
+        """
+
+        threads = self.threads_per_worker
+        if threads is None:
+            threads = getattr(self.cfg, "THREADS_PER_WORKER", None)
+        if not threads:
+            threads = max(1, allocated_cpus() // n_workers)
+        pin = getattr(self.cfg, "PIN_CORES", False)
+
+        print(f"Running {len(parts_dict)} parts on {n_workers} workers "
+              f"with {threads} threads each")
+
+        ctx = multiprocessing.get_context("spawn")
+        queue = ctx.Queue()
+        metadata = {
+            "cross_section": self.cross_section,
+            "sum_genweight": self.sum_genweight,
+            "is_data": self.is_data,
+        }
+
+        # command line overrides the workers must see as well
+        runner_options = {
+            "output_profile": self.output_profile,
+            "output_format": self.output_format,
+        }
+
+        pending = list(parts_dict.items())
+        staging = set()
+        staged = Queue()
+        running = {}
+        results = {}
+        slots = list(range(n_workers))
+
+        def stage(part_name, file_list):
+            # off the scheduler thread: acquire_part may wait for a release
+            try:
+                local_files = self.stage_in(file_list)
+            except Exception as e:
+                print(f"[WARNING] Staging {part_name} failed, reading remotely: {e}")
+                local_files = file_list
+            staged.put((part_name, local_files))
+
+        while pending or staging or running:
+
+            # ---- Stage the parts of free worker slots ----
+            while pending and len(running) + len(staging) < n_workers:
+                part_name, file_list = pending.pop(0)
+                staging.add(part_name)
+                threading.Thread(target=stage, args=(part_name, file_list),
+                                 name=f"stage-{part_name}", daemon=True).start()
+
+            # ---- Start the staged parts ----
+            while not staged.empty():
+                part_name, local_files = staged.get()
+                staging.discard(part_name)
+                slot = slots.pop(0)
+                cores = worker_cores(slot, threads) if pin else None
+                proc = ctx.Process(
+                    target=_part_worker,
+                    args=(queue, self.cfg.__name__, self.process_tag,
+                          part_name, local_files, metadata, threads, runner_options,
+                          cores),
+                    name=f"{self.process_tag}_{part_name}"
+                )
+                proc.start()
+                running[part_name] = (proc, time.time(), slot)
+
+            # ---- Collect finished parts ----
+            try:
+                summary = queue.get(timeout=1.0 if running else 0.1)
+                results[summary["part"]] = summary
+                self.record_part(summary, parts_dict[summary["part"]])
+                self.upload_part(summary)
+            except Empty:
+                pass
+
+            for part_name, (proc, proc_start, slot) in list(running.items()):
+                if proc.is_alive():
+                    continue
+                proc.join()
+                del running[part_name]
+                slots.append(slot)
+                self.stage_out(parts_dict[part_name])
+
+                # Drain results that arrived while the process exited
+                while True:
+                    try:
+                        summary = queue.get_nowait()
+                        results[summary["part"]] = summary
+                        self.record_part(summary, parts_dict[summary["part"]])
+                        self.upload_part(summary)
+                    except Empty:
+                        break
+
+                if part_name not in results:
+                    summary = self._new_summary(part_name, parts_dict[part_name])
+                    summary["elapsed"] = time.time() - proc_start
+                    summary["error"] = f"worker exited with code {proc.exitcode}"
+                    results[part_name] = summary
+                    print(f"ERROR during {part_name}: worker exited with code {proc.exitcode}")
+
+        return [results[part_name] for part_name in parts_dict]
+
+
+def _part_worker(queue, config_name, process_tag, part_name, file_list, metadata, threads,
+                 runner_options, cores=None):
+    """Entry point of a pool worker: skim one part and report its summary."""
+
+    runner = AnalysisRunner(importlib.import_module(config_name), process_tag, part_name,
+                            **runner_options)
+
+    pin_cores(cores)
+    configure_threads(threads)
+
+    runner.cross_section = metadata["cross_section"]
+    runner.sum_genweight = metadata["sum_genweight"]
+    runner.is_data = metadata["is_data"]
+
+    queue.put(runner.process_part(part_name, file_list))
+
+
+# --- Entry Point ---
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Skim one part (or ALL parts) of a process from the JSON bundle.",
+        epilog="Example:  python runner.py WZ_3L ALL --workers 8"
+    )
+    parser.add_argument("process_tag", help="process tag in the JSON bundle")
+    parser.add_argument("part_tag", help="part name (e.g. part3), parts joined with + (part1+part2), "
+                                         "a slice of a part (part7:2/4 = 2nd of 4) or ALL")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of parts processed in parallel (default: config.N_WORKERS)")
+    parser.add_argument("--threads", default=None,
+                        help="implicit MT threads with one worker, a number or 'auto' "
+                             "(default: config.N_THREADS)")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="EnableImplicitMT threads per worker (default: allocated CPUs / workers)")
+    parser.add_argument("--shared-graph", action="store_true", default=None,
+                        help="book all parts and run them in one RunGraphs call (single worker only)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="report branches to save and their estimated size, then exit")
+    parser.add_argument("--profile", default=None,
+                        help="output compression profile from config.OUTPUT_PROFILES")
+    parser.add_argument("--output-format", choices=["ttree", "rntuple"], default=None,
+                        help="write the Events tree as TTree or RNTuple (default: config.OUTPUT_FORMAT)")
+    parser.add_argument("--force", action="store_true",
+                        help="rerun parts already recorded as done in the manifest")
+    parser.add_argument("--list", action="store_true",
+                        help="list the parts and their manifest status, then exit")
+    parser.add_argument("--upload-to", default=None,
+                        help="upload each finished output there in the background "
+                             "(default: config.UPLOAD)")
+    args = parser.parse_args()
 
     runner = AnalysisRunner(
         config,
-        process_tag=process_tag,
-        part_tag=part_tag
+        process_tag=args.process_tag,
+        part_tag=args.part_tag,
+        n_workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+        shared_graph=args.shared_graph,
+        dry_run=args.dry_run,
+        output_profile=args.profile,
+        output_format=args.output_format,
+        force=args.force,
+        n_threads=args.threads,
+        upload_to=args.upload_to
     )
 
+    if args.list:
+        runner.list_parts()
+        sys.exit(0)
+
     runner.run()
 
+    if any(r["status"] not in ("ok", "skipped") for r in runner.results):
+        sys.exit(1)
@@ -1,39 +1,180 @@
 import ROOT
-from typing import List, Union
+from typing import Dict, List, Union
+from filter_engine import TriggerFilter, compiled_filter
+from branch_budget import apply_collection_rules, prune_unused
+from io_stats import IOStats, make_chain
+from genweight_cache import RunsSums
+from object_selection import slim_collections
+from dedup import dedup_filter
+from work_units import is_ranged, unit_file, unit_files, unit_range
 
-# Enable multi-threading for speed
-ROOT.ROOT.EnableImplicitMT()
+ROOT.gInterpreter.Declare("""
+void skim_enter_range(TEntryList &list, Long64_t first, Long64_t last) {
+    for (Long64_t i = first; i < last; ++i) list.Enter(i);
+}
+""")
+
+
+def make_entry_list(tree_name: str, units: List):
+    """
+    TEntryList selecting the entry ranges of units; whole-file units
+    select every entry of their file.
+    """
+    elist = ROOT.TEntryList()
+    for url in unit_files(units):
+        sub = ROOT.TEntryList("", "", tree_name, url)
+        for unit in units:
+            if unit_file(unit) != url:
+                continue
+            entries = unit_range(unit)
+            if entries is None:
+                f = ROOT.TFile.Open(url)
+                entries = (0, f.Get(tree_name).GetEntries())
+                f.Close()
+            ROOT.skim_enter_range(sub, entries[0], entries[1])
+        elist.Add(sub)
+    return elist
+
+
+def rntuple_supported():
+    """True if this ROOT build can Snapshot to RNTuple."""
+    return hasattr(ROOT.RDF, "ESnapshotOutputFormat") and \
+        hasattr(ROOT.RDF.RSnapshotOptions(), "fOutputFormat")
+
+
+def snapshot_options(profile: Dict = None, output_format: str = "ttree"):
+    """
+    RSnapshotOptions for an output profile (see config.OUTPUT_PROFILES).
+
+    Recognised keys: compression ("ZLIB", "LZMA", "LZ4", "ZSTD"), level,
+    autoflush, basket_size, split_level. Missing keys keep ROOT's defaults.
+    output_format: "ttree" or "rntuple"; falls back to TTree when the ROOT
+    build cannot write RNTuple.
+    """
+    profile = profile or {}
+
+    opts = ROOT.RDF.RSnapshotOptions()
+    opts.fMode = "RECREATE"
+
+    if output_format.lower() == "rntuple":
+        if rntuple_supported():
+            opts.fOutputFormat = ROOT.RDF.ESnapshotOutputFormat.kRNTuple
+        else:
+            print("[WARNING] RNTuple Snapshot not supported by this ROOT build, writing a TTree")
+    elif output_format.lower() != "ttree":
+        raise RuntimeError(f"Unknown output format '{output_format}'")
+
+    if "compression" in profile:
+        algorithms = ROOT.ROOT.RCompressionSetting.EAlgorithm
+        name = profile["compression"].upper()
+        if not hasattr(algorithms, f"k{name}"):
+            raise RuntimeError(f"Unknown compression algorithm '{profile['compression']}'")
+        opts.fCompressionAlgorithm = getattr(algorithms, f"k{name}")
+    if "level" in profile:
+        opts.fCompressionLevel = int(profile["level"])
+    if "autoflush" in profile:
+        opts.fAutoFlush = int(profile["autoflush"])
+    if "split_level" in profile:
+        opts.fSplitLevel = int(profile["split_level"])
+    if "basket_size" in profile:
+        if hasattr(opts, "fBasketSize"):
+            opts.fBasketSize = int(profile["basket_size"])
+        else:
+            print("[WARNING] This ROOT version has no RSnapshotOptions::fBasketSize, ignored")
+
+    return opts
 
 class AnalysisSkimmer:
-    def __init__(self, input_files: Union[str, List[str]], tree_name: str):
-        self.df = ROOT.RDataFrame(tree_name, input_files)
+    def __init__(self, input_files: Union[str, List], tree_name: str,
+                 read_options: Dict = None, io_stats: bool = True):
+        """
+        input_files: file URL(s) or work units (see work_units); entry-range
+        units are applied through a TEntryList on the input TChain.
+        read_options: TTreeCache / prefetch settings (see io_stats.make_chain);
+        when given the RDataFrame is built on a TChain configured with them.
+        io_stats: record bytes read and read calls per input file.
+        """
+        units = [input_files] if isinstance(input_files, str) else list(input_files)
+        ranged = any(is_ranged(u) for u in units)
+
+        self.chain = None
+        self.entry_list = None
+        if read_options or ranged:
+            self.chain = make_chain(tree_name, unit_files(units), read_options)
+            if ranged:
+                self.entry_list = make_entry_list(tree_name, units)
+                self.chain.SetEntryList(self.entry_list)
+                print(f"Selected {self.entry_list.GetN()} entries from {len(units)} work units")
+            self.df = ROOT.RDataFrame(self.chain)
+        else:
+            self.df = ROOT.RDataFrame(tree_name, unit_files(units))
         self.input_files = input_files
         self.output_branches = []
+        self.report = None
+        self.n_selected = None
+        self.trigger_filter = None
+        self.genweight_sums = None
+
+        self.io_stats = None
+        if io_stats:
+            self.io_stats = IOStats()
+            self.df = self.io_stats.attach(self.df)
         print(f"Initialized RDataFrame with tree '{tree_name}'")
 
 
-    def apply_global_filters(self, triggers: List[str] = [], met_filters: List[str] = []):
+    def apply_global_filters(self, triggers: List[str] = [], met_filters: List[str] = [],
+                             trigger_order: Dict[str, float] = None, count_triggers: bool = False,
+                             optional_triggers: List[str] = None):
         """
         Applies Triggers (OR logic) and MET Filters (AND logic) if provided.
+        trigger_order: per-trigger acceptance of a previous run, most
+        accepting triggers are tested first.
+        optional_triggers: triggers that may be missing from the input.
         """
 
         # 1. Apply Triggers (OR)
         if triggers:
-            self.df = self.df.Filter(" || ".join(triggers), "Combined Trigger Cut")
-            print(f"Applied {len(triggers)} Triggers")
+            self.trigger_filter = TriggerFilter(triggers, order_hint=trigger_order, count=count_triggers,
+                                                optional=optional_triggers)
+            self.df = self.trigger_filter.apply(self.df, "Combined Trigger Cut")
+            print(f"Applied {len(self.trigger_filter.triggers)} Triggers")
         
 
         # 2. Apply MET Filters (AND)
         if met_filters:
-            self.df = self.df.Filter(" && ".join(met_filters), "Combined MET Cut")
+            self.df = compiled_filter(self.df, " && ".join(met_filters), "Combined MET Cut")
             print(f"Applied {len(met_filters)} MET Filters")
         
-        self.df = self.df.Filter("PV_npvsGood > 0 && nJet>0 && nMuon + nElectron >= 3", "Has Good PV atleat one jet only 3 L")
+        self.df = compiled_filter(self.df, "PV_npvsGood > 0 && nJet>0 && nMuon + nElectron >= 3", "Has Good PV atleat one jet only 3 L")
         print("3 Lepton >1 jet and the GOOD_PV cut is applied")
 
         return self.df
 
 
+    def apply_dedup(self, index_dirs: List[str], cache_runs: int = 2, name: str = "Not in higher-priority datasets"):
+        """
+        Drop events whose (run, luminosityBlock, event) is in one of the
+        event-ID indexes of index_dirs (see dedup). Booked after the event
+        filters, so only passing events are looked up.
+        """
+        if index_dirs:
+            self.df = dedup_filter(self.df, index_dirs, cache_runs, name)
+            print(f"Applied dedup against {len(index_dirs)} event-ID indexes")
+        return self.df
+
+
+    def select_objects(self, selections: Dict[str, str], branches: List[str] = None):
+        """
+        Keep only the objects passing selections[collection] in the written
+        collections (see object_selection); branches: the final branch
+        list, only those columns are slimmed. Call after the event filters,
+        which still see every object.
+        """
+        if selections:
+            self.df = slim_collections(self.df, selections, branches)
+        return self.df
+
+
     def define_total_weight(self, cross_section, sum_gen_weight):
         print(f"Defining Total Normalization Weight")
         print(f"  > Cross Section: {cross_section} in fb")
@@ -59,36 +200,127 @@ class AnalysisSkimmer:
         self.output_branches.extend(["totalWeight", "globalScale", "sumGenWeight", "crossSection"])
         return self
 
-    def build_branch_list(self, explicit_branches, wildcard_patterns=None):
+    def book_genweight_sums(self):
+        """
+        Book per-file genEventSumw / genEventCount from the Runs tree of the
+        inputs, read in the same job instead of a separate pass (MC only).
+        A file split into entry ranges is counted by its unit starting at
+        entry 0 only, so the parts of a split file add up.
+        """
+        units = [self.input_files] if isinstance(self.input_files, str) else list(self.input_files)
+        first_units = [u for u in units if not is_ranged(u) or unit_range(u)[0] == 0]
+        self.genweight_sums = RunsSums(unit_files(first_units))
+        return self.genweight_sums
+
+    def save_runs(self, output_filename: str, profile: Dict = None):
+        """
+        Add the Runs tree of the inputs (same units as book_genweight_sums)
+        and a "genWeightSums" histogram (bin 1 genEventSumw, bin 2
+        genEventCount) to output_filename. Run after the Events loop: the
+        file is opened in UPDATE mode. The per-file sums booked on the Runs
+        tree are filled by the same loop.
+        """
+        if self.genweight_sums is None:
+            self.book_genweight_sums()
+        runs = self.genweight_sums
+        if runs.df is None:
+            print("No input file starts a Runs tree in this part, Runs not written")
+            return
+
+        opts = snapshot_options(profile, "ttree")
+        opts.fMode = "UPDATE"
+        runs.df.Snapshot("Runs", output_filename, runs.df.GetColumnNames(), opts)
+
+        sums = runs.values()
+        hist = ROOT.TH1D("genWeightSums", "Sums over the input Runs trees", 2, 0, 2)
+        hist.SetDirectory(ROOT.nullptr)
+        hist.GetXaxis().SetBinLabel(1, "genEventSumw")
+        hist.GetXaxis().SetBinLabel(2, "genEventCount")
+        # hadd of the outputs adds these up like the Runs trees
+        hist.SetBinContent(1, sum(w for w, _ in sums.values()))
+        hist.SetBinContent(2, sum(n for _, n in sums.values()))
+
+        out = ROOT.TFile.Open(output_filename, "UPDATE")
+        out.WriteObject(hist, "genWeightSums")
+        out.Close()
+        print(f"Runs tree and genWeightSums written to {output_filename}")
+
+    def save_cutflow(self, output_filename: str):
+        """
+        Add the cutflow of the finished event loop to output_filename as a
+        "skimCutflow" histogram: bin 1 events read, then one bin per filter
+        with the events passing it (labelled with the filter name). Run
+        after the Events loop: the file is opened in UPDATE mode.
+        """
+        cuts = list(self.report.GetValue()) if self.report is not None else []
+        if not cuts:
+            print("No filters in the event loop, skimCutflow not written")
+            return
+
+        hist = ROOT.TH1D("skimCutflow", "Events read and passing each filter",
+                         len(cuts) + 1, 0, len(cuts) + 1)
+        hist.SetDirectory(ROOT.nullptr)
+        hist.GetXaxis().SetBinLabel(1, "All")
+        hist.SetBinContent(1, cuts[0].GetAll())
+        for i, cut in enumerate(cuts):
+            hist.GetXaxis().SetBinLabel(i + 2, str(cut.GetName()))
+            hist.SetBinContent(i + 2, cut.GetPass())
+
+        out = ROOT.TFile.Open(output_filename, "UPDATE")
+        out.WriteObject(hist, "skimCutflow")
+        out.Close()
+
+    def build_branch_list(self, explicit_branches, wildcard_patterns=None,
+                          allow=None, deny=None, used_branches=None):
         """
         Combine explicit branches + wildcard branches
         into one final list using the RDataFrame schema.
+
+        allow / deny: per-collection field patterns (see branch_budget).
+        used_branches: patterns read downstream; everything else is dropped.
         """
 
         final_branches = list(explicit_branches)
 
-        if not wildcard_patterns:
-            return final_branches
+        if wildcard_patterns:
+            print("Expanding wildcard branches in Skimmer...")
 
-        print("Expanding wildcard branches in Skimmer...")
+            all_branches = [str(b) for b in self.df.GetColumnNames()]
 
-        all_branches = [str(b) for b in self.df.GetColumnNames()]
-        
-        for pattern in wildcard_patterns:
-            prefix = pattern.replace("*", "")
-            matches = [b for b in all_branches if b.startswith(prefix)]
+            for pattern in wildcard_patterns:
+                prefix = pattern.replace("*", "")
+                matches = [b for b in all_branches if b.startswith(prefix)]
 
-            print(f"[INFO] Found {len(matches)} branches for {pattern}")
-            final_branches.extend(matches)
+                print(f"[INFO] Found {len(matches)} branches for {pattern}")
+                final_branches.extend(matches)
 
         # clean list
-        #final_branches = (final_branches)
+        final_branches = list(dict.fromkeys(final_branches))
+
+        if allow or deny:
+            n_before = len(final_branches)
+            final_branches = apply_collection_rules(final_branches, allow, deny)
+            print(f"[INFO] Allow/deny lists removed {n_before - len(final_branches)} branches")
+
+        if used_branches:
+            final_branches = prune_unused(final_branches, used_branches)
+
         print(f"Total branches to save: {len(final_branches)}")
 
         return final_branches
 
 
-    def save_snapshot(self, output_filename: str, extra_branches: List[str] = None):
+    def save_snapshot(self, output_filename: str, extra_branches: List[str] = None, lazy: bool = False,
+                      profile: Dict = None, output_format: str = "ttree"):
+        """
+        Write the selected branches to output_filename, as a TTree or an
+        RNTuple named "Events".
+        profile: compression / basket settings, see snapshot_options().
+
+        With lazy=True the Snapshot is only booked and its result handle is
+        returned, so several skimmers can be run together with
+        ROOT.RDF.RunGraphs; call print_report() once the loop has run.
+        """
         if extra_branches:
             self.output_branches.extend(extra_branches)
             
@@ -105,16 +337,28 @@ class AnalysisSkimmer:
             print("The progress bar is not supporting !! ")
             pass # Older ROOT versions might not have this
 
-        report = self.df.Report()
+        self.report = self.df.Report()
+        self.n_selected = self.df.Count()
 
-        # Run Snapshot (Event Loop happens here)
-        opts = ROOT.RDF.RSnapshotOptions()
-        opts.fMode = "RECREATE"
-        self.df.Snapshot("Events", output_filename, branch_vector, opts)
+        # Run Snapshot (Event Loop happens here unless lazy)
+        opts = snapshot_options(profile, output_format)
+        opts.fLazy = lazy
+        snapshot = self.df.Snapshot("Events", output_filename, branch_vector, opts)
+
+        if lazy:
+            return snapshot
 
         # Call the helper function to add the histogram
+        self.print_report()
+        return snapshot
 
+    def print_report(self):
+        """Cutflow, trigger acceptance and input I/O of the finished event loop."""
         print("\n--- Cut Flow Report ---")
-        report.Print()
-
-
+        self.report.Print()
+        if self.trigger_filter is not None:
+            self.trigger_filter.print_acceptance()
+        if self.io_stats is not None:
+            if self.io_stats.totals is None:
+                self.io_stats.finish()
+            self.io_stats.print_report()
@@ -0,0 +1,270 @@
+import os
+import shutil
+import subprocess
+import threading
+from typing import Callable, Dict, List
+
+
+class XrdcpFetcher:
+    """Copy a root:// URL to a local path with xrdcp."""
+
+    def __init__(self, command: List[str] = None):
+        self.command = command or ["xrdcp", "--nopbar", "-f"]
+
+    def __call__(self, url: str, dest: str):
+        result = subprocess.run(self.command + [url, dest],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise RuntimeError(f"xrdcp failed for {url}: {result.stderr.decode().strip()}")
+
+
+class TFileCpFetcher:
+    """Copy a file with TFile::Cp (no xrdcp binary needed)."""
+
+    def __call__(self, url: str, dest: str):
+        import ROOT
+        if not ROOT.TFile.Cp(url, dest, False):
+            raise RuntimeError(f"TFile::Cp failed for {url}")
+
+
+class LocalDirFetcher:
+    """
+    Stand-in for the XRootD redirector: the LFN of each URL is looked up
+    below a local directory, e.g. root://host//store/x.root -> root_dir/store/x.root.
+    """
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+
+    def __call__(self, url: str, dest: str):
+        shutil.copyfile(os.path.join(self.root_dir, lfn_of(url).lstrip("/")), dest)
+
+
+def lfn_of(url: str) -> str:
+    """/store/... part of a root:// URL (the URL itself if it has none)."""
+    index = url.find("/store/")
+    return url[index:] if index >= 0 else url
+
+
+def make_fetcher(spec) -> Callable[[str, str], None]:
+    """
+    Fetcher from a config value: "xrdcp", "tfile", "local:/some/dir",
+    or any callable(url, dest).
+    """
+    if callable(spec):
+        return spec
+    if spec == "xrdcp":
+        return XrdcpFetcher()
+    if spec == "tfile":
+        return TFileCpFetcher()
+    if spec.startswith("local:"):
+        return LocalDirFetcher(spec[len("local:"):])
+    raise RuntimeError(f"Unknown staging fetcher '{spec}'")
+
+
+class FileStager:
+    """
+    Copies input files to local scratch in background threads while the
+    current part is processed.
+
+    Files are fetched in the order given to schedule(). Files of a part
+    passed to acquire_part() come first; beyond those, at most `lookahead`
+    files are prefetched. Every fetch must fit `max_bytes` (staged bytes
+    plus the files in flight, at the average staged size): a file of a
+    part that does not fit waits for a release_part() of a part in use, or
+    is read remotely when no part holds any budget (or with wait=False).
+    A file may belong to several parts (entry-range units): its local copy
+    is deleted by the release_part() of the last part using it, and is
+    fetched again if a later part asks for it. A file that cannot be
+    fetched is read remotely from its original URL.
+    """
+
+    def __init__(self, fetcher, scratch_dir: str, lookahead: int = 4,
+                 max_bytes: float = 20e9, n_threads: int = 2):
+        self.fetcher = make_fetcher(fetcher)
+        self.scratch_dir = scratch_dir
+        self.lookahead = lookahead
+        self.max_bytes = max_bytes
+
+        self._cond = threading.Condition()
+        self._order: List[str] = []
+        self._state: Dict[str, str] = {}     # pending / fetching / ready / failed / remote / released
+        self._local: Dict[str, str] = {}
+        self._size: Dict[str, int] = {}
+        self._users: Dict[str, int] = {}   # parts between acquire_part() and release_part()
+        self._in_use: Dict[str, int] = {}  # those of them acquire_part() returned to
+        self._bytes_on_disk = 0
+        self._closed = False
+
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"stager-{i}", daemon=True)
+            for i in range(n_threads)
+        ]
+        for t in self._threads:
+            t.start()
+
+    # ---- public API ----
+
+    def schedule(self, urls: List[str]):
+        """Queue urls for staging, in processing order (released ones again)."""
+        with self._cond:
+            self._schedule(urls)
+            self._cond.notify_all()
+
+    def acquire_part(self, urls: List[str], wait: bool = True) -> List[str]:
+        """
+        Block until the files are staged (or given up) and return the paths
+        to read. With wait=False, files over the budget are read remotely
+        instead of waiting for a release (parts booked together whose
+        files stay in use until they all finish).
+        """
+        with self._cond:
+            self._schedule(urls)
+            for url in urls:
+                self._users[url] = self._users.get(url, 0) + 1
+            self._cond.notify_all()
+            while True:
+                for url in urls:
+                    if self._state[url] == "pending" and not self._fits() \
+                            and (not wait or self._releasable() == 0):
+                        self._state[url] = "remote"
+                if not any(self._state[u] in ("pending", "fetching") for u in urls):
+                    break
+                self._cond.wait()
+
+            paths = []
+            n_remote = 0
+            for url in urls:
+                self._in_use[url] = self._in_use.get(url, 0) + 1
+                if self._state[url] == "ready":
+                    paths.append(self._local[url])
+                    continue
+                if self._state[url] == "remote":
+                    n_remote += 1
+                else:
+                    print(f"[WARNING] Staging failed, reading remotely: {url}")
+                paths.append(url)
+            if n_remote:
+                print(f"[INFO] {n_remote} files over the staging budget, reading them remotely")
+            return paths
+
+    def release_part(self, urls: List[str]):
+        """
+        Give up the files of a processed part; the local copies no other
+        part uses are deleted and their budget freed.
+        """
+        with self._cond:
+            for url in urls:
+                for counter in (self._users, self._in_use):
+                    if counter.get(url, 0) > 1:
+                        counter[url] -= 1
+                    else:
+                        counter.pop(url, None)
+                if url not in self._users:
+                    self._drop(url)
+            self._cond.notify_all()
+
+    def close(self):
+        """Stop the fetch threads and remove every staged file."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join()
+        with self._cond:
+            for url in [u for u, s in self._state.items() if s == "ready"]:
+                self._drop(url)
+
+    # ---- internals ----
+
+    def _schedule(self, urls: List[str]):
+        for url in urls:
+            if url not in self._state:
+                self._order.append(url)
+                self._state[url] = "pending"
+            elif self._state[url] == "released":
+                self._state[url] = "pending"
+
+    def _drop(self, url: str):
+        """Delete the local copy of url (if any) and mark it released."""
+        if self._state.get(url) == "ready":
+            try:
+                os.remove(self._local[url])
+            except OSError:
+                pass
+            self._bytes_on_disk -= self._size.get(url, 0)
+        if url in self._state and self._state[url] != "fetching":
+            self._state[url] = "released"
+
+    def _prefetched(self):
+        """Files staged or being staged ahead of the part in use."""
+        return sum(1 for u, s in self._state.items()
+                   if s in ("fetching", "ready") and u not in self._in_use)
+
+    def _estimate(self):
+        """Expected size of a file: average of what was already staged."""
+        return sum(self._size.values()) / len(self._size) if self._size else 0
+
+    def _committed(self):
+        """Bytes staged plus the expected size of the files in flight."""
+        n_fetching = sum(1 for s in self._state.values() if s == "fetching")
+        return self._bytes_on_disk + n_fetching * self._estimate()
+
+    def _fits(self):
+        """Whether one more file may be fetched within max_bytes (always when nothing is staged)."""
+        committed = self._committed()
+        return committed == 0 or committed + self._estimate() <= self.max_bytes
+
+    def _releasable(self):
+        """Staged bytes of parts in use, freed by their release_part()."""
+        return sum(self._size.get(u, 0) for u in self._in_use if self._state.get(u) == "ready")
+
+    def _next_url(self):
+        """Next file to fetch, or None if nothing may start now."""
+        pending = [u for u in self._order if self._state[u] == "pending"]
+        if not pending or not self._fits():
+            return None
+
+        wanted = [u for u in pending if u in self._users]
+        if wanted:
+            return wanted[0]
+
+        if self._prefetched() >= self.lookahead:
+            return None
+
+        return pending[0]
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                url = self._next_url()
+                while not self._closed and url is None:
+                    self._cond.wait()
+                    url = self._next_url()
+                if self._closed:
+                    return
+                self._state[url] = "fetching"
+
+            dest = os.path.join(self.scratch_dir, lfn_of(url).lstrip("/").replace("root://", ""))
+            try:
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                self.fetcher(url, dest)
+                size = os.path.getsize(dest)
+                state = "ready"
+            except Exception as e:
+                print(f"[WARNING] Could not stage {url}: {e}")
+                size = 0
+                state = "failed"
+
+            with self._cond:
+                if self._state[url] == "released" or self._closed:
+                    # part was given up while fetching
+                    if state == "ready":
+                        os.remove(dest)
+                else:
+                    self._state[url] = state
+                    if state == "ready":
+                        self._local[url] = dest
+                        self._size[url] = size
+                        self._bytes_on_disk += size
+                self._cond.notify_all()
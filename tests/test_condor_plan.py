@@ -0,0 +1,41 @@
+"""Job planning of make_condor_submit.py and the slices it hands to runner.py."""
+
+import config
+from make_condor_submit import job_resources, plan_jobs
+from work_units import format_part_tag, part_slice
+
+COSTS = [
+    # part, events, bytes, units
+    ("part1", 1e6, 1e9, 3),
+    ("part2", 2e6, 2e9, 3),
+    ("part3", 17e6, 17e9, 10),
+    ("part4", 90e6, 90e9, 1),
+]
+
+
+def plan(costs=COSTS):
+    jobs = plan_jobs("P", costs, config.CONDOR)
+    return {format_part_tag(j["items"]): job_resources(j, config.CONDOR, {}) for j in jobs}
+
+
+def test_cpus_follow_the_predicted_events():
+    jobs = plan()
+    assert jobs["part1+part2"]["cpus"] == 1
+    assert jobs["part3"]["cpus"] == 4
+    assert jobs["part3"]["memory_mb"] > jobs["part1+part2"]["memory_mb"]
+
+
+def test_single_heavy_file_is_split():
+    jobs = plan()
+    assert [tag for tag in jobs if tag.startswith("part4")] == ["part4:1/3", "part4:2/3", "part4:3/3"]
+
+
+def test_slices_beyond_the_units_cut_entry_ranges():
+    slices = [part_slice(["a.root"], index, 3, entries=lambda url: 1000) for index in (1, 2, 3)]
+    assert slices == [[{"file": "a.root", "first": 0, "last": 333}],
+                      [{"file": "a.root", "first": 333, "last": 666}],
+                      [{"file": "a.root", "first": 666, "last": 1000}]]
+
+
+def test_slices_within_the_units_keep_whole_units():
+    assert part_slice(["a", "b", "c", "d"], 1, 3) == ["a", "b"]
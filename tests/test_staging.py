@@ -0,0 +1,94 @@
+"""FileStager with a local directory standing in for the XRootD redirector."""
+
+import os
+
+import pytest
+
+from staging import FileStager
+
+
+@pytest.fixture
+def redirector(tmp_path):
+    """local:<dir> fetcher spec and the URLs of three 1 kB files below it."""
+    store = tmp_path / "eos" / "store" / "data"
+    store.mkdir(parents=True)
+    urls = []
+    for i in range(3):
+        (store / f"f{i}.root").write_bytes(bytes([i]) * 1000)
+        urls.append(f"root://cmsxrootd.fnal.gov//store/data/f{i}.root")
+    return f"local:{tmp_path / 'eos'}", urls
+
+
+def make_stager(redirector, tmp_path, **kwargs):
+    return FileStager(redirector[0], str(tmp_path / "scratch"), **kwargs)
+
+
+def test_part_is_staged_and_released(redirector, tmp_path):
+    stager = make_stager(redirector, tmp_path)
+    urls = redirector[1]
+    try:
+        paths = stager.acquire_part(urls[:2])
+        assert all(p.startswith(str(tmp_path / "scratch")) for p in paths)
+        assert open(paths[1], "rb").read() == bytes([1]) * 1000
+
+        stager.release_part(urls[:2])
+        assert not any(os.path.exists(p) for p in paths)
+    finally:
+        stager.close()
+
+
+def test_shared_file_is_kept_until_last_part_releases_it(redirector, tmp_path):
+    stager = make_stager(redirector, tmp_path)
+    urls = redirector[1]
+    try:
+        # two entry-range parts of the same file
+        path_a, = stager.acquire_part([urls[0]])
+        path_b, = stager.acquire_part([urls[0]])
+        assert path_a == path_b
+
+        stager.release_part([urls[0]])
+        assert os.path.exists(path_b)
+
+        stager.release_part([urls[0]])
+        assert not os.path.exists(path_b)
+    finally:
+        stager.close()
+
+
+def test_released_file_is_staged_again(redirector, tmp_path, capsys):
+    stager = make_stager(redirector, tmp_path)
+    urls = redirector[1]
+    try:
+        stager.acquire_part([urls[0]])
+        stager.release_part([urls[0]])
+
+        path, = stager.acquire_part([urls[0]])
+        assert path != urls[0] and os.path.exists(path)
+        assert "Staging failed" not in capsys.readouterr().out
+    finally:
+        stager.close()
+
+
+def test_files_over_budget_are_read_remotely(redirector, tmp_path):
+    stager = make_stager(redirector, tmp_path, max_bytes=1500, n_threads=1)
+    urls = redirector[1]
+    try:
+        stager.acquire_part([urls[0]])
+        stager.release_part([urls[0]])
+
+        # 1 kB each: the first fits the budget, nothing in use can free room for the others
+        paths = stager.acquire_part(urls)
+        assert paths[0] != urls[0]
+        assert paths[1:] == urls[1:]
+    finally:
+        stager.close()
+
+
+def test_missing_file_is_read_remotely(redirector, tmp_path, capsys):
+    stager = make_stager(redirector, tmp_path)
+    missing = "root://cmsxrootd.fnal.gov//store/data/missing.root"
+    try:
+        assert stager.acquire_part([missing]) == [missing]
+        assert "Staging failed" in capsys.readouterr().out
+    finally:
+        stager.close()
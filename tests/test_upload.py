@@ -0,0 +1,60 @@
+"""UploadQueue with the "cp" transfer into a local directory."""
+
+import os
+import stat
+
+from upload import UploadQueue, XrdcpTransfer, adler32_file
+
+
+def write_outputs(directory, n=2):
+    directory.mkdir()
+    paths = []
+    for i in range(n):
+        path = directory / f"skim_{i}.root"
+        path.write_bytes(os.urandom(4096))
+        paths.append(str(path))
+    return paths
+
+
+def test_cp_queue_uploads_verifies_and_removes_local(tmp_path):
+    paths = write_outputs(tmp_path / "out")
+    checksums = {p: adler32_file(p) for p in paths}
+    destination = tmp_path / "eos"
+    queue = UploadQueue(str(destination), transfer="cp", backoff_s=0)
+    for path in paths:
+        queue.submit(path)
+    records = queue.close()
+
+    assert set(records) == set(paths)
+    for path in paths:
+        record = records[path]
+        dest = destination / os.path.basename(path)
+        assert record["status"] == "uploaded"
+        assert record["attempts"] == 1
+        assert record["adler32"] == checksums[path] == adler32_file(str(dest))
+        assert not os.path.exists(path)
+        assert not os.path.exists(str(dest) + ".part")
+
+
+def test_cp_queue_skips_files_already_present(tmp_path):
+    paths = write_outputs(tmp_path / "out", n=1)
+    destination = tmp_path / "eos"
+    destination.mkdir()
+    (destination / os.path.basename(paths[0])).write_bytes(open(paths[0], "rb").read())
+    queue = UploadQueue(str(destination), transfer="cp", backoff_s=0, delete_local=False)
+    queue.submit(paths[0], adler32_file(paths[0]))
+    record = queue.close()[paths[0]]
+
+    assert record["status"] == "present"
+    assert record["attempts"] == 0
+    assert os.path.exists(paths[0])
+
+
+def test_xrdcp_checksum_of_empty_query_output(tmp_path, monkeypatch):
+    xrdfs = tmp_path / "bin" / "xrdfs"
+    xrdfs.parent.mkdir()
+    xrdfs.write_text("#!/bin/sh\nexit 0\n")
+    xrdfs.chmod(xrdfs.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{xrdfs.parent}{os.pathsep}{os.environ['PATH']}")
+
+    assert XrdcpTransfer().checksum("root://eosuser.cern.ch//eos/user/s/skim.root") is None
@@ -0,0 +1,215 @@
+"""
+Background upload of finished part outputs.
+
+The runner hands every finished output to an UploadQueue, which ships it
+to the destination while the next part is skimmed: the local adler32 is
+compared with the checksum of the remote copy, the copy is retried until
+they match (up to `retries` times, waiting backoff_s, 2*backoff_s, ...),
+and the local file is removed once the remote copy is confirmed. A file
+already at the destination with the same checksum is not copied again.
+
+Transfers run in a separate spawned process, so they progress while the
+event loop holds the GIL of the runner process. How files are copied is
+pluggable (make_transfer): xrdcp to root:// destinations, cp to a local
+directory, or any command template.
+"""
+
+import multiprocessing
+import os
+import re
+import shutil
+import subprocess
+import time
+from typing import Dict, List, Optional
+
+from bundle_index import split_url
+from manifest import adler32_file
+
+_ADLER32 = re.compile(r"\b[0-9a-fA-F]{8}\b")
+
+
+class XrdcpTransfer:
+    """Copy to a root:// destination with xrdcp; remote checksum from xrdfs."""
+
+    def __init__(self, command: List[str] = None):
+        self.command = command or ["xrdcp", "--nopbar", "-f"]
+
+    def copy(self, src: str, dest: str):
+        result = subprocess.run(self.command + [src, dest],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise RuntimeError(f"xrdcp failed for {src}: {result.stderr.decode().strip()}")
+
+    def checksum(self, dest: str) -> Optional[str]:
+        """adler32 of the remote file, None if it does not exist."""
+        server, path = split_url(dest)
+        result = subprocess.run(["xrdfs", server, "query", "checksum", path],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # "adler32 1a2b3c4d"
+        fields = result.stdout.decode().split(None, 1) if result.returncode == 0 else []
+        match = _ADLER32.search(fields[-1]) if fields else None
+        return match.group(0).lower() if match else None
+
+
+class LocalCopyTransfer:
+    """Copy into a local directory (or a FUSE mount such as /eos)."""
+
+    def copy(self, src: str, dest: str):
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+        tmp = dest + ".part"
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dest)
+
+    def checksum(self, dest: str) -> Optional[str]:
+        return adler32_file(dest) if os.path.exists(dest) else None
+
+
+class CommandTransfer:
+    """
+    Copy with a command template, e.g. ["gfal-copy", "-f", "{src}", "{dest}"].
+    checksum_command (with {dest}) prints the adler32 of the remote copy;
+    without it a copy cannot be verified and the local file is kept.
+    """
+
+    def __init__(self, command: List[str], checksum_command: List[str] = None):
+        self.command = command
+        self.checksum_command = checksum_command
+
+    def copy(self, src: str, dest: str):
+        argv = [arg.format(src=src, dest=dest) for arg in self.command]
+        result = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise RuntimeError(f"{argv[0]} failed for {src}: {result.stderr.decode().strip()}")
+
+    def checksum(self, dest: str) -> Optional[str]:
+        if not self.checksum_command:
+            return None
+        argv = [arg.format(dest=dest) for arg in self.checksum_command]
+        result = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        match = _ADLER32.search(result.stdout.decode()) if result.returncode == 0 else None
+        return match.group(0).lower() if match else None
+
+
+def make_transfer(spec, checksum_command: List[str] = None):
+    """
+    Transfer from a config value: "xrdcp", "cp", a command template list
+    (see CommandTransfer) or an object with copy(src, dest) / checksum(dest).
+    """
+    if hasattr(spec, "copy") and hasattr(spec, "checksum"):
+        return spec
+    if isinstance(spec, (list, tuple)):
+        return CommandTransfer(list(spec), checksum_command)
+    if spec == "xrdcp":
+        return XrdcpTransfer()
+    if spec == "cp":
+        return LocalCopyTransfer()
+    raise RuntimeError(f"Unknown upload command '{spec}'")
+
+
+def destination_of(destination: str, path: str) -> str:
+    """Remote name of a local file: destination/<basename>."""
+    return destination.rstrip("/") + "/" + os.path.basename(path)
+
+
+def upload_file(transfer, path: str, dest: str, retries: int = 3, backoff_s: float = 30,
+                adler32: str = None, delete_local: bool = True) -> Dict:
+    """
+    Copy path to dest until the remote checksum matches; returns a record
+    with status "uploaded", "present" (already there), "unverified" or
+    "failed". The local file is removed only after a verified copy.
+    """
+    record = {"file": path, "dest": dest, "status": "failed", "attempts": 0,
+              "adler32": adler32, "seconds": 0.0, "error": None}
+    start = time.time()
+    try:
+        record["adler32"] = adler32 or adler32_file(path)
+        if transfer.checksum(dest) == record["adler32"]:
+            record["status"] = "present"
+        while record["status"] == "failed" and record["attempts"] <= retries:
+            if record["attempts"]:
+                time.sleep(backoff_s * 2 ** (record["attempts"] - 1))
+            record["attempts"] += 1
+            try:
+                transfer.copy(path, dest)
+            except Exception as e:
+                record["error"] = str(e)
+                continue
+            remote = transfer.checksum(dest)
+            if remote == record["adler32"]:
+                record["status"] = "uploaded"
+                record["error"] = None
+            elif remote is None and isinstance(transfer, CommandTransfer) \
+                    and not transfer.checksum_command:
+                record["status"] = "unverified"
+                record["error"] = None
+            else:
+                record["error"] = f"checksum mismatch: local {record['adler32']}, remote {remote}"
+    except Exception as e:
+        record["error"] = str(e)
+
+    if delete_local and record["status"] in ("uploaded", "present"):
+        os.remove(path)
+    record["seconds"] = time.time() - start
+    return record
+
+
+def _upload_worker(tasks, results, spec, checksum_command, retries, backoff_s, delete_local):
+    """Upload process: handle tasks until the None sentinel, then send every record back."""
+    transfer = make_transfer(spec, checksum_command)
+    records = []
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        path, dest, adler32 = task
+        record = upload_file(transfer, path, dest, retries, backoff_s, adler32, delete_local)
+        print(f"Upload {os.path.basename(path)}: {record['status']}"
+              + (f" ({record['error']})" if record["error"] else ""), flush=True)
+        records.append(record)
+    results.put(records)
+
+
+class UploadQueue:
+    """
+    Ships files to `destination` in one background process, in the order
+    they are submitted; close() waits for the queue to drain and returns
+    the record of every file (see upload_file).
+    """
+
+    def __init__(self, destination: str, transfer="xrdcp", checksum_command: List[str] = None,
+                 retries: int = 3, backoff_s: float = 30, delete_local: bool = True):
+        self.destination = destination
+        ctx = multiprocessing.get_context("spawn")
+        # SimpleQueue writes in the calling thread: no feeder thread that
+        # would wait for the GIL during an event loop
+        self._tasks = ctx.SimpleQueue()
+        self._results = ctx.SimpleQueue()
+        self._proc = ctx.Process(target=_upload_worker, name="uploader",
+                                 args=(self._tasks, self._results, transfer, checksum_command,
+                                       retries, backoff_s, delete_local))
+        self._proc.start()
+        self._submitted = 0
+
+    def submit(self, path: str, adler32: str = None):
+        """Queue a local file; adler32 saves recomputing a known checksum."""
+        self._tasks.put((path, destination_of(self.destination, path), adler32))
+        self._submitted += 1
+
+    def close(self) -> Dict[str, Dict]:
+        """Wait for every submitted upload; {local path: record}."""
+        if self._submitted:
+            print(f"Waiting for {self._submitted} uploads to {self.destination}")
+        self._tasks.put(None)
+        records = []
+        while True:
+            if not self._results.empty():
+                records = self._results.get()
+                break
+            if not self._proc.is_alive():
+                if self._results.empty():
+                    print(f"[WARNING] Upload process exited with code {self._proc.exitcode}")
+                    break
+                continue
+            time.sleep(0.5)
+        self._proc.join()
+        return {r["file"]: r for r in records}
@@ -0,0 +1,111 @@
+"""
+Work units of a bundle part.
+
+A part in the bundle JSON is a list of units. A unit is either a file URL
+(the whole file) or an entry range of one file:
+
+    {"file": "root://.../x.root", "first": 0, "last": 250000}
+
+with `first` included and `last` excluded, so one large file can be
+spread over several parts (and jobs) and merged afterwards.
+"""
+
+from typing import Callable, List, Optional, Tuple, Union
+
+Unit = Union[str, dict]
+
+
+def unit_file(unit: Unit) -> str:
+    """File URL of a unit."""
+    return unit["file"] if isinstance(unit, dict) else unit
+
+
+def unit_range(unit: Unit) -> Optional[Tuple[int, int]]:
+    """(first, last) entries of a ranged unit, None for a whole file."""
+    if isinstance(unit, dict):
+        return int(unit["first"]), int(unit["last"])
+    return None
+
+
+def is_ranged(unit: Unit) -> bool:
+    return unit_range(unit) is not None
+
+
+def unit_label(unit: Unit) -> str:
+    """Printable name: the URL, with [first:last] for ranged units."""
+    entries = unit_range(unit)
+    if entries is None:
+        return unit_file(unit)
+    return f"{unit_file(unit)}[{entries[0]}:{entries[1]}]"
+
+
+def with_file(unit: Unit, new_file: str) -> Unit:
+    """Same unit pointing to another copy of the file (e.g. a staged one)."""
+    if isinstance(unit, dict):
+        return dict(unit, file=new_file)
+    return new_file
+
+
+def unit_files(units: List[Unit]) -> List[str]:
+    """Distinct file URLs of a list of units, in order."""
+    return list(dict.fromkeys(unit_file(u) for u in units))
+
+
+# ---- job tags: which parts (or slices of parts) one job runs ----
+
+def part_slice(units: List[Unit], index: int, n: int,
+               entries: Callable[[str], int] = None) -> List[Unit]:
+    """
+    index-th (1-based) of n contiguous slices of units. With at most one
+    slice per unit the slices are whole units, their counts differing by
+    at most one; with more slices than units the entries are cut into n
+    ranges instead (entries(url) gives the entry count of a whole-file
+    unit), so a single large file can be split too.
+    """
+    if not 1 <= index <= n:
+        raise ValueError(f"Cannot take slice {index}/{n}")
+    if n <= len(units):
+        size, extra = divmod(len(units), n)
+        start = (index - 1) * size + min(index - 1, extra)
+        return units[start:start + size + (1 if index <= extra else 0)]
+
+    if entries is None:
+        raise ValueError(f"Slice {index}/{n} of {len(units)} units needs the entry counts of the files")
+    spans = [(unit_file(u),) + (unit_range(u) or (0, int(entries(unit_file(u))))) for u in units]
+    total = sum(last - first for _, first, last in spans)
+    begin, end = total * (index - 1) // n, total * index // n
+
+    sliced = []
+    offset = 0
+    for url, first, last in spans:
+        lo, hi = max(begin, offset), min(end, offset + last - first)
+        if lo < hi:
+            sliced.append({"file": url, "first": first + lo - offset, "last": first + hi - offset})
+        offset += last - first
+    if not sliced:
+        raise ValueError(f"Slice {index}/{n} of {total} entries is empty")
+    return sliced
+
+
+def slice_name(part: str, index: int, n: int) -> str:
+    """Part name (and output suffix) of a slice: part7_2of4."""
+    return f"{part}_{index}of{n}"
+
+
+def parse_part_tag(tag: str) -> List[Tuple[str, int, int]]:
+    """
+    (part, index, n) of every item of a job tag: "part3" (index = n = 1),
+    "part1+part2" (several parts in one job) or "part7:2/4" (the 2nd of 4
+    slices of part7).
+    """
+    items = []
+    for item in tag.split("+"):
+        part, _, chunk = item.partition(":")
+        index, n = (int(x) for x in chunk.split("/")) if chunk else (1, 1)
+        items.append((part, index, n))
+    return items
+
+
+def format_part_tag(items: List[Tuple[str, int, int]]) -> str:
+    """Inverse of parse_part_tag."""
+    return "+".join(part if n == 1 else f"{part}:{index}/{n}" for part, index, n in items)